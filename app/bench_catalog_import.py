@@ -0,0 +1,146 @@
+import os
+import sys
+import csv
+import json
+import time
+import asyncio
+import tempfile
+import threading
+import subprocess
+
+import httpx
+
+from app import main
+from app.endpoints import catalog_import
+from app.endpoints.catalog_import import MASTER_COLUMNS
+
+# Peak memory of POST /catalog/import against the size of the uploaded file,
+# for NDJSON and CSV bodies streamed from disk:
+#
+#   python -m app.bench_catalog_import
+#
+# The batches are not written to a database: load_batch_or_isolate is
+# replaced by a stand-in that reports every record created, so what is
+# measured is the streaming parser, the batching and the per-record report.
+# BENCH_RECORDS lists the upload sizes in records (comma-separated). Each
+# upload runs in a fresh process whose RSS is sampled from /proc/self/statm
+# (Linux); "per record" is the growth from before the upload to the peak.
+# The response, one result entry per record, is part of it and is the only
+# thing expected to grow with the file.
+BENCH_RECORDS = [int(n) for n in os.getenv("BENCH_RECORDS", "5000,20000,80000").split(",")]
+BENCH_CHUNK = 64 * 1024
+SAMPLE_INTERVAL = 0.005
+
+
+def record(i: int) -> dict:
+    return {
+        "title": f"Bench dataset {i:07d}",
+        "description": f"Occurrence records collected in bench survey {i}, " * 4,
+        "citation": None, "doi": f"10.1234/bench.{i}", "language": "en", "data_language": "en",
+        "license": "CC-BY", "publication_date": "2023-06-01", "metadata_modified_date": "2025-08-06",
+        "registration_date": "2023-01-01", "is_active": True, "keywords": "bench, occurrence",
+        "dataset_type": "occurrence", "category_id": str(1 + i % 4),
+        "contacts": [{"name": "Data Manager", "role": "curator", "email": "data@example.org",
+                      "organization": "Bench Institute"}],
+        "mappings": [{"field_name": name, "ontology_mapping": f"dwc:{name}", "data_type": "text"}
+                     for name in ("scientific_name", "family", "genus", "state")],
+    }
+
+
+def write_ndjson(path: str, count: int):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(count):
+            f.write(json.dumps(record(i)) + "\n")
+
+
+def write_csv(path: str, count: int):
+    children = ["contacts", "mappings"]
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(list(MASTER_COLUMNS) + children)
+        for i in range(count):
+            row = record(i)
+            writer.writerow(["" if row[c] is None else row[c] for c in MASTER_COLUMNS]
+                            + [json.dumps(row[c]) for c in children])
+
+
+def rss() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+class PeakRSS:
+    # Samples the resident set in a thread while the upload runs
+    def __enter__(self):
+        self.base = self.peak = rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            self.peak = max(self.peak, rss())
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, rss())
+
+
+def stand_in_loader():
+    catalog_import.load_batch_or_isolate = lambda batch: {line: ("created", str(line)) for line, _ in batch}
+    catalog_import.catalog_changed = lambda: None
+
+
+async def upload(client, path: str, content_type: str) -> dict:
+    async def body():
+        with open(path, "rb") as f:
+            while chunk := f.read(BENCH_CHUNK):
+                yield chunk
+
+    response = await client.post("/catalog/import", content=body(), headers={"content-type": content_type})
+    response.raise_for_status()
+    return response.json()["summary"]
+
+
+async def measure(name: str, path: str, count: int):
+    # One upload in this (fresh) process; prints its row of the table
+    stand_in_loader()
+    content_type = {"ndjson": "application/x-ndjson", "csv": "text/csv"}[name]
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        start = time.perf_counter()
+        with PeakRSS() as memory:
+            summary = await upload(client, path, content_type)
+        elapsed = time.perf_counter() - start
+    assert summary["created"] == count, summary
+    growth = memory.peak - memory.base
+    print(f"{name:<8} {count:>8} {os.path.getsize(path) / 2**20:7.1f} MB {memory.base / 2**20:7.1f} MB "
+          f"{memory.peak / 2**20:7.1f} MB {growth / count:8.0f} B {elapsed:6.1f} s", flush=True)
+
+
+def main_():
+    if not os.path.exists("/proc/self/statm"):
+        print("needs /proc/self/statm (Linux) to sample RSS")
+        return 1
+    if len(sys.argv) == 4:
+        asyncio.run(measure(sys.argv[1], sys.argv[2], int(sys.argv[3])))
+        return 0
+
+    # Every upload runs in its own process, so one cannot reuse memory
+    # another left behind
+    print(f"{'format':<8} {'records':>8} {'file':>10} {'RSS before':>10} {'peak':>10} "
+          f"{'per record':>11} {'time':>8}", flush=True)
+    with tempfile.TemporaryDirectory() as directory:
+        for name, write in [("ndjson", write_ndjson), ("csv", write_csv)]:
+            for count in BENCH_RECORDS:
+                path = os.path.join(directory, f"import.{name}")
+                write(path, count)
+                subprocess.run([sys.executable, "-m", "app.bench_catalog_import", name, path, str(count)],
+                               check=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_())
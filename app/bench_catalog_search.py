@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+import random
+import statistics
+
+from app.catalog_search import CatalogSearchIndex
+
+# Query latency of the in-process catalog search index over a synthetic
+# catalog, no database needed:
+#
+#   python -m app.bench_catalog_search
+#
+# Titles and descriptions mix a few words present in most datasets (the
+# common case that used to be slow) with a long tail of rare ones. "first"
+# is the first search for a query, with cold caches.
+BENCH_DATASETS = int(os.getenv("BENCH_DATASETS", "100000"))
+BENCH_REPEAT = int(os.getenv("BENCH_REPEAT", "20"))
+TARGET_MS = 10.0
+
+COMMON = ["family", "scientific", "genus", "state", "species", "district", "plant", "name"]
+CATEGORIES = ["biodiversity", "medicinal plants", "agriculture", "forestry"]
+
+QUERIES = [
+    "family", "scientific", "genus state", "plant species name", "famly", "sci",
+    "rare0001", "rare0042 family", "district rare0777", "nothingmatches",
+]
+
+
+def synthetic_rows(count: int) -> list:
+    rng = random.Random(7)
+    rare = [f"rare{i:04d}" for i in range(5000)]
+    rows = []
+    for i in range(count):
+        words = rng.sample(COMMON, 3) + rng.sample(rare, 2)
+        rows.append({
+            "dataset_id": i,
+            "category_name": CATEGORIES[i % len(CATEGORIES)],
+            "dataset_title": " ".join(words[:3]) + f" survey {i}",
+            "description": " ".join(rng.sample(COMMON, 4) + words[3:]),
+            "keywords": ", ".join(rng.sample(COMMON, 2)),
+            "field_names": "scientific_name family genus state district",
+        })
+    return rows
+
+
+def main():
+    index = CatalogSearchIndex(max_age=3600)
+    rows = synthetic_rows(BENCH_DATASETS)
+    index._fetch = lambda dataset_id=None: rows
+    start = time.perf_counter()
+    index.rebuild()
+    print(f"{BENCH_DATASETS} datasets, {index.stats()['terms']} terms, "
+          f"built in {time.perf_counter() - start:.1f} s\n")
+
+    print(f"{'query':<24} {'matches':>8} {'first':>9} {'p50':>9} {'max':>9}")
+    worst = 0.0
+    for query, categories in [(query, None) for query in QUERIES] + [("family", ["forestry"]),
+                                                                       ("genus state", ["forestry"])]:
+        samples = []
+        for _ in range(BENCH_REPEAT + 1):
+            start = time.perf_counter()
+            total, _ = index.search(query, categories, 0, 20)
+            samples.append((time.perf_counter() - start) * 1000)
+        first, samples = samples[0], samples[1:]
+        worst = max(worst, statistics.median(samples))
+        label = query + (f" in {categories[0]}" if categories else "")
+        print(f"{label:<24} {total:>8} {first:6.2f} ms {statistics.median(samples):6.2f} ms "
+              f"{max(samples):6.2f} ms")
+
+    # Queries whose best matches share a score and sit late in title order
+    # (here "plant species name") still walk a large part of their postings
+    print(f"\nslowest p50 {worst:.2f} ms (target {TARGET_MS:.0f} ms)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+import os
+import sys
+import time
+import asyncio
+import datetime
+
+from psycopg2.extensions import adapt
+
+from app.endpoints.dataset_details import (
+    DatasetDetailsInput, CHILD_TABLES, insert_dataset_details, copy_dataset_details_async
+)
+
+# Round trips per POST /dataset-details: the old one-INSERT-per-row loop
+# against the execute_values path (sync driver) and the COPY path (psycopg 3):
+#
+#   python -m app.bench_dataset_details
+#
+# Statements are counted with a recording cursor, no database needed; the
+# time column is round trips x BENCH_RTT_MS. With BENCH_DATASET_ID set to an
+# existing dataset, the old loop and execute_values also run against the
+# configured database, in a transaction that is rolled back.
+BENCH_RTT_MS = float(os.getenv("BENCH_RTT_MS", "1"))
+BENCH_DATASET_ID = os.getenv("BENCH_DATASET_ID")
+
+# (scopes, publishers, contacts, mappings, metrics, statistics)
+SIZES = [(1, 1, 2, 10, 2, 3), (2, 1, 5, 100, 5, 10), (3, 2, 10, 500, 10, 50)]
+
+
+def synthetic_details(dataset_id: str, scopes: int, publishers: int, contacts: int, mappings: int,
+                      metrics: int, statistics: int) -> DatasetDetailsInput:
+    return DatasetDetailsInput(
+        dataset_id=dataset_id,
+        scopes=[{"temporal_start_date": datetime.date(2000 + i, 1, 1), "geographic_scope": "India",
+                 "taxonomic_scope": "Plantae"} for i in range(scopes)],
+        publishers=[{"publisher_name": f"Publisher {i}", "record_count": 1000 + i} for i in range(publishers)],
+        contacts=[{"name": f"Contact {i}", "role": "curator", "email": f"c{i}@example.org",
+                   "organization": "CML", "city": "Bengaluru"} for i in range(contacts)],
+        mappings=[{"field_name": f"field_{i:04d}", "ontology_mapping": f"dwc:term{i}", "data_type": "text"}
+                  for i in range(mappings)],
+        metrics=[{"metric_name": f"metric_{i}", "metric_value": str(i)} for i in range(metrics)],
+        statistics=[{"stat_name": f"stat_{i}", "stat_value": str(i * 10),
+                     "measurement_date": datetime.date(2025, 1, 1)} for i in range(statistics)],
+    )
+
+
+def legacy_insert(cur, details: DatasetDetailsInput):
+    # The old write path: one INSERT, so one round trip, per child row
+    for collection, (table, columns, to_row) in CHILD_TABLES.items():
+        sql = "INSERT INTO %s (dataset_id, %s) VALUES (%s)" % (
+            table, ", ".join(columns), ",".join(["%s"] * (len(columns) + 1)))
+        for item in getattr(details, collection) or []:
+            cur.execute(sql, (details.dataset_id, *to_row(item)))
+
+
+class _Connection:
+    encoding = "UTF8"
+
+
+class RecordingCursor:
+    """Stands in for a psycopg2 cursor; every execute() is a round trip."""
+
+    connection = _Connection()
+
+    def __init__(self):
+        self.round_trips = 0
+
+    def mogrify(self, template, args):
+        # What execute_values asks for to build its multi-row VALUES
+        if isinstance(template, bytes):
+            template = template.decode()
+        return (template % tuple(adapt(arg).getquoted().decode() for arg in args)).encode()
+
+    def execute(self, sql, args=None):
+        self.round_trips += 1
+
+
+class RecordingCopy:
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        # Rows are buffered and sent as one COPY
+        self.cursor.round_trips += 1
+
+    async def write_row(self, row):
+        pass
+
+
+class RecordingAsyncCursor:
+    def __init__(self):
+        self.round_trips = 0
+
+    def copy(self, sql):
+        return RecordingCopy(self)
+
+
+def count(write, details) -> int:
+    cursor = RecordingCursor()
+    write(cursor, details)
+    return cursor.round_trips
+
+
+def count_copy(details) -> int:
+    cursor = RecordingAsyncCursor()
+    asyncio.run(copy_dataset_details_async(cursor, details))
+    return cursor.round_trips
+
+
+def run_database(details: DatasetDetailsInput):
+    from app.db import get_db
+
+    for name, write in (("per-row INSERT (before)", legacy_insert), ("execute_values", insert_dataset_details)):
+        with get_db() as conn:
+            cur = conn.cursor()
+            start = time.perf_counter()
+            write(cur, details)
+            elapsed = (time.perf_counter() - start) * 1000
+            conn.rollback()
+        print(f"  {name:<26} {elapsed:9.1f} ms")
+
+
+def main():
+    print(f"{'rows per request':<18} {'per-row INSERT':>20} {'execute_values':>20} {'COPY':>20}")
+    for size in SIZES:
+        details = synthetic_details("bench", *size)
+        rows = sum(size)
+        counts = [count(legacy_insert, details), count(insert_dataset_details, details), count_copy(details)]
+        cells = [f"{n:>5} rt {n * BENCH_RTT_MS:8.1f} ms" for n in counts]
+        print(f"  {rows:<16} {cells[0]:>20} {cells[1]:>20} {cells[2]:>20}")
+
+    if BENCH_DATASET_ID:
+        details = synthetic_details(BENCH_DATASET_ID, *SIZES[-1])
+        print(f"\nagainst the database, {sum(SIZES[-1])} rows for dataset {BENCH_DATASET_ID} (rolled back)")
+        run_database(details)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
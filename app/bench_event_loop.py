@@ -0,0 +1,164 @@
+import os
+import sys
+import time
+import asyncio
+import statistics
+
+import httpx
+
+from app import main, db_async
+from app.cache import metadata_cache
+from app.endpoints import metadata
+
+# Load test for the catalog data-access paths: concurrent GET /metadata
+# misses at growing concurrency, while /ping is probed and the event loop's
+# scheduling lag measured, once with the sync (thread pool) path and once
+# with the async driver:
+#
+#   python -m app.bench_event_loop
+#
+# Without BENCH_CATEGORY, the queries are stand-ins that take
+# BENCH_QUERY_MS (blocking time.sleep on the sync path, asyncio.sleep on the
+# async one), so only the scheduling is measured. With BENCH_CATEGORY (and
+# the database configured) every request queries that category's datasets
+# for real, cycling through BENCH_TITLES (comma-separated).
+#
+# On the async path no request blocks the loop; what lag remains is the
+# on-loop work of the requests themselves (routing, validation, middleware,
+# encoding), the app's and the bench client's, which share the loop here.
+# "app work per request" is the app's share, timed by calling the ASGI app
+# directly with instant queries: a burst of N requests holds the loop for
+# about N times that, plus the client's part. A round lasts a few probe
+# intervals, so its p99 lag is close to the single worst sample.
+BENCH_CONCURRENCY = [int(n) for n in os.getenv("BENCH_CONCURRENCY", "1,10,50,100,200").split(",")]
+BENCH_QUERY_MS = float(os.getenv("BENCH_QUERY_MS", "50"))
+BENCH_CATEGORY = os.getenv("BENCH_CATEGORY")
+BENCH_TITLES = [t for t in os.getenv("BENCH_TITLES", "").split(",") if t]
+PROBE_INTERVAL = 0.01
+
+
+def simulated_loaders():
+    document = {"category_name": "bench", "dataset_title": "bench", "fields": []}
+
+    def load_metadata(category_name, title):
+        time.sleep(BENCH_QUERY_MS / 1000)
+        return {**document, "dataset_title": title}
+
+    async def load_metadata_async(category_name, title):
+        await asyncio.sleep(BENCH_QUERY_MS / 1000)
+        return {**document, "dataset_title": title}
+
+    metadata.load_metadata = load_metadata
+    metadata.load_metadata_async = load_metadata_async
+
+
+def use_async(enabled: bool):
+    metadata.async_db_enabled = lambda: enabled
+
+
+def percentile(samples: list, q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def probe(client, stop: asyncio.Event, lags: list, pings: list):
+    # Loop lag: how late a short sleep wakes up; /ping: a trivial request
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append((time.perf_counter() - start - PROBE_INTERVAL) * 1000)
+        start = time.perf_counter()
+        await client.get("/ping")
+        pings.append((time.perf_counter() - start) * 1000)
+
+
+async def load(client, concurrency: int, round_id: int) -> float:
+    def title(i):
+        if BENCH_TITLES:
+            return BENCH_TITLES[i % len(BENCH_TITLES)]
+        return f"bench-{round_id}-{i}"  # distinct titles: every request is a miss
+
+    async def one(i):
+        response = await client.get("/metadata", params={"category_name": BENCH_CATEGORY or "bench",
+                                                         "title": title(i)})
+        response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one(i) for i in range(concurrency)])
+    return time.perf_counter() - start
+
+
+async def app_work_ms(requests: int = 500) -> float:
+    # Mean time one /metadata miss spends on the loop inside the app
+    global BENCH_QUERY_MS
+    query_ms, BENCH_QUERY_MS = BENCH_QUERY_MS, 0.0
+    metadata_cache.clear()
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    try:
+        start = time.perf_counter()
+        for i in range(requests):
+            await main.app({
+                "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+                "scheme": "http", "path": "/metadata", "raw_path": b"/metadata", "root_path": "",
+                "query_string": f"category_name=bench&title=work-{i}".encode("ascii"),
+                "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 1), "server": ("bench", 80),
+            }, receive, send)
+        return (time.perf_counter() - start) * 1000 / requests
+    finally:
+        BENCH_QUERY_MS = query_ms
+
+
+async def run_mode(client, name: str):
+    print(f"\n{name}")
+    print(f"  {'concurrency':>11} {'req/s':>9} {'loop lag p50':>13} {'p99':>8} {'/ping p50':>10} {'p99':>8}")
+    for round_id, concurrency in enumerate(BENCH_CONCURRENCY):
+        metadata_cache.clear()
+        stop = asyncio.Event()
+        lags, pings = [], []
+        prober = asyncio.create_task(probe(client, stop, lags, pings))
+        elapsed = await load(client, concurrency, round_id)
+        stop.set()
+        await prober
+        print(f"  {concurrency:>11} {concurrency / elapsed:9.0f} {statistics.median(lags):10.1f} ms "
+              f"{percentile(lags, 0.99):5.1f} ms {statistics.median(pings):7.1f} ms "
+              f"{percentile(pings, 0.99):5.1f} ms")
+
+
+async def run():
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        if BENCH_CATEGORY:
+            main.init_pool()
+            await db_async.init_async_pool()
+            use_async(False)
+            await run_mode(client, "sync driver, thread pool")
+            if db_async.async_db_enabled():
+                use_async(True)
+                await run_mode(client, "async driver")
+            else:
+                print("\nasync driver not enabled (DB_ASYNC, psycopg 3): skipped")
+            await db_async.close_async_pool()
+            main.close_pool()
+        else:
+            print(f"simulated queries of {BENCH_QUERY_MS:.0f} ms")
+            simulated_loaders()
+            use_async(False)
+            await run_mode(client, "sync path, thread pool")
+            use_async(True)
+            await run_mode(client, "async path")
+            print(f"\napp work per request on the loop (async path): {await app_work_ms():.2f} ms")
+
+
+def main_():
+    asyncio.run(run())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_())
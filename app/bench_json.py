@@ -0,0 +1,106 @@
+import os
+import sys
+import json
+import time
+import datetime
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app import fast_json
+from app.fast_json import FastJSONResponse, RawJSON
+from app.catalog_snapshot import _dataset_entry
+from app.fake_participant import make_records, FAMILIES
+
+# Serialisation microbenchmark on synthetic payloads shaped like ours:
+#
+#   python -m app.bench_json
+#
+# BENCH_DATASETS sets the catalog size (default 10000), BENCH_RECORDS the
+# participant records per field in the federated payload.
+BENCH_DATASETS = int(os.getenv("BENCH_DATASETS", "10000"))
+BENCH_RECORDS = int(os.getenv("BENCH_RECORDS", "2000"))
+BENCH_REPEAT = int(os.getenv("BENCH_REPEAT", "5"))
+
+
+def catalog_payload(datasets: int) -> list:
+    # /categories-with-datasets shape, with the date columns as date objects
+    categories = {}
+    for i in range(datasets):
+        row = {
+            "dataset_title": f"Dataset {i:05d}",
+            "description": f"Occurrence records of {FAMILIES[i % len(FAMILIES)]} collected in survey {i}",
+            "keywords": "medicinal plants, occurrence, survey",
+            "doi": f"10.1234/cml.{i}",
+            "contact_name": "Data Manager",
+            "license": "CC-BY",
+            "publication_date": datetime.date(2023, 1 + i % 12, 1 + i % 28),
+            "last_updated": datetime.datetime(2025, 8, 6, 10, 30, tzinfo=datetime.timezone.utc),
+            "registration_date": datetime.date(2023, 1, 1),
+            "fields": [
+                {"field_name": name, "ontology_mapping": f"dwc:{name}", "ontology_mapping_to_display": name,
+                 "data_type": "text"}
+                for name in ("scientific_name", "family", "genus", "state")
+            ],
+        }
+        entry = _dataset_entry(row)
+        entry["metadata"]["Publication Date"] = row["publication_date"]
+        entry["metadata"]["Last Updated"] = row["last_updated"]
+        categories.setdefault(f"Category {i % 20}", []).append(entry)
+    return [{"category_name": name, "datasets": entries} for name, entries in sorted(categories.items())]
+
+
+def federated_payload(records: int, raw: bool) -> dict:
+    # /federated-search shape: 2 participants x 3 fields
+    results = {}
+    for participant in ("Participant A", "Participant B"):
+        field_results = {}
+        for field in ("scientific_name", "family", "genus"):
+            rows = make_records(records)
+            if raw:
+                rows = RawJSON.from_fragments([json.dumps(r, ensure_ascii=False) for r in rows])
+            field_results[field] = {"results": rows, "error": None, "truncated": False}
+        results[participant] = {"api_url": "http://participant/search", "field_results": field_results}
+    return {"category": ["biodiversity"], "search_text": "a", "results": results}
+
+
+def best_of(fn, repeat: int = BENCH_REPEAT) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def report(name: str, ms: float, size: int, baseline: float):
+    print(f"  {name:<44} {ms:9.1f} ms  {size / 1e6:7.2f} MB  x{baseline / ms:5.1f}")
+
+
+def main():
+    print(f"orjson: {'yes' if fast_json.orjson is not None else 'no (stdlib fallback)'}")
+
+    catalog = catalog_payload(BENCH_DATASETS)
+    print(f"\n/categories-with-datasets, {BENCH_DATASETS} datasets")
+    baseline = best_of(lambda: JSONResponse(jsonable_encoder(catalog)))
+    size = len(JSONResponse(jsonable_encoder(catalog)).body)
+    report("jsonable_encoder + JSONResponse (before)", baseline, size, baseline)
+    report("FastJSONResponse", best_of(lambda: FastJSONResponse(catalog)), size, baseline)
+    report("FastJSONResponse, stdlib fallback", best_of(lambda: fast_json._dumps_stdlib(catalog)), size, baseline)
+
+    decoded = federated_payload(BENCH_RECORDS, raw=False)
+    raw = federated_payload(BENCH_RECORDS, raw=True)
+    print(f"\n/federated-search, 6 fields x {BENCH_RECORDS} records")
+    baseline = best_of(lambda: JSONResponse(jsonable_encoder(decoded)))
+    size = len(JSONResponse(jsonable_encoder(decoded)).body)
+    report("jsonable_encoder + JSONResponse (before)", baseline, size, baseline)
+    report("FastJSONResponse, decoded records", best_of(lambda: FastJSONResponse(decoded)), size, baseline)
+    report("FastJSONResponse, passthrough (RawJSON)", best_of(lambda: FastJSONResponse(raw)), size, baseline)
+    report("stdlib fallback, passthrough (RawJSON)", best_of(lambda: fast_json._dumps_stdlib(raw)), size, baseline)
+
+    assert json.loads(FastJSONResponse(raw).body) == json.loads(JSONResponse(jsonable_encoder(decoded)).body)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
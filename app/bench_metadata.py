@@ -0,0 +1,235 @@
+import os
+import sys
+import json
+import time
+import datetime
+import itertools
+from decimal import Decimal
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.fast_json import FastJSONResponse, dumps
+from app.endpoints.metadata import build_metadata, METADATA_QUERY, METADATA_WHERE
+
+# Regression check for GET /metadata assembly: the old five-way LEFT JOIN
+# (one row per contact x publisher x scope x field x statistic, deduplicated
+# with `not in`) against the json_agg query and build_metadata.
+#
+#   python -m app.bench_metadata
+#
+# Synthetic datasets of growing width are assembled both ways; the response
+# bodies must be byte-identical, and the row count and time of the old path
+# grow multiplicatively while the new one stays at one row. With
+# BENCH_CATEGORY and BENCH_TITLE set, both queries also run against the
+# configured database for that dataset.
+BENCH_REPEAT = int(os.getenv("BENCH_REPEAT", "5"))
+BENCH_CATEGORY = os.getenv("BENCH_CATEGORY")
+BENCH_TITLE = os.getenv("BENCH_TITLE")
+
+# (contacts, publishers, scopes, fields, statistics)
+WIDTHS = [(1, 1, 1, 5, 1), (2, 1, 2, 20, 3), (5, 1, 2, 40, 3), (5, 2, 3, 80, 6)]
+
+# The query GET /metadata ran before, kept here for the comparison
+LEGACY_METADATA_QUERY = """
+    SELECT
+        cat.category_name,
+        ds.title AS dataset_title,
+        ds.description, ds.citation, ds.doi, ds.language, ds.data_language,
+        ds.license, ds.publication_date, ds.metadata_modified_date AS last_updated,
+        ds.registration_date, ds.is_active, ds.keywords, ds.dataset_type,
+        c.name AS contact_name, c.role AS contact_role, c.email AS contact_email,
+        c.organization AS contact_organization, c.address AS contact_address,
+        c.city AS contact_city, c.state AS contact_state, c.country AS contact_country,
+        p.publisher_name, p.country AS publisher_country, p.record_count,
+        s.temporal_start_date, s.temporal_end_date, s.geographic_scope,
+        s.taxonomic_scope, s.taxonomic_authority,
+        m.field_name, m.ontology_mapping, m.data_type,
+        st.stat_name, st.stat_value, st.measurement_date
+    FROM category_master cat
+    JOIN dataset_master ds ON ds.category_id = cat.category_id
+    LEFT JOIN dataset_contacts c ON c.dataset_id = ds.dataset_id
+    LEFT JOIN dataset_publisher p ON p.dataset_id = ds.dataset_id
+    LEFT JOIN dataset_scope s ON s.dataset_id = ds.dataset_id
+    LEFT JOIN dataset_mapping m ON m.dataset_id = ds.dataset_id
+    LEFT JOIN dataset_statistics st ON st.dataset_id = ds.dataset_id
+    WHERE cat.category_name = %s AND ds.title = %s
+    ORDER BY cat.category_name, ds.title, m.field_name;
+"""
+
+
+def legacy_build(rows, category_name: str, title: str) -> dict:
+    # The old assembly loop, verbatim apart from the names
+    details = {
+        "category_name": category_name,
+        "dataset_title": title,
+        **{key: rows[0][key] for key in (
+            "description", "citation", "doi", "language", "data_language", "license",
+            "publication_date", "last_updated", "registration_date", "is_active",
+            "keywords", "dataset_type")},
+        "contacts": [], "publishers": [], "scopes": [], "fields": [], "statistics": []
+    }
+    for row in rows:
+        contact = {
+            "name": row['contact_name'], "role": row['contact_role'], "email": row['contact_email'],
+            "organization": row['contact_organization'], "address": row['contact_address'],
+            "city": row['contact_city'], "state": row['contact_state'], "country": row['contact_country']
+        }
+        if contact and contact not in details["contacts"]:
+            details["contacts"].append(contact)
+        publisher = {
+            "publisher_name": row['publisher_name'], "country": row['publisher_country'],
+            "record_count": row['record_count']
+        }
+        if publisher and publisher not in details["publishers"]:
+            details["publishers"].append(publisher)
+        scope = {
+            "temporal_start_date": row['temporal_start_date'], "temporal_end_date": row['temporal_end_date'],
+            "geographic_scope": row['geographic_scope'], "taxonomic_scope": row['taxonomic_scope'],
+            "taxonomic_authority": row['taxonomic_authority']
+        }
+        if scope not in details["scopes"]:
+            details["scopes"].append(scope)
+        field = {
+            "field_name": row['field_name'], "ontology_mapping": row['ontology_mapping'],
+            "data_type": row['data_type']
+        }
+        if field not in details["fields"]:
+            details["fields"].append(field)
+        stat = {
+            "stat_name": row['stat_name'], "stat_value": row['stat_value'],
+            "measurement_date": row['measurement_date']
+        }
+        if stat not in details["statistics"]:
+            details["statistics"].append(stat)
+    return details
+
+
+def synthetic_dataset(contacts: int, publishers: int, scopes: int, fields: int, statistics: int) -> dict:
+    return {
+        "dataset": {
+            "category_name": "Biodiversity", "dataset_title": "Wide dataset",
+            "description": "Occurrence records of medicinal plants", "citation": "CML (2024)",
+            "doi": "10.1234/cml.1", "language": "en", "data_language": "en", "license": "CC-BY",
+            "publication_date": datetime.date(2024, 3, 1),
+            "last_updated": datetime.date(2025, 8, 6),
+            "registration_date": datetime.date(2024, 1, 15),
+            "is_active": True, "keywords": "plants, survey", "dataset_type": "occurrence",
+        },
+        "contacts": [[f"Contact {i}", "curator", f"c{i}@example.org", "CML", "Street 1",
+                      "Bengaluru", "Karnataka", "India"] for i in range(contacts)],
+        "publishers": [[f"Publisher {i}", "India", 1000 + i] for i in range(publishers)],
+        "scopes": [[datetime.date(2000 + i, 1, 1), datetime.date(2020 + i, 12, 31), "India",
+                    "Plantae", "POWO"] for i in range(scopes)],
+        # Reverse order, so the field_name ordering of both paths is exercised
+        "fields": [[f"field_{i:03d}", f"dwc:term{i}", "text"] for i in reversed(range(fields))],
+        "statistics": [[f"stat_{i}", str(Decimal(i) / 4), datetime.date(2025, 1, 1 + i)]
+                       for i in range(statistics)],
+    }
+
+
+def legacy_rows(data: dict) -> list:
+    # What the LEFT JOIN returned: the product of the child tables, ordered by field_name
+    fields = sorted(data["fields"], key=lambda f: f[0])
+    rows = []
+    for field, contact, publisher, scope, stat in itertools.product(
+            fields, data["contacts"], data["publishers"], data["scopes"], data["statistics"]):
+        row = dict(data["dataset"])
+        row.update(zip(("contact_name", "contact_role", "contact_email", "contact_organization",
+                        "contact_address", "contact_city", "contact_state", "contact_country"), contact))
+        row.update(zip(("publisher_name", "publisher_country", "record_count"), publisher))
+        row.update(zip(("temporal_start_date", "temporal_end_date", "geographic_scope",
+                        "taxonomic_scope", "taxonomic_authority"), scope))
+        row.update(zip(("field_name", "ontology_mapping", "data_type"), field))
+        row.update(zip(("stat_name", "stat_value", "measurement_date"), stat))
+        rows.append(row)
+    return rows
+
+
+def aggregated_rows(data: dict) -> list:
+    # What METADATA_QUERY returns: one row, each child list as decoded json_agg
+    row = dict(data["dataset"])
+    for name in ("contacts", "publishers", "scopes", "statistics"):
+        row[name] = json.loads(dumps(data[name])) if data[name] else None
+    fields = sorted(data["fields"], key=lambda f: f[0])
+    row["fields"] = json.loads(dumps(fields)) if fields else None
+    return [row]
+
+
+def best_of(fn, repeat: int = BENCH_REPEAT) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def legacy_body(rows, category_name, title) -> bytes:
+    return JSONResponse(jsonable_encoder(legacy_build(rows, category_name, title))).body
+
+
+def current_body(rows, category_name, title) -> bytes:
+    return FastJSONResponse(build_metadata(rows, category_name, title)).body
+
+
+def compare_synthetic() -> bool:
+    identical = True
+    print(f"{'contacts x publishers x scopes x fields x stats':<48} {'rows':>12} {'old ms':>9} {'new ms':>9}  body")
+    for width in WIDTHS:
+        data = synthetic_dataset(*width)
+        old_rows, new_rows = legacy_rows(data), aggregated_rows(data)
+        same = legacy_body(old_rows, "Biodiversity", "Wide dataset") == \
+            current_body(new_rows, "Biodiversity", "Wide dataset")
+        identical &= same
+        old_ms = best_of(lambda: legacy_body(old_rows, "Biodiversity", "Wide dataset"))
+        new_ms = best_of(lambda: current_body(new_rows, "Biodiversity", "Wide dataset"))
+        label = " x ".join(str(n) for n in width)
+        print(f"  {label:<46} {len(old_rows):>6} -> {len(new_rows):<3} {old_ms:9.2f} {new_ms:9.2f}  "
+              f"{'identical' if same else 'DIFFERENT'}")
+
+    # Missing child rows: the LEFT JOIN's all-null entries must be reproduced
+    data = synthetic_dataset(1, 0, 0, 3, 0)
+    old_rows = legacy_rows({**data, "publishers": [[None] * 3], "scopes": [[None] * 5],
+                            "statistics": [[None] * 3]})
+    same = legacy_body(old_rows, "Biodiversity", "Wide dataset") == \
+        current_body(aggregated_rows(data), "Biodiversity", "Wide dataset")
+    identical &= same
+    print(f"  {'empty child tables':<46} {'':>12} {'':>9} {'':>9}  {'identical' if same else 'DIFFERENT'}")
+    return identical
+
+
+def compare_database(category_name: str, title: str) -> bool:
+    from psycopg2.extras import RealDictCursor
+    from app.db import get_db
+
+    with get_db() as conn:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        timings = {}
+        start = time.perf_counter()
+        cursor.execute(LEGACY_METADATA_QUERY, (category_name, title))
+        old_rows = cursor.fetchall()
+        timings["old"] = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        cursor.execute(METADATA_QUERY + METADATA_WHERE, (category_name, title))
+        new_rows = cursor.fetchall()
+        timings["new"] = (time.perf_counter() - start) * 1000
+    if not old_rows:
+        print(f"\n{category_name} / {title}: not found")
+        return False
+    same = legacy_body(old_rows, category_name, title) == current_body(new_rows, category_name, title)
+    print(f"\n{category_name} / {title}: {len(old_rows)} rows -> {len(new_rows)}, "
+          f"query {timings['old']:.1f} ms -> {timings['new']:.1f} ms, "
+          f"body {'identical' if same else 'DIFFERENT'}")
+    return same
+
+
+def main():
+    identical = compare_synthetic()
+    if BENCH_CATEGORY and BENCH_TITLE:
+        identical &= compare_database(BENCH_CATEGORY, BENCH_TITLE)
+    return 0 if identical else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
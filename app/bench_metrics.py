@@ -0,0 +1,95 @@
+import os
+import sys
+import time
+import asyncio
+
+from app import main, metrics
+from app.cache import metadata_cache
+from app.endpoints import metadata
+from app.metrics import timed_query
+
+# Cost of the instrumentation per request: the same requests through the
+# whole ASGI app with METRICS_ENABLED on and off, no database or network:
+#
+#   python -m app.bench_metrics
+#
+# /metadata hit: answered from the metadata cache. /metadata miss: an
+# instant stand-in query, timed like a real one (db histogram and
+# Server-Timing phase). Modes alternate round by round and the best round
+# counts, so a noisy neighbour hurts neither side more.
+BENCH_REQUESTS = int(os.getenv("BENCH_REQUESTS", "2000"))
+BENCH_ROUNDS = int(os.getenv("BENCH_ROUNDS", "5"))
+
+DOCUMENT = {"category_name": "bench", "dataset_title": "bench", "fields": [{"field_name": "family"}]}
+
+
+def simulated_loaders():
+    def load_metadata(category_name, title):
+        with timed_query("metadata"):
+            return {**DOCUMENT, "dataset_title": title}
+
+    async def load_metadata_async(category_name, title):
+        with timed_query("metadata"):
+            return {**DOCUMENT, "dataset_title": title}
+
+    metadata.load_metadata = load_metadata
+    metadata.load_metadata_async = load_metadata_async
+    metadata.async_db_enabled = lambda: True
+
+
+async def request(path: str, query_string: bytes):
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start" and message["status"] != 200:
+            raise RuntimeError(f"{path} answered {message['status']}")
+
+    await main.app({
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode("ascii"), "root_path": "",
+        "query_string": query_string, "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }, receive, send)
+
+
+def hit(i):
+    return request("/metadata", b"category_name=bench&title=hit")
+
+
+def miss(i):
+    metadata_cache.clear()
+    return request("/metadata", f"category_name=bench&title=miss-{i}".encode("ascii"))
+
+
+async def per_request_us(case, enabled: bool) -> float:
+    metrics.METRICS_ENABLED = enabled
+    start = time.perf_counter()
+    for i in range(BENCH_REQUESTS):
+        await case(i)
+    return (time.perf_counter() - start) * 1e6 / BENCH_REQUESTS
+
+
+async def run():
+    simulated_loaders()
+    metadata_cache.set("bench", "hit", DOCUMENT)
+    print(f"{BENCH_REQUESTS} requests x {BENCH_ROUNDS} rounds, best round per mode\n")
+    print(f"{'request':<16} {'metrics off':>12} {'metrics on':>12} {'overhead':>10}")
+    for name, case in [("/metadata hit", hit), ("/metadata miss", miss)]:
+        await per_request_us(case, True)  # warm up
+        best = {True: float("inf"), False: float("inf")}
+        for _ in range(BENCH_ROUNDS):
+            for enabled in (False, True):
+                best[enabled] = min(best[enabled], await per_request_us(case, enabled))
+        overhead = best[True] - best[False]
+        print(f"{name:<16} {best[False]:9.1f} us {best[True]:9.1f} us {overhead:7.1f} us "
+              f"({overhead / best[False]:.0%})")
+
+
+def main_():
+    asyncio.run(run())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_())
@@ -0,0 +1,99 @@
+import os
+import sys
+import time
+import socket
+import asyncio
+import threading
+import statistics
+
+import uvicorn
+
+from app import fake_participant
+from app.http_client import create_http_client, close_http_client
+from app.search_cache import search_cache
+from app.endpoints.federated_search import fetch_from_participant
+
+# Hit / miss / stale latency of the federated search result cache, against a
+# local fake participant started in-process:
+#
+#   FAKE_PARTICIPANT_LATENCY=0.05 python -m app.bench_search_cache
+#
+# Each miss uses its own limit, so it is a distinct cache key and a real
+# participant call; hits repeat one query. Stale hits are served from the
+# cache while a background refresh runs. Errors must not be cached.
+BENCH_PORT = int(os.getenv("BENCH_PORT", "8199"))
+BENCH_CALLS = int(os.getenv("BENCH_CALLS", "200"))
+
+PARTICIPANT = "Bench participant"
+URL = f"http://127.0.0.1:{BENCH_PORT}/search"
+
+
+def start_fake_participant() -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(fake_participant.app, port=BENCH_PORT, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    for _ in range(100):
+        if server.started:
+            return server
+        time.sleep(0.05)
+    raise RuntimeError(f"fake participant did not start on port {BENCH_PORT}")
+
+
+def unused_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def timed(client, query: str, limit: int, url: str = URL):
+    start = time.perf_counter()
+    item = await fetch_from_participant(client, PARTICIPANT, url, "scientific_name", query, limit=limit)
+    return (time.perf_counter() - start) * 1000, item
+
+
+def report(name: str, samples: list):
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f"  {name:<28} p50 {statistics.median(samples):8.3f} ms   p95 {p95:8.3f} ms   ({len(samples)} calls)")
+
+
+async def run() -> bool:
+    client = create_http_client()
+    try:
+        search_cache.clear()
+        misses = [(await timed(client, "ocimum", limit))[0] for limit in range(1, BENCH_CALLS + 1)]
+        await timed(client, "curcuma", 10)
+        hits = [(await timed(client, "curcuma", 10))[0] for _ in range(BENCH_CALLS)]
+
+        ttl, search_cache.ttl = search_cache.ttl, 0
+        try:
+            stale = [(await timed(client, "curcuma", 10))[0] for _ in range(BENCH_CALLS)]
+            await asyncio.sleep(0.5)  # let the background refresh finish
+        finally:
+            search_cache.ttl = ttl
+
+        error_url = f"http://127.0.0.1:{unused_port()}/search"
+        _, failed = await timed(client, "withania", 5, error_url)
+        error_cached = search_cache.lookup(search_cache.key(PARTICIPANT, "scientific_name", "withania", 5))[0]
+    finally:
+        await close_http_client()
+
+    print(f"fake participant latency: {fake_participant.FAKE_PARTICIPANT_LATENCY * 1000:.0f} ms")
+    report("miss (participant call)", misses)
+    report("hit", hits)
+    report("stale hit (refresh behind)", stale)
+    print(f"  error result cached: {'YES' if error_cached is not None else 'no'} ({failed.get('error')})")
+    print(f"  counters: {search_cache.stats()['participants'][PARTICIPANT]}")
+    return bool(failed.get("error")) and error_cached is None and statistics.median(hits) < statistics.median(misses)
+
+
+def main():
+    server = start_fake_participant()
+    try:
+        ok = asyncio.run(run())
+    finally:
+        server.should_exit = True
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
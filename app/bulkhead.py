@@ -0,0 +1,158 @@
+import os
+import asyncio
+import itertools
+import contextvars
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+# Requests waiting for a participant slot, beyond which new ones are rejected
+PARTICIPANT_MAX_QUEUE = int(os.getenv("PARTICIPANT_MAX_QUEUE", "50"))
+# Longest a request waits in a participant queue before giving up
+PARTICIPANT_QUEUE_TIMEOUT = float(os.getenv("PARTICIPANT_QUEUE_TIMEOUT", "2"))
+# Upstream requests all in-flight searches may have outstanding together;
+# searches that would exceed it are shed with 503
+FANOUT_MAX_IN_FLIGHT = int(os.getenv("FANOUT_MAX_IN_FLIGHT", "500"))
+FANOUT_RETRY_AFTER = int(os.getenv("FANOUT_RETRY_AFTER", "1"))
+
+# Identifies the search a participant call belongs to, for fair queueing.
+# Set once per search; tasks created for its fan-out inherit it.
+fanout_owner = contextvars.ContextVar("fanout_owner", default=None)
+_owner_ids = itertools.count(1)
+
+
+def new_fanout_owner():
+    fanout_owner.set(next(_owner_ids))
+
+
+class BulkheadFull(Exception):
+    pass
+
+
+class Bulkhead:
+    """Concurrency limit with a bounded wait queue for one participant.
+
+    Waiters are kept per search and served round-robin across searches, so a
+    search with many fields gets one slot at a time in turn with the others
+    instead of queueing all its calls ahead of them.
+    """
+
+    def __init__(self, limit: int, max_queue: int, queue_timeout: float):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.running = 0
+        self.queued = 0
+        self._waiters = OrderedDict()  # owner -> deque of futures
+        self.admitted = 0
+        self.waited = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    def _dequeue(self, owner, future) -> bool:
+        waiters = self._waiters.get(owner)
+        if waiters is None or future not in waiters:
+            return False
+        waiters.remove(future)
+        if not waiters:
+            del self._waiters[owner]
+        self.queued -= 1
+        return True
+
+    async def acquire(self):
+        if self.running < self.limit and not self.queued:
+            self.running += 1
+            self.admitted += 1
+            return
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise BulkheadFull("participant queue full, request rejected")
+
+        owner = fanout_owner.get()
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(owner, deque()).append(future)
+        self.queued += 1
+        self.waited += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we gave up: pass it on
+                self.release()
+            else:
+                future.cancel()
+                self._dequeue(owner, future)
+            if isinstance(e, asyncio.TimeoutError):
+                self.timeouts += 1
+                raise BulkheadFull(f"no participant slot within {self.queue_timeout}s")
+            raise
+        self.admitted += 1
+
+    def release(self):
+        # Hand the slot straight to the next waiter, round-robin over searches
+        while self._waiters:
+            owner, waiters = self._waiters.popitem(last=False)
+            future = waiters.popleft()
+            if waiters:
+                self._waiters[owner] = waiters  # back of the rotation
+            self.queued -= 1
+            if not future.done():
+                future.set_result(None)
+                return
+        self.running -= 1
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "running": self.running,
+            "queued": self.queued,
+            "max_queue": self.max_queue,
+            "waiting_searches": len(self._waiters),
+            "admitted": self.admitted,
+            "waited": self.waited,
+            "rejected": self.rejected,
+            "queue_timeouts": self.timeouts,
+        }
+
+
+class AdmissionControl:
+    """Global cap on outstanding upstream requests across all searches. A
+    search is admitted with its whole cost (its number of live upstream
+    calls) or not at all."""
+
+    def __init__(self, max_in_flight: int, retry_after: int):
+        self.max_in_flight = max_in_flight
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.admitted = 0
+        self.shed = 0
+
+    def try_admit(self, cost: int) -> bool:
+        # A search larger than the whole cap still runs when nothing else does
+        if self.in_flight and self.in_flight + cost > self.max_in_flight:
+            self.shed += 1
+            return False
+        self.in_flight += cost
+        self.admitted += 1
+        return True
+
+    def release(self, cost: int):
+        self.in_flight -= cost
+
+    def stats(self) -> dict:
+        return {
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self.in_flight,
+            "admitted": self.admitted,
+            "shed": self.shed,
+        }
+
+
+admission_control = AdmissionControl(FANOUT_MAX_IN_FLIGHT, FANOUT_RETRY_AFTER)
@@ -0,0 +1,231 @@
+import os
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi.concurrency import run_in_threadpool
+
+# Metadata cache settings
+METADATA_CACHE_SIZE = int(os.getenv("METADATA_CACHE_SIZE", "1024"))
+METADATA_CACHE_TTL = float(os.getenv("METADATA_CACHE_TTL", "300"))
+# "memory" (per worker) or "redis" (shared by all workers)
+METADATA_CACHE_BACKEND = os.getenv("METADATA_CACHE_BACKEND", "memory")
+METADATA_CACHE_REDIS_URL = os.getenv("METADATA_CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+
+class LocalBackend:
+    """In-process LRU with a per-entry TTL, and a version per key that
+    invalidation bumps (see MetadataCache.set)."""
+
+    blocking = False
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._versions = {}   # key -> times invalidated
+        self._generation = 0  # times cleared
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: float, version=None) -> bool:
+        with self._lock:
+            if version is not None and version != self._version(key):
+                return False
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+            return True
+
+    def _version(self, key):
+        return self._generation, self._versions.get(key, 0)
+
+    def version(self, key):
+        with self._lock:
+            return self._version(key)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+            self._versions[key] = self._versions.get(key, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._versions.clear()
+            self._generation += 1
+
+    def __len__(self):
+        return len(self._data)
+
+
+# SET only if the key's version (generation:count) is still the one given
+_SET_IF_VERSION = """
+local version = (redis.call('GET', KEYS[3]) or '0') .. ':' .. (redis.call('GET', KEYS[2]) or '0')
+if version ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+
+class RedisBackend:
+    """Shared backend so every uvicorn worker sees the same entries and
+    invalidations. Values are stored as JSON; key versions live next to
+    them under a separate prefix."""
+
+    # Longer than any load could take; a version only has to outlive the
+    # loads that read it
+    VERSION_TTL = 3600
+    # Network calls: async callers go through the thread pool
+    blocking = True
+
+    def __init__(self, url: str, prefix: str, client=None):
+        if client is None:
+            try:
+                import redis  # only needed for this backend
+            except ImportError:
+                raise RuntimeError("METADATA_CACHE_BACKEND=redis needs the redis package "
+                                   "(pip install -r requirements.txt)") from None
+            client = redis.Redis.from_url(url)
+        self._redis = client
+        self.prefix = prefix
+        self.version_prefix = prefix.rstrip(":") + "-version:"
+        self._generation = self.version_prefix + "generation"
+        self._set_if_version = self._redis.register_script(_SET_IF_VERSION)
+
+    def get(self, key):
+        raw = self._redis.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl: float, version=None) -> bool:
+        raw = json.dumps(value, default=str)
+        if version is None:
+            self._redis.set(self.prefix + key, raw, ex=max(1, int(ttl)))
+            return True
+        keys = [self.prefix + key, self.version_prefix + key, self._generation]
+        return bool(self._set_if_version(keys=keys, args=[version, raw, max(1, int(ttl))]))
+
+    def version(self, key):
+        generation, count = self._redis.mget(self._generation, self.version_prefix + key)
+        return "%s:%s" % ((generation or b"0").decode(), (count or b"0").decode())
+
+    def delete(self, key):
+        pipe = self._redis.pipeline()
+        pipe.delete(self.prefix + key)
+        pipe.incr(self.version_prefix + key)
+        pipe.expire(self.version_prefix + key, self.VERSION_TTL)
+        pipe.execute()
+
+    def clear(self):
+        self._redis.incr(self._generation)
+        for key in self._redis.scan_iter(self.prefix + "*"):
+            self._redis.delete(key)
+
+    def __len__(self):
+        return sum(1 for _ in self._redis.scan_iter(self.prefix + "*"))
+
+
+class MetadataCache:
+    """Cache of assembled /metadata responses keyed by (category_name, title).
+
+    A load that started before a write can finish after the write's
+    invalidation. Loaders read version() before querying and pass it to
+    set(), which drops the document if the key was invalidated since.
+    """
+
+    def __init__(self, backend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.stale_writes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(category_name: str, title: str) -> str:
+        return json.dumps([category_name, title])
+
+    def get(self, category_name: str, title: str):
+        value = self.backend.get(self.key(category_name, title))
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def peek(self, category_name: str, title: str):
+        # Lookup that leaves the hit/miss counters alone (validators, stats)
+        return self.backend.get(self.key(category_name, title))
+
+    def version(self, category_name: str, title: str):
+        return self.backend.version(self.key(category_name, title))
+
+    def set(self, category_name: str, title: str, value, version=None):
+        if not self.backend.set(self.key(category_name, title), value, self.ttl, version):
+            with self._lock:
+                self.stale_writes += 1
+
+    # Async variants for handlers on the event loop: run in the thread pool
+    # when the backend blocks on the network (redis), directly otherwise
+    async def _call(self, fn, *args):
+        if self.backend.blocking:
+            return await run_in_threadpool(fn, *args)
+        return fn(*args)
+
+    async def get_async(self, category_name: str, title: str):
+        return await self._call(self.get, category_name, title)
+
+    async def peek_async(self, category_name: str, title: str):
+        return await self._call(self.peek, category_name, title)
+
+    async def version_async(self, category_name: str, title: str):
+        return await self._call(self.version, category_name, title)
+
+    async def set_async(self, category_name: str, title: str, value, version=None):
+        await self._call(self.set, category_name, title, value, version)
+
+    def invalidate(self, category_name: str, title: str):
+        self.backend.delete(self.key(category_name, title))
+        with self._lock:
+            self.invalidations += 1
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": type(self.backend).__name__,
+                "entries": len(self.backend),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "stale_writes_dropped": self.stale_writes,
+            }
+
+
+def _make_backend():
+    if METADATA_CACHE_BACKEND == "redis":
+        return RedisBackend(METADATA_CACHE_REDIS_URL, prefix="metadata:")
+    return LocalBackend(METADATA_CACHE_SIZE)
+
+
+metadata_cache = MetadataCache(_make_backend(), METADATA_CACHE_TTL)
@@ -0,0 +1,41 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Callbacks run after a dataset write has been committed. Each receives
+# (dataset_id as str, category_name, title) and keeps a derived in-memory
+# structure (response caches, the catalog snapshot, ...) in step with the tables.
+_listeners = []
+# Callbacks run after a bulk change (e.g. a catalog import) touched too many
+# datasets to replay one by one; they take no arguments and should drop or
+# fully rebuild their derived state.
+_bulk_listeners = []
+
+
+def on_dataset_changed(fn):
+    _listeners.append(fn)
+    return fn
+
+
+def dataset_changed(dataset_id, category_name: str, title: str):
+    # Listeners always get the id as text, whichever driver or payload it came from
+    dataset_id = str(dataset_id)
+    for fn in _listeners:
+        try:
+            fn(dataset_id, category_name, title)
+        except Exception:
+            # A stale derived view must never fail a write that already committed
+            logger.exception("dataset_changed listener %s failed", getattr(fn, "__name__", fn))
+
+
+def on_catalog_changed(fn):
+    _bulk_listeners.append(fn)
+    return fn
+
+
+def catalog_changed():
+    for fn in _bulk_listeners:
+        try:
+            fn()
+        except Exception:
+            logger.exception("catalog_changed listener %s failed", getattr(fn, "__name__", fn))
@@ -0,0 +1,491 @@
+import os
+import re
+import math
+import time
+import heapq
+import bisect
+import itertools
+import threading
+
+from psycopg2.extras import RealDictCursor
+
+from app.db import get_db
+from app.metrics import timed_query
+from app.catalog_events import on_dataset_changed, on_catalog_changed
+
+# Full rebuild interval, picks up writes made by other workers or directly in the DB
+CATALOG_SEARCH_MAX_AGE = float(os.getenv("CATALOG_SEARCH_MAX_AGE", "300"))
+# Vocabulary terms a single prefix may expand to
+CATALOG_SEARCH_MAX_EXPANSIONS = int(os.getenv("CATALOG_SEARCH_MAX_EXPANSIONS", "50"))
+# Terms in at least this many datasets keep a bitmap of them, for counting matches
+BITMAP_MIN_POSTINGS = 256
+
+SEARCH_DOCUMENTS_QUERY = """
+    SELECT
+        ds.dataset_id,
+        cat.category_name,
+        ds.title AS dataset_title,
+        ds.description,
+        ds.keywords,
+        (SELECT string_agg(concat_ws(' ', dm.field_name, dm.ontology_mapping_to_display), ' ')
+           FROM dataset_mapping dm
+          WHERE dm.dataset_id = ds.dataset_id) AS field_names
+    FROM
+        dataset_master ds
+    JOIN
+        category_master cat ON cat.category_id = ds.category_id
+    WHERE
+        ds.is_active = true
+"""
+
+# Where a term occurs decides how much a match on it counts
+FIELD_WEIGHTS = (
+    ("dataset_title", 3.0),
+    ("keywords", 2.0),
+    ("field_names", 1.5),
+    ("description", 1.0),
+)
+EXACT = 1.0
+PREFIX = 0.8
+FUZZY = 0.6
+
+# Shortest query tokens that get prefix / typo-tolerant matching
+MIN_PREFIX_LENGTH = 3
+MIN_FUZZY_LENGTH = 4
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text) -> list:
+    return _TOKEN.findall(str(text).casefold()) if text else []
+
+
+def _category_key(category_name):
+    return category_name.casefold() if category_name else None
+
+
+def _deletes(term: str) -> set:
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+def _within_one_edit(a: str, b: str) -> bool:
+    # Levenshtein distance <= 1, plus adjacent transpositions
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) == len(b):
+        diff = [i for i in range(len(a)) if a[i] != b[i]]
+        return len(diff) == 1 or (
+            len(diff) == 2 and diff[1] == diff[0] + 1
+            and a[diff[0]] == b[diff[1]] and a[diff[1]] == b[diff[0]]
+        )
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i:] == b[i + 1:]
+
+
+class CatalogSearchIndex:
+    """In-process inverted index over the title, keywords, field names and
+    description of every active dataset.
+
+    Each query token matches vocabulary terms exactly, by prefix and within
+    one edit (a deletion-neighbourhood index finds the candidates), and every
+    token has to match for a dataset to be returned. Datasets are ranked by
+    the sum over tokens of field weight x match quality x idf. A page is found
+    by walking each token's postings in rank order (see _top) and the number
+    of matches by ANDing bitmaps, so common terms cost little more than rare
+    ones.
+    """
+
+    def __init__(self, max_age: float):
+        self.max_age = max_age
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self._built_at = None
+        self._docs = {}        # str(dataset_id) -> result entry
+        self._doc_terms = {}   # str(dataset_id) -> {term: weight}
+        self._postings = {}    # term -> {str(dataset_id): weight}
+        self._deletes = {}     # term with one character removed -> {term, ...}
+        self._vocabulary = []  # sorted terms, for prefix lookups
+        self._vocabulary_dirty = False
+        self._rank_keys = {}   # str(dataset_id) -> (casefolded title, id), the tie-break
+        self._numbers = {}     # str(dataset_id) -> bit number in the bitmaps
+        self._next_number = 0
+        # term / casefolded category -> int with the bits of its datasets set.
+        # Built with the index for common terms, on first use for the rest,
+        # and kept up to date after, like _ranked.
+        self._term_bitmaps = {}
+        self._category_bitmaps = {}
+        # Postings in rank order, likewise: term -> [str(dataset_id), ...]
+        # by (-weight, rank key)
+        self._ranked = {}
+        self._ranked_all = None  # every dataset by rank key, for an empty query
+        self.full_builds = 0
+        self.incremental_builds = 0
+        self.searches = 0
+
+    def _fetch(self, dataset_id=None):
+        with get_db() as conn, timed_query("catalog_search_index"):
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            if dataset_id is None:
+                cursor.execute(SEARCH_DOCUMENTS_QUERY + ";")
+            else:
+                cursor.execute(SEARCH_DOCUMENTS_QUERY + " AND ds.dataset_id = %s;", (dataset_id,))
+            return cursor.fetchall()
+
+    # ---------- maintenance (callers hold the lock) ----------
+    def _add(self, row):
+        # Keyed by the id as text, as catalog events report it
+        dataset_id = str(row["dataset_id"])
+        terms = {}
+        for column, weight in FIELD_WEIGHTS:
+            for term in tokenize(row.get(column)):
+                if terms.get(term, 0) < weight:
+                    terms[term] = weight
+        self._docs[dataset_id] = {
+            "dataset_id": row["dataset_id"],
+            "category_name": row["category_name"],
+            "dataset_title": row["dataset_title"],
+            "description": row.get("description"),
+            "keywords": row.get("keywords"),
+        }
+        self._doc_terms[dataset_id] = terms
+        self._rank_keys[dataset_id] = (str(row["dataset_title"]).casefold(), dataset_id)
+        bit = 1 << self._next_number
+        self._numbers[dataset_id] = self._next_number
+        self._next_number += 1
+        category = _category_key(row["category_name"])
+        if category in self._category_bitmaps:
+            self._category_bitmaps[category] |= bit
+        if self._ranked_all is not None:
+            bisect.insort(self._ranked_all, dataset_id, key=self._rank_keys.__getitem__)
+        for term, weight in terms.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                for variant in _deletes(term):
+                    self._deletes.setdefault(variant, set()).add(term)
+                self._vocabulary_dirty = True
+            postings[dataset_id] = weight
+            ranked = self._ranked.get(term)
+            if ranked is not None:
+                bisect.insort(ranked, dataset_id, key=self._posting_key(postings))
+            if term in self._term_bitmaps:
+                self._term_bitmaps[term] |= bit
+
+    def _remove(self, dataset_id):
+        doc = self._docs.pop(dataset_id, None)
+        if doc is None:
+            return
+        del self._rank_keys[dataset_id]
+        bit = 1 << self._numbers.pop(dataset_id)
+        category = _category_key(doc["category_name"])
+        if category in self._category_bitmaps:
+            self._category_bitmaps[category] &= ~bit
+        if self._ranked_all is not None:
+            self._ranked_all.remove(dataset_id)
+        for term in self._doc_terms.pop(dataset_id, {}):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(dataset_id, None)
+            ranked = self._ranked.get(term)
+            if ranked is not None:
+                ranked.remove(dataset_id)
+            if term in self._term_bitmaps:
+                self._term_bitmaps[term] &= ~bit
+            if not postings:
+                del self._postings[term]
+                self._ranked.pop(term, None)
+                self._term_bitmaps.pop(term, None)
+                for variant in _deletes(term):
+                    bucket = self._deletes.get(variant)
+                    if bucket is not None:
+                        bucket.discard(term)
+                        if not bucket:
+                            del self._deletes[variant]
+                self._vocabulary_dirty = True
+
+    def rebuild(self):
+        rows = self._fetch()
+        # Built aside and swapped in, so searches keep running meanwhile
+        fresh = CatalogSearchIndex(self.max_age)
+        for row in rows:
+            fresh._add(row)
+        fresh._prepare()
+        with self._lock:
+            self._docs = fresh._docs
+            self._doc_terms = fresh._doc_terms
+            self._postings = fresh._postings
+            self._deletes = fresh._deletes
+            self._rank_keys = fresh._rank_keys
+            self._numbers = fresh._numbers
+            self._next_number = fresh._next_number
+            self._term_bitmaps = fresh._term_bitmaps
+            self._category_bitmaps = fresh._category_bitmaps
+            self._ranked = fresh._ranked
+            self._ranked_all = fresh._ranked_all
+            self._vocabulary = sorted(self._postings)
+            self._vocabulary_dirty = False
+            self._built_at = time.monotonic()
+            self.full_builds += 1
+
+    def _prepare(self):
+        # What a search would otherwise build on first use of a common term;
+        # sorting one of those takes longer than searching it ever does
+        self._ranked_all = sorted(self._docs, key=self._rank_keys.__getitem__)
+        order = {dataset_id: i for i, dataset_id in enumerate(self._ranked_all)}
+        for term, postings in self._postings.items():
+            if len(postings) >= BITMAP_MIN_POSTINGS:
+                self._ranked[term] = sorted(postings, key=lambda d: (-postings[d], order[d]))
+                self._term_bitmaps[term] = self._bitmap(postings)
+        for category in {_category_key(doc["category_name"]) for doc in self._docs.values()}:
+            self._category_bitmap(category)
+
+    def refresh_dataset(self, dataset_id):
+        dataset_id = str(dataset_id)
+        with self._lock:
+            if self._built_at is None:
+                return  # nothing built yet, the next search does a full build
+        rows = self._fetch(dataset_id)
+        with self._lock:
+            self._remove(dataset_id)
+            for row in rows:  # empty when the dataset is gone or inactive
+                self._add(row)
+            self.incremental_builds += 1
+
+    def stale(self) -> bool:
+        with self._lock:
+            built_at = self._built_at
+        return built_at is None or time.monotonic() - built_at > self.max_age
+
+    def invalidate(self):
+        with self._lock:
+            self._built_at = None
+
+    def expired(self) -> bool:
+        # Built, but older than max_age: still good enough to answer from
+        with self._lock:
+            built_at = self._built_at
+        return built_at is not None and time.monotonic() - built_at > self.max_age
+
+    def ensure_fresh(self):
+        if self.stale():
+            with self._build_lock:
+                if self.stale():  # another request may have just rebuilt it
+                    self.rebuild()
+
+    def rebuild_in_background(self):
+        # No-op when a build is already running
+        if not self._build_lock.acquire(blocking=False):
+            return
+        try:
+            if self.stale():
+                self.rebuild()
+        finally:
+            self._build_lock.release()
+
+    # ---------- querying ----------
+    def _candidates(self, token: str) -> list:
+        # (term, match quality) for every vocabulary term the token may stand for
+        found = {}
+        if token in self._postings:
+            found[token] = EXACT
+        if len(token) >= MIN_PREFIX_LENGTH:
+            if self._vocabulary_dirty:
+                self._vocabulary = sorted(self._postings)
+                self._vocabulary_dirty = False
+            start = bisect.bisect_left(self._vocabulary, token)
+            for term in self._vocabulary[start:start + CATALOG_SEARCH_MAX_EXPANSIONS]:
+                if not term.startswith(token):
+                    break
+                found.setdefault(term, PREFIX)
+        if len(token) >= MIN_FUZZY_LENGTH:
+            near = set(self._deletes.get(token, ()))
+            for variant in _deletes(token):
+                if variant in self._postings:
+                    near.add(variant)
+                near.update(self._deletes.get(variant, ()))
+            for term in near:
+                if term not in found and _within_one_edit(token, term):
+                    found[term] = FUZZY
+        return list(found.items())
+
+    def _posting_key(self, postings: dict):
+        rank_keys = self._rank_keys
+        return lambda dataset_id: (-postings[dataset_id], rank_keys[dataset_id])
+
+    def _ranked_postings(self, term: str) -> list:
+        ranked = self._ranked.get(term)
+        if ranked is None:
+            postings = self._postings[term]
+            ranked = self._ranked[term] = sorted(postings, key=self._posting_key(postings))
+        return ranked
+
+    def _term_stream(self, term: str, factor: float):
+        postings, rank_keys = self._postings[term], self._rank_keys
+        for dataset_id in self._ranked_postings(term):
+            yield -postings[dataset_id] * factor, rank_keys[dataset_id], dataset_id
+
+    def _token_stream(self, scorers: list):
+        # (score, rank key, dataset_id) for one query token in rank order,
+        # each dataset once, at the best score any of its terms gives it
+        streams = [self._term_stream(term, factor) for term, factor in scorers]
+        merged = streams[0] if len(streams) == 1 else heapq.merge(*streams)
+        seen = set()
+        for neg_score, rank_key, dataset_id in merged:
+            if dataset_id not in seen:
+                seen.add(dataset_id)
+                yield -neg_score, rank_key, dataset_id
+
+    def _token_score(self, scorers: list, dataset_id) -> float:
+        return max(self._postings[term].get(dataset_id, 0) * factor for term, factor in scorers)
+
+    def _bitmap(self, dataset_ids) -> int:
+        bits = bytearray((self._next_number + 7) // 8)
+        numbers = self._numbers
+        for dataset_id in dataset_ids:
+            number = numbers[dataset_id]
+            bits[number >> 3] |= 1 << (number & 7)
+        return int.from_bytes(bits, "little")
+
+    def _term_bitmap(self, term: str) -> int:
+        bitmap = self._term_bitmaps.get(term)
+        if bitmap is None:
+            postings = self._postings[term]
+            bitmap = self._bitmap(postings)
+            if len(postings) >= BITMAP_MIN_POSTINGS:
+                self._term_bitmaps[term] = bitmap
+        return bitmap
+
+    def _category_bitmap(self, category) -> int:
+        bitmap = self._category_bitmaps.get(category)
+        if bitmap is None:
+            bitmap = self._category_bitmaps[category] = self._bitmap(
+                d for d, doc in self._docs.items() if _category_key(doc["category_name"]) == category)
+        return bitmap
+
+    def _count(self, per_token: list, wanted) -> int:
+        # Datasets matching every token and the categories, as bitmap ANDs
+        matched = None
+        if wanted is not None:
+            matched = 0
+            for category in wanted:
+                matched |= self._category_bitmap(category)
+        elif not per_token:
+            return len(self._docs)
+        for scorers in per_token:
+            token = 0
+            for term, _ in scorers:
+                token |= self._term_bitmap(term)
+            matched = token if matched is None else matched & token
+            if not matched:
+                return 0
+        return matched.bit_count()
+
+    def _top(self, per_token: list, wanted, need: int) -> list:
+        """The `need` best [((-score, rank key), dataset_id)], in rank order.
+
+        Walks every token's datasets in rank order, round robin, scoring each
+        new one in full, and stops once no dataset not yet seen can beat the
+        last one kept: its score is at most the sum of the scores the walks
+        are at, and at that score it comes after every one of them.
+        """
+        streams = [self._token_stream(scorers) for scorers in per_token]
+        last = [None] * len(streams)
+        best = []
+        seen = set()
+        while True:
+            for i, stream in enumerate(streams):
+                item = next(stream, None)
+                if item is None:
+                    return best  # every match of this token has been scored
+                score, rank_key, dataset_id = item
+                last[i] = (score, rank_key)
+                if dataset_id in seen:
+                    continue
+                seen.add(dataset_id)
+                if wanted is not None and _category_key(self._docs[dataset_id]["category_name"]) not in wanted:
+                    continue
+                # Summed in token order, so equal scores come out equal
+                total = 0.0
+                for scorers in per_token:
+                    token_score = self._token_score(scorers, dataset_id)
+                    if not token_score:
+                        break
+                    total += token_score
+                else:
+                    entry = ((-total, rank_key), dataset_id)
+                    if len(best) < need or entry < best[-1]:
+                        bisect.insort(best, entry)
+                        del best[need:]
+            if len(best) == need:
+                threshold = 0.0
+                for score, _ in last:
+                    threshold += score
+                if best[-1][0] <= (-threshold, max(rank_key for _, rank_key in last)):
+                    return best
+
+    def search(self, query: str, categories=None, offset: int = 0, limit: int = 20):
+        """Returns (total, results) for one page of the ranked matches."""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        wanted = {c.casefold() for c in categories} if categories else None
+        with self._lock:
+            self.searches += 1
+            total_docs = max(len(self._docs), 1)
+            per_token = []
+            for token in tokens:
+                candidates = self._candidates(token)
+                if not candidates:
+                    return 0, []
+                # Per-term factor: match quality x idf
+                per_token.append([
+                    (term, quality * math.log(1 + total_docs / len(self._postings[term])))
+                    for term, quality in candidates
+                ])
+            # Rarest token first: it bounds the candidates the others are checked against
+            per_token.sort(key=lambda scorers: sum(len(self._postings[term]) for term, _ in scorers))
+
+            total = self._count(per_token, wanted)
+            if not total:
+                return 0, []
+
+            docs = self._docs
+            if not per_token:
+                # No query text: list the (filtered) catalog by title
+                if self._ranked_all is None:
+                    self._ranked_all = sorted(docs, key=self._rank_keys.__getitem__)
+                listed = (d for d in self._ranked_all
+                          if wanted is None or _category_key(docs[d]["category_name"]) in wanted)
+                return total, [{**docs[d], "score": 0.0} for d in itertools.islice(listed, offset, offset + limit)]
+
+            ranked = self._top(per_token, wanted, offset + limit)[offset:]
+            return total, [{**docs[d], "score": round(-neg_score, 4)} for (neg_score, _), d in ranked]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "datasets": len(self._docs),
+                "terms": len(self._postings),
+                "age_seconds": round(time.monotonic() - self._built_at, 3) if self._built_at else None,
+                "full_builds": self.full_builds,
+                "incremental_builds": self.incremental_builds,
+                "searches": self.searches,
+            }
+
+
+catalog_search_index = CatalogSearchIndex(CATALOG_SEARCH_MAX_AGE)
+
+
+@on_dataset_changed
+def _refresh_search_index(dataset_id, category_name, title):
+    catalog_search_index.refresh_dataset(dataset_id)
+
+
+@on_catalog_changed
+def _invalidate_search_index():
+    catalog_search_index.invalidate()
@@ -0,0 +1,231 @@
+import os
+import time
+import hashlib
+import threading
+
+from psycopg2.extras import RealDictCursor
+
+from app.db import get_db
+from app.metrics import timed_query
+from app.fast_json import dumps
+from app.catalog_events import on_dataset_changed, on_catalog_changed
+
+# Full rebuild interval, picks up writes made by other workers or directly in the DB
+CATALOG_SNAPSHOT_MAX_AGE = float(os.getenv("CATALOG_SNAPSHOT_MAX_AGE", "300"))
+
+CATEGORIES_QUERY = """
+    SELECT category_name
+    FROM category_master;
+"""
+
+# One row per active dataset; fields are aggregated server-side so the
+# contacts table can no longer multiply them.
+DATASETS_QUERY = """
+    SELECT
+        cat.category_name,
+        ds.dataset_id,
+        ds.title AS dataset_title,
+        ds.description,
+        ds.keywords,
+        ds.publication_date,
+        ds.doi,
+        ds.license,
+        ds.metadata_modified_date AS last_updated,
+        ds.registration_date,
+        (SELECT c.name
+           FROM dataset_contacts c
+          WHERE c.dataset_id = ds.dataset_id
+          LIMIT 1) AS contact_name,
+        (SELECT json_agg(json_build_object(
+                    'field_name', dm.field_name,
+                    'ontology_mapping', dm.ontology_mapping,
+                    'ontology_mapping_to_display', dm.ontology_mapping_to_display,
+                    'data_type', dm.data_type)
+                    ORDER BY dm.field_name)
+           FROM dataset_mapping dm
+          WHERE dm.dataset_id = ds.dataset_id AND dm.field_name IS NOT NULL) AS fields
+    FROM
+        dataset_master ds
+    JOIN
+        category_master cat ON cat.category_id = ds.category_id
+    WHERE
+        ds.is_active = true
+"""
+
+
+def _dataset_entry(row) -> dict:
+    # metadata (renamed from hover_fields)
+    metadata = {
+        "keywords": row.get("keywords"),
+        "DOI": row.get("doi"),
+        "contacts": row.get("contact_name"),
+        "License": row.get("license", "CC-BY"),  # fallback if missing
+        "Publication Date": str(row.get("publication_date") or "2023-06-01"),
+        "Last Updated": str(row.get("last_updated") or "2025-08-06"),
+        "Registration Date": str(row.get("registration_date") or "2023-01-01")
+    }
+    return {
+        "dataset_title": row["dataset_title"],
+        "description": row.get("description"),
+        "metadata": metadata,
+        "fields": list(row.get("fields") or [])
+    }
+
+
+class CatalogSnapshot:
+    """The category -> dataset -> fields tree kept as pre-serialised JSON.
+
+    Every dataset is serialised once into its own fragment; a write only
+    re-serialises the fragment of the dataset it touched and the response body
+    is re-spliced from the cached fragments.
+    """
+
+    def __init__(self, max_age: float):
+        self.max_age = max_age
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self._built_at = None
+        self._categories = set()
+        self._rows = {}        # str(dataset_id) -> row from DATASETS_QUERY
+        self._groups = {}      # (category_name, dataset_title) -> [str(dataset_id), ...]
+        self._fragments = {}   # (category_name, dataset_title) -> bytes
+        self._body = b"[]"
+        self._etag = None
+        self.full_builds = 0
+        self.incremental_builds = 0
+
+    def _fetch(self, dataset_id=None):
+        with get_db() as conn, timed_query("catalog_snapshot"):
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            if dataset_id is None:
+                cursor.execute(CATEGORIES_QUERY)
+                categories = [row["category_name"] for row in cursor.fetchall()]
+                cursor.execute(DATASETS_QUERY + ";")
+            else:
+                categories = []
+                cursor.execute(DATASETS_QUERY + " AND ds.dataset_id = %s;", (dataset_id,))
+            return categories, cursor.fetchall()
+
+    def _render_group(self, key):
+        dataset_ids = sorted(self._groups.get(key, []), key=str)
+        if not dataset_ids:
+            self._groups.pop(key, None)
+            self._fragments.pop(key, None)
+            return
+        # Datasets sharing a title within a category are listed once, as before
+        entry = _dataset_entry(self._rows[dataset_ids[0]])
+        for dataset_id in dataset_ids[1:]:
+            entry["fields"].extend(self._rows[dataset_id].get("fields") or [])
+        if len(dataset_ids) > 1:
+            entry["fields"].sort(key=lambda f: f["field_name"])
+        self._fragments[key] = dumps(entry)
+
+    def _splice(self):
+        by_category = {category: [] for category in self._categories}
+        for key in sorted(self._fragments):
+            by_category.setdefault(key[0], []).append(self._fragments[key])
+        parts = [
+            b'{"category_name":' + dumps(category) + b',"datasets":[' + b",".join(fragments) + b"]}"
+            for category, fragments in sorted(by_category.items(), key=lambda item: item[0])
+        ]
+        self._body = b"[" + b",".join(parts) + b"]"
+        self._etag = '"' + hashlib.sha256(self._body).hexdigest()[:32] + '"'
+
+    def rebuild(self):
+        categories, rows = self._fetch()
+        with self._lock:
+            self._categories = set(categories)
+            self._rows = {}
+            self._groups = {}
+            self._fragments = {}
+            for row in rows:
+                if not row["dataset_title"]:
+                    continue
+                dataset_id = str(row["dataset_id"])
+                self._rows[dataset_id] = row
+                key = (row["category_name"], row["dataset_title"])
+                self._groups.setdefault(key, []).append(dataset_id)
+            for key in self._groups:
+                self._render_group(key)
+            self._splice()
+            self._built_at = time.monotonic()
+            self.full_builds += 1
+
+    def refresh_dataset(self, dataset_id):
+        # Keyed by the id as text: writes report it as a string, the database as an int
+        dataset_id = str(dataset_id)
+        with self._lock:
+            if self._built_at is None:
+                return  # nothing built yet, the next read does a full build
+        _, rows = self._fetch(dataset_id)
+        with self._lock:
+            touched = set()
+            old = self._rows.pop(dataset_id, None)
+            if old is not None:
+                key = (old["category_name"], old["dataset_title"])
+                self._groups[key] = [d for d in self._groups.get(key, []) if d != dataset_id]
+                touched.add(key)
+            for row in rows:  # empty when the dataset is gone or inactive
+                self._categories.add(row["category_name"])
+                if not row["dataset_title"]:
+                    continue
+                self._rows[dataset_id] = row
+                key = (row["category_name"], row["dataset_title"])
+                self._groups.setdefault(key, []).append(dataset_id)
+                touched.add(key)
+            for key in touched:
+                self._render_group(key)
+            self._splice()
+            self.incremental_builds += 1
+
+    def stale(self) -> bool:
+        with self._lock:
+            built_at = self._built_at
+        return built_at is None or time.monotonic() - built_at > self.max_age
+
+    def invalidate(self):
+        # The next read does a full rebuild
+        with self._lock:
+            self._built_at = None
+
+    def current(self):
+        # (body, etag), rebuilding first if the snapshot is missing or too old
+        if self.stale():
+            with self._build_lock:
+                if self.stale():  # another request may have just rebuilt it
+                    self.rebuild()
+        with self._lock:
+            return self._body, self._etag
+
+    def validators(self):
+        # (etag, no last modified) of the body current() would return without
+        # a rebuild, or None when it would rebuild first. metadata_modified_date
+        # does not move on every change, so the ETag alone validates
+        if self.stale():
+            return None
+        with self._lock:
+            return self._etag, None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "datasets": len(self._rows),
+                "bytes": len(self._body),
+                "etag": self._etag,
+                "age_seconds": round(time.monotonic() - self._built_at, 3) if self._built_at else None,
+                "full_builds": self.full_builds,
+                "incremental_builds": self.incremental_builds,
+            }
+
+
+catalog_snapshot = CatalogSnapshot(CATALOG_SNAPSHOT_MAX_AGE)
+
+
+@on_dataset_changed
+def _refresh_snapshot(dataset_id, category_name, title):
+    catalog_snapshot.refresh_dataset(dataset_id)
+
+
+@on_catalog_changed
+def _invalidate_snapshot():
+    catalog_snapshot.invalidate()
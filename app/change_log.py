@@ -0,0 +1,46 @@
+from fastapi import HTTPException
+from psycopg2.extras import execute_values
+
+from app.schema import schema_applied
+
+# Append-only log of catalog writes behind GET /catalog/changes. Rows are
+# written by the write endpoints in the same transaction as the change
+# itself, so the feed never shows a change that was rolled back.
+#
+# entity: "dataset" or a child collection ("contacts", "mappings", ...)
+# change: "created", "updated" or "deactivated"
+CREATED = "created"
+UPDATED = "updated"
+DEACTIVATED = "deactivated"
+DATASET = "dataset"
+
+CHANGE_LOG_INSERT = "INSERT INTO catalog_changes (dataset_id, entity, change) VALUES %s"
+
+
+def dataset_change(created: bool, is_active: bool) -> str:
+    if not is_active:
+        return DEACTIVATED
+    return CREATED if created else UPDATED
+
+
+def _require_schema():
+    # Raised inside the write's transaction, so the write is rolled back
+    if not schema_applied():
+        raise HTTPException(status_code=503, detail="Catalog change log not available yet, retry shortly.")
+
+
+def record_changes(cur, changes: list):
+    # changes: (dataset_id, entity, change) tuples
+    _require_schema()
+    if changes:
+        execute_values(cur, CHANGE_LOG_INSERT,
+                       [(str(dataset_id), entity, change) for dataset_id, entity, change in changes])
+
+
+async def record_changes_async(cur, changes: list):
+    _require_schema()
+    if changes:
+        await cur.executemany(
+            "INSERT INTO catalog_changes (dataset_id, entity, change) VALUES (%s, %s, %s)",
+            [(str(dataset_id), entity, change) for dataset_id, entity, change in changes]
+        )
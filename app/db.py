@@ -1,4 +1,10 @@
 import os
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import pool
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -11,5 +17,167 @@ DB_CONFIG = {
     "port": os.getenv("DB_PORT")
 }
 
+# Connection pool settings
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+
+
 def get_connection():
+    # Raw, unpooled connection. Request handlers should use get_db() instead.
     return psycopg2.connect(**DB_CONFIG)
+
+
+class ConnectionPool:
+    """Thread-safe psycopg2 pool that blocks (up to a timeout) when exhausted
+    instead of raising, and validates connections on checkout."""
+
+    def __init__(self, minconn: int, maxconn: int, timeout: float, **conn_kwargs):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self._pool = pool.ThreadedConnectionPool(minconn, maxconn, **conn_kwargs)
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._waiting = 0
+        self._checkouts = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._discarded = 0
+        self._wait_time = 0.0
+
+    def _healthy(self, conn) -> bool:
+        if conn.closed:
+            return False
+        try:
+            # Roll back anything a previous user left open, then ping.
+            conn.rollback()
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _checkout_healthy(self):
+        # After a database restart every idle connection is dead: discard them
+        # until one answers. Once the idle ones are gone the pool opens a new
+        # connection, so this ends within maxconn + 1 tries.
+        for _ in range(self.maxconn + 1):
+            conn = self._pool.getconn()
+            if self._healthy(conn):
+                return conn
+            self._pool.putconn(conn, close=True)
+            with self._lock:
+                self._discarded += 1
+        raise pool.PoolError("No healthy database connection available")
+
+    def getconn(self):
+        with self._lock:
+            self._waiting += 1
+        start = time.monotonic()
+        acquired = self._slots.acquire(blocking=False)
+        if not acquired:
+            with self._lock:
+                self._waits += 1
+            acquired = self._slots.acquire(timeout=self.timeout)
+        waited = time.monotonic() - start
+        with self._lock:
+            self._waiting -= 1
+            self._wait_time += waited
+            if not acquired:
+                self._timeouts += 1
+        if not acquired:
+            raise pool.PoolError(f"Timed out after {self.timeout}s waiting for a database connection")
+
+        try:
+            conn = self._checkout_healthy()
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._in_use += 1
+            self._checkouts += 1
+        return conn
+
+    def putconn(self, conn, close: bool = False):
+        try:
+            self._pool.putconn(conn, close=close or bool(conn.closed))
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    def closeall(self):
+        self._pool.closeall()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "min_size": self.minconn,
+                "max_size": self.maxconn,
+                "in_use": self._in_use,
+                "idle": len(self._pool._pool),
+                "waiting": self._waiting,
+                "saturation": round(self._in_use / self.maxconn, 3),
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "timeouts": self._timeouts,
+                "discarded": self._discarded,
+                "total_wait_seconds": round(self._wait_time, 6),
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def init_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(DB_POOL_MIN, DB_POOL_MAX, DB_POOL_TIMEOUT, **DB_CONFIG)
+    return _pool
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+
+@contextmanager
+def get_db():
+    """Check a connection out of the pool for the duration of the block.
+
+    The transaction is rolled back if the block raises; callers commit
+    explicitly on success, as with a raw psycopg2 connection.
+    """
+    db_pool = _pool or init_pool()
+    conn = db_pool.getconn()
+    broken = False
+    try:
+        yield conn
+    except Exception:
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            broken = True
+        raise
+    finally:
+        db_pool.putconn(conn, close=broken)
+
+
+def db_connection():
+    # FastAPI dependency: `conn = Depends(db_connection)`
+    with get_db() as conn:
+        yield conn
+
+
+def pool_stats() -> dict:
+    if _pool is None:
+        return {"initialized": False}
+    return {"initialized": True, **_pool.stats()}
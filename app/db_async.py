@@ -0,0 +1,89 @@
+import os
+import logging
+from contextlib import asynccontextmanager
+
+from app.db import DB_CONFIG, DB_POOL_MIN, DB_POOL_MAX, DB_POOL_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# Serve the catalog routes with psycopg 3's native async driver instead of
+# running psycopg2 calls in the thread pool. Set to false for the sync path.
+DB_ASYNC = os.getenv("DB_ASYNC", "true").lower() in ("1", "true", "yes")
+DB_ASYNC_POOL_MIN = int(os.getenv("DB_ASYNC_POOL_MIN", str(DB_POOL_MIN)))
+DB_ASYNC_POOL_MAX = int(os.getenv("DB_ASYNC_POOL_MAX", str(DB_POOL_MAX)))
+
+
+def _async_driver_available() -> bool:
+    try:
+        import psycopg  # noqa: F401  (optional dependency, `pip install psycopg[binary] psycopg_pool`)
+        import psycopg_pool  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+_pool = None
+
+
+def async_db_enabled() -> bool:
+    # True once init_async_pool() has opened the async pool
+    return _pool is not None
+
+
+async def init_async_pool():
+    global _pool
+    if _pool is not None or not DB_ASYNC:
+        return _pool
+    if not _async_driver_available():
+        logger.warning("DB_ASYNC is set but psycopg/psycopg_pool are not installed; using the sync driver")
+        return None
+
+    from psycopg_pool import AsyncConnectionPool
+
+    pool = AsyncConnectionPool(
+        kwargs={key: value for key, value in DB_CONFIG.items() if value is not None},
+        min_size=DB_ASYNC_POOL_MIN,
+        max_size=DB_ASYNC_POOL_MAX,
+        timeout=DB_POOL_TIMEOUT,
+        # Same validate-on-checkout behaviour as the sync pool
+        check=AsyncConnectionPool.check_connection,
+        open=False,
+    )
+    await pool.open()
+    _pool = pool
+    return _pool
+
+
+async def close_async_pool():
+    global _pool
+    if _pool is not None:
+        pool, _pool = _pool, None
+        await pool.close()
+
+
+@asynccontextmanager
+async def get_async_db():
+    """Async counterpart of app.db.get_db(). psycopg 3 commits the transaction
+    when the block exits cleanly and rolls it back if it raises."""
+    if _pool is None:
+        raise RuntimeError("The async database pool is not initialised")
+    async with _pool.connection() as conn:
+        yield conn
+
+
+def async_pool_stats() -> dict:
+    if _pool is None:
+        return {"initialized": False, "enabled": DB_ASYNC}
+    stats = _pool.get_stats()
+    return {
+        "initialized": True,
+        "min_size": _pool.min_size,
+        "max_size": _pool.max_size,
+        "size": stats.get("pool_size", 0),
+        "idle": stats.get("pool_available", 0),
+        "waiting": stats.get("requests_waiting", 0),
+        "checkouts": stats.get("requests_num", 0),
+        "waits": stats.get("requests_queued", 0),
+        "timeouts": stats.get("requests_errors", 0),
+        "total_wait_seconds": round(stats.get("requests_wait_ms", 0) / 1000, 6),
+    }
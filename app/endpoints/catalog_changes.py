@@ -0,0 +1,184 @@
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from psycopg2.extras import RealDictCursor
+
+from app.db import get_db
+from app.db_async import get_async_db, async_db_enabled
+from app.change_log import CREATED, UPDATED, DEACTIVATED, DATASET
+from app.metrics import timed_query
+
+router = APIRouter()
+
+CHANGES_PAGE_SIZE = 500
+CHANGES_MAX_PAGE_SIZE = 5000
+
+# Paged on (txid, change_id), off catalog_changes_txid_idx. change_id alone
+# is not a safe cursor: ids are taken when a write runs, not when it commits,
+# so a slow write can commit an id below one already served. Only rows whose
+# transaction is older than every transaction still running are served;
+# no row can appear below that horizon any more.
+CHANGES_QUERY = """
+    SELECT change_id, txid, dataset_id, entity, change, changed_at
+    FROM catalog_changes
+    WHERE (txid, change_id) > (%s, %s)
+      AND txid < txid_snapshot_xmin(txid_current_snapshot())
+    ORDER BY txid, change_id
+    LIMIT %s;
+"""
+
+# Current state of the datasets named in one page of the log
+CURRENT_QUERY = """
+    SELECT
+        ds.dataset_id::text AS dataset_id,
+        cat.category_name,
+        ds.title AS dataset_title,
+        ds.description,
+        ds.keywords,
+        ds.doi,
+        ds.license,
+        ds.is_active,
+        ds.publication_date,
+        ds.metadata_modified_date AS last_updated,
+        ds.registration_date,
+        (SELECT json_agg(json_build_object(
+                    'field_name', m.field_name,
+                    'ontology_mapping', m.ontology_mapping,
+                    'ontology_mapping_to_display', m.ontology_mapping_to_display,
+                    'data_type', m.data_type)
+                    ORDER BY m.field_name)
+           FROM dataset_mapping m
+          WHERE m.dataset_id = ds.dataset_id) AS mappings,
+        (SELECT json_agg(json_build_object(
+                    'name', c.name,
+                    'role', c.role,
+                    'email', c.email,
+                    'organization', c.organization))
+           FROM dataset_contacts c
+          WHERE c.dataset_id = ds.dataset_id) AS contacts
+    FROM
+        dataset_master ds
+    JOIN
+        category_master cat ON cat.category_id = ds.category_id
+    WHERE
+        ds.dataset_id::text = ANY(%s);
+"""
+
+# Child collections whose current rows are sent along when they changed
+FEED_COLLECTIONS = ("mappings", "contacts")
+
+
+def _parse_cursor(since: Optional[str]) -> tuple:
+    # "<txid>.<change_id>" of the last change served
+    if since is None or since == "":
+        return 0, 0
+    try:
+        txid, change_id = (int(part) for part in since.split("."))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+    if txid < 0 or change_id < 0:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+    return txid, change_id
+
+
+def _format_cursor(txid: int, change_id: int) -> str:
+    return "%d.%d" % (txid, change_id)
+
+
+def _build_feed(log, current, since: tuple, limit: int) -> dict:
+    has_more = len(log) > limit
+    log = log[:limit]
+
+    # Collapse the page to one entry per dataset, in order of its last change
+    grouped = {}
+    for entry in log:
+        group = grouped.pop(entry["dataset_id"], None) or {
+            "dataset_id": entry["dataset_id"], "entities": [], "dataset_changes": []
+        }
+        if entry["entity"] not in group["entities"]:
+            group["entities"].append(entry["entity"])
+        if entry["entity"] == DATASET:
+            group["dataset_changes"].append(entry["change"])
+        group["changed_at"] = entry["changed_at"]
+        grouped[entry["dataset_id"]] = group
+
+    changes = []
+    for dataset_id, group in grouped.items():
+        seen = group.pop("dataset_changes")
+        if seen and seen[-1] == DEACTIVATED:
+            change = DEACTIVATED
+        elif CREATED in seen:
+            # A mirror that has not seen the creation yet gets the full dataset
+            change = CREATED
+        else:
+            change = UPDATED
+
+        row = current.get(dataset_id)
+        item = {"dataset_id": dataset_id, "change": change, **group}
+        if row is None:
+            item["dataset"] = None
+        else:
+            row = dict(row)
+            children = {name: row.pop(name) or [] for name in FEED_COLLECTIONS}
+            item["dataset"] = row
+            for name in FEED_COLLECTIONS:
+                if change == CREATED or name in group["entities"]:
+                    item[name] = children[name]
+        changes.append(item)
+
+    return {
+        "changes": changes,
+        "next_cursor": _format_cursor(*((log[-1]["txid"], log[-1]["change_id"]) if log else since)),
+        "has_more": has_more
+    }
+
+
+def load_changes(since: tuple, limit: int) -> dict:
+    with get_db() as conn:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        with timed_query("catalog_changes"):
+            cursor.execute(CHANGES_QUERY, (*since, limit + 1))
+            log = cursor.fetchall()
+        current = {}
+        dataset_ids = list({entry["dataset_id"] for entry in log[:limit]})
+        if dataset_ids:
+            with timed_query("catalog_changes_datasets"):
+                cursor.execute(CURRENT_QUERY, (dataset_ids,))
+                current = {row["dataset_id"]: row for row in cursor.fetchall()}
+    return _build_feed(log, current, since, limit)
+
+
+async def load_changes_async(since: tuple, limit: int) -> dict:
+    from psycopg.rows import dict_row
+
+    async with get_async_db() as conn:
+        cursor = conn.cursor(row_factory=dict_row)
+        with timed_query("catalog_changes"):
+            await cursor.execute(CHANGES_QUERY, (*since, limit + 1))
+            log = await cursor.fetchall()
+        current = {}
+        dataset_ids = list({entry["dataset_id"] for entry in log[:limit]})
+        if dataset_ids:
+            with timed_query("catalog_changes_datasets"):
+                await cursor.execute(CURRENT_QUERY, (dataset_ids,))
+                current = {row["dataset_id"]: row for row in await cursor.fetchall()}
+    return _build_feed(log, current, since, limit)
+
+
+@router.get("/catalog/changes")
+async def get_catalog_changes(
+    since: Optional[str] = None,
+    limit: int = Query(CHANGES_PAGE_SIZE, ge=1, le=CHANGES_MAX_PAGE_SIZE)
+):
+    """Datasets created, updated or deactivated after the `since` cursor, one
+    entry per dataset with its current state (and its mappings/contacts when
+    those changed). Pass `next_cursor` back as `since`; while `has_more` is
+    true there are further pages. Without a cursor the feed starts at the
+    beginning of the log. Changes show up once every transaction that was
+    running when they were written has finished, so a long-running write
+    holds the feed back until it ends."""
+    after = _parse_cursor(since)
+    if async_db_enabled():
+        return await load_changes_async(after, limit)
+    return await run_in_threadpool(load_changes, after, limit)
@@ -0,0 +1,322 @@
+import io
+import os
+import csv
+import json
+import codecs
+import logging
+from datetime import date
+from typing import List, Optional
+
+import psycopg2
+from fastapi import APIRouter, Request
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+
+from app.db import get_db
+from app.catalog_events import catalog_changed
+from app.metrics import timed_query
+from app.change_log import record_changes, dataset_change, DATASET, UPDATED
+from app.endpoints.dataset_master import DatasetMasterInput
+from app.endpoints.dataset_details import (
+    Scope, Publisher, Contact, Mapping, Metric, Statistic, CHILD_TABLES
+)
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# Records per staging load / transaction
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+
+MASTER_COLUMNS = (
+    "title", "description", "citation", "doi", "language",
+    "data_language", "license", "publication_date",
+    "metadata_modified_date", "registration_date", "is_active",
+    "keywords", "dataset_type", "category_id"
+)
+
+
+# ---------- Records ----------
+class DatasetImportRecord(DatasetMasterInput):
+    # A collection left out (or null) keeps the dataset's existing child rows;
+    # a list, even an empty one, replaces them.
+    scopes: Optional[List[Scope]] = None
+    publishers: Optional[List[Publisher]] = None
+    contacts: Optional[List[Contact]] = None
+    mappings: Optional[List[Mapping]] = None
+    metrics: Optional[List[Metric]] = None
+    statistics: Optional[List[Statistic]] = None
+
+
+def _validation_message(e: ValidationError) -> str:
+    return "; ".join(
+        "%s: %s" % (".".join(str(part) for part in error["loc"]) or "record", error["msg"])
+        for error in e.errors()
+    )
+
+
+async def _lines(stream):
+    # Decodes the request body chunk by chunk and yields complete lines, with
+    # their 1-based line numbers
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+    number = 0
+    async for chunk in stream:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            number += 1
+            yield number, line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield number + 1, pending.rstrip("\r")
+
+
+# Readers yield (line number, raw record), the line being the first physical
+# line of the record; raw is an exception when the record cannot be read.
+
+async def _ndjson_records(lines):
+    async for number, line in lines:
+        if line.strip():
+            try:
+                yield number, json.loads(line)
+            except ValueError as e:
+                # Lines are independent, so the upload carries on after a bad one
+                yield number, e
+
+
+async def _csv_records(lines):
+    # Master columns as plain cells, child collections as JSON arrays.
+    # Quoted cells may span lines, so a record ends at a line with balanced quotes.
+    # A malformed record ends the upload: the reader cannot resync reliably.
+    header = None
+    buffered = []
+    first = None
+    async for number, line in lines:
+        if not buffered:
+            first = number
+        buffered.append(line)
+        if "\n".join(buffered).count('"') % 2:
+            continue
+        text = "\n".join(buffered)
+        buffered = []
+        if not text.strip():
+            continue
+        try:
+            row = next(csv.reader([text]))
+            if header is None:
+                header = [name.strip() for name in row]
+                continue
+            # CSV cannot tell an empty cell from a null: both are None
+            record = dict.fromkeys(MASTER_COLUMNS)
+            for name, value in zip(header, row):
+                if value == "":
+                    continue
+                record[name] = json.loads(value) if name in CHILD_TABLES else value
+        except (ValueError, csv.Error) as e:
+            yield first, e
+            return
+        yield first, record
+    if buffered:
+        yield first, ValueError("unterminated quoted field")
+
+
+async def _parse(request: Request):
+    # Yields (line, record or None, error or None)
+    content_type = request.headers.get("content-type", "")
+    reader = _csv_records if "csv" in content_type else _ndjson_records
+    async for line, raw in reader(_lines(request.stream())):
+        if isinstance(raw, Exception):
+            yield line, None, "unreadable record: %s" % raw
+            continue
+        try:
+            yield line, DatasetImportRecord.model_validate(raw), None
+        except ValidationError as e:
+            yield line, None, _validation_message(e)
+
+
+# ---------- COPY ----------
+def _copy_value(value) -> str:
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, date):
+        return value.isoformat()
+    return (str(value).replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r"))
+
+
+def _copy(cur, table: str, columns, rows):
+    data = io.StringIO()
+    for row in rows:
+        data.write("\t".join(_copy_value(v) for v in row))
+        data.write("\n")
+    data.seek(0)
+    cur.copy_expert("COPY %s (%s) FROM STDIN" % (table, ", ".join(columns)), data)
+
+
+def _stage(cur, staging: str, table: str, columns):
+    # Same column types as the target table, dropped at commit
+    cur.execute("CREATE TEMP TABLE %s ON COMMIT DROP AS SELECT %s FROM %s WITH NO DATA;"
+                % (staging, ", ".join(columns), table))
+    cur.execute("ALTER TABLE %s ADD COLUMN line_no integer;" % staging)
+
+
+def load_batch(batch: list) -> dict:
+    """Upserts one batch of (line, record) in a single transaction, matching
+    existing datasets on (category_id, title). Returns line -> (status, dataset_id)."""
+    master_columns = ", ".join(MASTER_COLUMNS)
+    with get_db() as conn, timed_query("catalog_import_batch"):
+        cur = conn.cursor()
+
+        cur.execute("""
+            CREATE TEMP TABLE import_master ON COMMIT DROP AS
+            SELECT dataset_id, %s FROM dataset_master WITH NO DATA;
+        """ % master_columns)
+        cur.execute("ALTER TABLE import_master ADD COLUMN line_no integer;")
+        _copy(cur, "import_master", ("line_no",) + MASTER_COLUMNS, [
+            (line, *(getattr(record, column) for column in MASTER_COLUMNS))
+            for line, record in batch
+        ])
+
+        cur.execute("""
+            UPDATE dataset_master ds SET %s
+            FROM import_master s
+            WHERE ds.category_id = s.category_id AND ds.title = s.title
+            RETURNING s.line_no;
+        """ % ", ".join("%s = s.%s" % (c, c) for c in MASTER_COLUMNS if c not in ("title", "category_id")))
+        updated = {row[0] for row in cur.fetchall()}
+
+        cur.execute("""
+            INSERT INTO dataset_master (%s)
+            SELECT %s FROM import_master s
+            WHERE NOT EXISTS (
+                SELECT 1 FROM dataset_master ds
+                WHERE ds.category_id = s.category_id AND ds.title = s.title
+            );
+        """ % (master_columns, ", ".join("s." + c for c in MASTER_COLUMNS)))
+
+        cur.execute("""
+            UPDATE import_master s SET dataset_id = ds.dataset_id
+            FROM dataset_master ds
+            WHERE ds.category_id = s.category_id AND ds.title = s.title;
+        """)
+        cur.execute("SELECT line_no, dataset_id FROM import_master;")
+        dataset_ids = dict(cur.fetchall())
+
+        for collection, (table, columns, to_row) in CHILD_TABLES.items():
+            replacing = [(line, getattr(record, collection)) for line, record in batch
+                         if getattr(record, collection) is not None]
+            if not replacing:
+                continue
+            cur.execute("""
+                DELETE FROM %s WHERE dataset_id IN (
+                    SELECT dataset_id FROM import_master WHERE line_no = ANY(%%s)
+                );
+            """ % table, ([line for line, _ in replacing],))
+            rows = [(line, *to_row(item)) for line, items in replacing for item in items]
+            if not rows:
+                continue
+            staging = "import_" + table
+            _stage(cur, staging, table, columns)
+            _copy(cur, staging, ("line_no",) + columns, rows)
+            cur.execute("""
+                INSERT INTO %s (dataset_id, %s)
+                SELECT s.dataset_id, %s
+                FROM %s c JOIN import_master s ON s.line_no = c.line_no;
+            """ % (table, ", ".join(columns), ", ".join("c." + c for c in columns), staging))
+
+        changes = []
+        for line, record in batch:
+            dataset_id = dataset_ids.get(line)
+            changes.append((dataset_id, DATASET, dataset_change(line not in updated, record.is_active)))
+            changes.extend((dataset_id, collection, UPDATED) for collection in CHILD_TABLES
+                           if getattr(record, collection) is not None)
+        record_changes(cur, changes)
+
+        conn.commit()
+        cur.close()
+
+    return {
+        line: ("updated" if line in updated else "created", str(dataset_ids.get(line)))
+        for line, _ in batch
+    }
+
+
+def load_batch_or_isolate(batch: list) -> dict:
+    # On failure, retry record by record so the report names the bad records
+    # and the rest of the batch still lands
+    try:
+        return load_batch(batch)
+    except psycopg2.Error as e:
+        if len(batch) == 1:
+            return {batch[0][0]: ("error", str(e).strip())}
+    outcome = {}
+    for item in batch:
+        outcome.update(load_batch_or_isolate([item]))
+    return outcome
+
+
+# ---------- API ----------
+@router.post("/catalog/import")
+async def import_catalog(request: Request):
+    """Bulk-registers datasets with their child records.
+
+    The body is streamed as NDJSON (one dataset per line, the fields of
+    /dataset-master plus the child lists of /dataset-details) or, with a
+    text/csv content type, CSV with a header row and child lists as JSON
+    cells. Datasets are matched on (category_id, title): existing ones are
+    updated, the rest created. Each result's "line" is the physical line of
+    the body the record starts on.
+    """
+    results = []
+    batch = {}  # (category_id, title) -> (line, record), later lines win
+    changed = False
+
+    def report(line, title, status, detail):
+        entry = {"line": line, "title": title, "status": status}
+        entry["error" if status == "error" else "dataset_id"] = detail
+        results.append(entry)
+
+    async def flush():
+        nonlocal changed
+        items = sorted(batch.values(), key=lambda item: item[0])
+        batch.clear()
+        try:
+            outcome = await run_in_threadpool(load_batch_or_isolate, items)
+        except Exception:
+            # Records isolated one by one before the failure are committed
+            changed = True
+            raise
+        for line, record in items:
+            status, detail = outcome[line]
+            changed = changed or status != "error"
+            report(line, record.title, status, detail)
+
+    try:
+        async for line, record, error in _parse(request):
+            if error:
+                report(line, None, "error", error)
+                continue
+            key = (record.category_id, record.title)
+            if key in batch:
+                earlier = batch[key][0]
+                results.append({"line": earlier, "title": record.title, "status": "superseded", "by_line": line})
+            batch[key] = (line, record)
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                await flush()
+        if batch:
+            await flush()
+    finally:
+        # Batches already committed stay committed even if the upload fails
+        # or the client goes away later, so derived views are refreshed
+        # either way. Listeners rebuild synchronously: off the event loop.
+        if changed:
+            await run_in_threadpool(catalog_changed)
+
+    results.sort(key=lambda entry: entry["line"])
+    summary = {status: 0 for status in ("created", "updated", "superseded", "error")}
+    for entry in results:
+        summary[entry["status"]] += 1
+    return {"summary": {"records": len(results), **summary}, "results": results}
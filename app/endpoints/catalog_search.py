@@ -0,0 +1,39 @@
+import asyncio
+from typing import List, Optional
+
+from fastapi import APIRouter, Query
+from fastapi.concurrency import run_in_threadpool
+
+from app.catalog_search import catalog_search_index
+
+router = APIRouter()
+
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+
+
+@router.get("/catalog/search")
+async def search_catalog(
+    q: str = "",
+    category: Optional[List[str]] = Query(None),
+    limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=SEARCH_MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0)
+):
+    """Ranked search over dataset titles, keywords, field names and
+    descriptions. Every word has to match, exactly, as a prefix or within one
+    typo; `category` (repeatable) restricts the results to those categories."""
+    # Only a (rare) rebuild touches the database, and that runs off the event
+    # loop; an index that merely aged out keeps answering while it is rebuilt
+    if catalog_search_index.expired():
+        asyncio.ensure_future(run_in_threadpool(catalog_search_index.rebuild_in_background))
+    elif catalog_search_index.stale():
+        await run_in_threadpool(catalog_search_index.ensure_fresh)
+    # A search over many matches is still milliseconds of Python: off the loop
+    total, results = await run_in_threadpool(catalog_search_index.search, q, category, offset, limit)
+    return {
+        "query": q,
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "results": results
+    }
@@ -1,24 +1,44 @@
-from fastapi import APIRouter
-from app.db import get_connection
+from fastapi import APIRouter, Response
+from fastapi.concurrency import run_in_threadpool
+from app.db import get_db
+from app.db_async import get_async_db, async_db_enabled
+from app.catalog_snapshot import catalog_snapshot
+from app.metrics import timed_query
 from psycopg2.extras import RealDictCursor
 
 router = APIRouter()
 
+CATEGORIES_QUERY = """
+    SELECT category_id, category_name
+    FROM category_master
+    ORDER BY category_name;
+"""
 
-@router.get("/categories")
-def get_categories():
-    conn = get_connection()
-    try:
+
+def load_categories():
+    with get_db() as conn:
         cursor = conn.cursor(cursor_factory=RealDictCursor)
-        cursor.execute("""
-            SELECT category_id, category_name
-            FROM category_master
-            ORDER BY category_name;
-        """)
-        categories = cursor.fetchall()
+        with timed_query("categories"):
+            cursor.execute(CATEGORIES_QUERY)
+            categories = cursor.fetchall()
         return categories
-    finally:
-        conn.close()
+
+
+async def load_categories_async():
+    from psycopg.rows import dict_row
+
+    async with get_async_db() as conn:
+        cursor = conn.cursor(row_factory=dict_row)
+        with timed_query("categories"):
+            await cursor.execute(CATEGORIES_QUERY)
+            return await cursor.fetchall()
+
+
+@router.get("/categories")
+async def get_categories():
+    if async_db_enabled():
+        return await load_categories_async()
+    return await run_in_threadpool(load_categories)
 
 
 
@@ -91,98 +111,12 @@ def get_categories():
 #     finally:
 #         conn.close()
 @router.get("/categories-with-datasets")
-def get_categories_with_datasets():
-    conn = get_connection()
-    try:
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        cursor.execute("""
-            SELECT 
-                cat.category_name, 
-                ds.dataset_id, 
-                ds.title AS dataset_title,
-                ds.description,
-                ds.keywords,
-                ds.publication_date,
-                ds.doi,
-                ds.license,
-                ds.metadata_modified_date AS last_updated,
-                ds.registration_date,
-                c.name AS contact_name,
-                dm.field_name, 
-                dm.ontology_mapping,
-                dm.ontology_mapping_to_display,
-                dm.data_type
-            FROM 
-                category_master cat
-            LEFT JOIN 
-                dataset_master ds ON ds.category_id = cat.category_id AND ds.is_active = true
-            LEFT JOIN
-                dataset_mapping dm ON dm.dataset_id = ds.dataset_id
-            LEFT JOIN
-                dataset_contacts c ON c.dataset_id = ds.dataset_id
-            ORDER BY 
-                cat.category_name, ds.title, dm.field_name;
-        """)
-        
-        rows = cursor.fetchall()
-        category_map = {}
-        
-        for row in rows:
-            category = row["category_name"]
-            dataset_title = row["dataset_title"]  # May be None
-            dataset_id = row["dataset_id"]
-
-            # metadata (renamed from hover_fields)
-            metadata = {
-                "keywords": row.get("keywords"),
-                "DOI": row.get("doi"),
-                "contacts": row.get("contact_name"),
-                "License": row.get("license", "CC-BY"),  # fallback if missing
-                "Publication Date": str(row.get("publication_date") or "2023-06-01"),
-                "Last Updated": str(row.get("last_updated") or "2025-08-06"),
-                "Registration Date": str(row.get("registration_date") or "2023-01-01")
-            }
-
-            field_info = {
-                "field_name": row["field_name"],
-                "ontology_mapping": row["ontology_mapping"],
-                "ontology_mapping_to_display": row["ontology_mapping_to_display"],
-                "data_type": row["data_type"]
-            }
-            
-            if category not in category_map:
-                category_map[category] = {}
-                
-            if dataset_title:
-                if dataset_title not in category_map[category]:
-                    category_map[category][dataset_title] = {
-                        "description": row.get("description"),
-                        "metadata": metadata,   # updated here
-                        "fields": []
-                    }
-                
-                # Append field details if they are present
-                if field_info["field_name"]:  
-                    category_map[category][dataset_title]["fields"].append(field_info)
-        
-        # Transform the map into the desired output format
-        result = [
-            {
-                "category_name": category, 
-                "datasets": [
-                    {
-                        "dataset_title": dataset_title,
-                        "description": datasets_info["description"],
-                        "metadata": datasets_info["metadata"],   # updated here
-                        "fields": datasets_info["fields"]
-                    }
-                    for dataset_title, datasets_info in category_map[category].items()
-                ]
-            }
-            for category in category_map
-        ]
-        
-        return result
-    
-    finally:
-        conn.close()
+async def get_categories_with_datasets():
+    # Served from the pre-serialised catalog snapshot; see app/catalog_snapshot.py.
+    # Only a (rare) rebuild touches the database, and that runs off the event loop.
+    # ETag and 304s come from its CachePolicy (app/main.py).
+    if catalog_snapshot.stale():
+        body, _ = await run_in_threadpool(catalog_snapshot.current)
+    else:
+        body, _ = catalog_snapshot.current()
+    return Response(content=body, media_type="application/json")
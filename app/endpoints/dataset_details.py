@@ -1,7 +1,14 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
+import psycopg2
+from psycopg2.extras import execute_values
 from pydantic import BaseModel
 from typing import List, Optional
-from app.db import get_connection
+from app.db import get_db
+from app.db_async import get_async_db, async_db_enabled
+from app.catalog_events import dataset_changed
+from app.metrics import timed_query
+from app.change_log import record_changes, record_changes_async, UPDATED
 from datetime import date
 
 router = APIRouter()
@@ -51,80 +58,135 @@ class DatasetDetailsInput(BaseModel):
     metrics: Optional[List[Metric]] = []
     statistics: Optional[List[Statistic]] = []
 
+# ---------- Bulk insert ----------
+# One multi-row INSERT per child table instead of one round trip per row
+BULK_PAGE_SIZE = 1000
+
+# collection -> (child table, columns after dataset_id, row builder)
+CHILD_TABLES = {
+    "scopes": ("dataset_scope", (
+        "temporal_start_date", "temporal_end_date",
+        "geographic_scope", "taxonomic_scope", "taxonomic_authority"
+    ), lambda s: (s.temporal_start_date, s.temporal_end_date,
+                  s.geographic_scope, s.taxonomic_scope, s.taxonomic_authority)),
+    "publishers": ("dataset_publisher", (
+        "publisher_name", "record_count"
+    ), lambda p: (p.publisher_name, p.record_count)),
+    "contacts": ("dataset_contacts", (
+        "name", "role", "email", "organization", "address",
+        "city", "state", "country"
+    ), lambda c: (c.name, c.role, c.email, c.organization,
+                  c.address, c.city, c.state, c.country)),
+    "mappings": ("dataset_mapping", (
+        "field_name", "ontology_mapping", "data_type"
+    ), lambda m: (m.field_name, m.ontology_mapping, m.data_type)),
+    "metrics": ("dataset_metrics", (
+        "metric_name", "metric_value"
+    ), lambda m: (m.metric_name, m.metric_value)),
+    "statistics": ("dataset_statistics", (
+        "stat_name", "stat_value", "measurement_date"
+    ), lambda s: (s.stat_name, s.stat_value, s.measurement_date)),
+}
+
+CHILD_INSERTS = {
+    collection: (
+        "INSERT INTO %s (dataset_id, %s) VALUES %%s" % (table, ", ".join(columns)),
+        to_row
+    )
+    for collection, (table, columns, to_row) in CHILD_TABLES.items()
+}
+
+
+def insert_dataset_details(cur, details: DatasetDetailsInput):
+    for collection, (sql, to_row) in CHILD_INSERTS.items():
+        items = getattr(details, collection)
+        if items:
+            execute_values(
+                cur, sql,
+                [(details.dataset_id, *to_row(item)) for item in items],
+                page_size=BULK_PAGE_SIZE
+            )
+
+
+async def copy_dataset_details_async(cur, details: DatasetDetailsInput):
+    # psycopg 3 path: COPY streams each child collection in one round trip
+    for collection, (table, columns, to_row) in CHILD_TABLES.items():
+        items = getattr(details, collection)
+        if not items:
+            continue
+        sql = "COPY %s (dataset_id, %s) FROM STDIN" % (table, ", ".join(columns))
+        async with cur.copy(sql) as copy:
+            for item in items:
+                await copy.write_row((details.dataset_id, *to_row(item)))
+
+
+def detail_changes(details: DatasetDetailsInput) -> list:
+    # Change log rows: one per child collection written
+    return [(details.dataset_id, collection, UPDATED)
+            for collection in CHILD_TABLES if getattr(details, collection)]
+
+
+AFFECTED_DATASET_QUERY = """
+    SELECT cat.category_name, ds.title
+    FROM dataset_master ds
+    JOIN category_master cat ON cat.category_id = ds.category_id
+    WHERE ds.dataset_id = %s;
+"""
+
+
+def store_dataset_details(details: DatasetDetailsInput):
+    # All child rows go in one transaction; get_db() rolls it back on error
+    try:
+        with get_db() as conn, timed_query("dataset_details_insert"):
+            cur = conn.cursor()
+            insert_dataset_details(cur, details)
+            record_changes(cur, detail_changes(details))
+
+            cur.execute(AFFECTED_DATASET_QUERY, (details.dataset_id,))
+            affected = cur.fetchone()
+
+            conn.commit()
+            cur.close()
+    except (psycopg2.IntegrityError, psycopg2.DataError) as e:
+        # e.g. unknown dataset_id or a value that does not fit its column
+        raise HTTPException(status_code=400, detail=str(e).strip())
+    except psycopg2.Error as e:
+        raise HTTPException(status_code=500, detail=str(e).strip())
+    return affected
+
+
+async def store_dataset_details_async(details: DatasetDetailsInput):
+    import psycopg
+
+    try:
+        async with get_async_db() as conn:
+            with timed_query("dataset_details_insert"):
+                cur = conn.cursor()
+                await copy_dataset_details_async(cur, details)
+                await record_changes_async(cur, detail_changes(details))
+
+                await cur.execute(AFFECTED_DATASET_QUERY, (details.dataset_id,))
+                affected = await cur.fetchone()
+
+                await conn.commit()
+                await cur.close()
+    except (psycopg.IntegrityError, psycopg.DataError) as e:
+        raise HTTPException(status_code=400, detail=str(e).strip())
+    except psycopg.Error as e:
+        raise HTTPException(status_code=500, detail=str(e).strip())
+    return affected
+
+
 # ---------- API ----------
 @router.post("/dataset-details")
-def save_dataset_details(details: DatasetDetailsInput):
-    try:
-        conn = get_connection()
-        cur = conn.cursor()
-
-        # dataset_scope
-        if details.scopes:
-            for s in details.scopes:
-                cur.execute("""
-                    INSERT INTO dataset_scope (
-                        dataset_id, temporal_start_date, temporal_end_date,
-                        geographic_scope, taxonomic_scope, taxonomic_authority
-                    ) VALUES (%s,%s,%s,%s,%s,%s)
-                """, (
-                    details.dataset_id, s.temporal_start_date, s.temporal_end_date,
-                    s.geographic_scope, s.taxonomic_scope, s.taxonomic_authority
-                ))
-
-        # dataset_publisher
-        if details.publishers:
-            for p in details.publishers:
-                cur.execute("""
-                    INSERT INTO dataset_publisher (
-                        dataset_id, publisher_name, record_count
-                    ) VALUES (%s,%s,%s)
-                """, (details.dataset_id, p.publisher_name, p.record_count))
-
-        # dataset_contacts
-        if details.contacts:
-            for c in details.contacts:
-                cur.execute("""
-                    INSERT INTO dataset_contacts (
-                        dataset_id, name, role, email, organization, address,
-                        city, state, country
-                    ) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)
-                """, (
-                    details.dataset_id, c.name, c.role, c.email, c.organization,
-                    c.address, c.city, c.state, c.country
-                ))
-
-        # dataset_mapping
-        if details.mappings:
-            for m in details.mappings:
-                cur.execute("""
-                    INSERT INTO dataset_mapping (
-                        dataset_id, field_name, ontology_mapping, data_type
-                    ) VALUES (%s,%s,%s,%s)
-                """, (details.dataset_id, m.field_name, m.ontology_mapping, m.data_type))
-
-        # dataset_metrics
-        if details.metrics:
-            for m in details.metrics:
-                cur.execute("""
-                    INSERT INTO dataset_metrics (
-                        dataset_id, metric_name, metric_value
-                    ) VALUES (%s,%s,%s)
-                """, (details.dataset_id, m.metric_name, m.metric_value))
-
-        # dataset_statistics
-        if details.statistics:
-            for s in details.statistics:
-                cur.execute("""
-                    INSERT INTO dataset_statistics (
-                        dataset_id, stat_name, stat_value, measurement_date
-                    ) VALUES (%s,%s,%s,%s)
-                """, (details.dataset_id, s.stat_name, s.stat_value, s.measurement_date))
-
-        conn.commit()
-        cur.close()
-        conn.close()
-
-        return {"status": "success", "message": "All dataset details saved"}
-
-    except Exception as e:
-        return {"status": "error", "error": str(e)}
+async def save_dataset_details(details: DatasetDetailsInput):
+    if async_db_enabled():
+        affected = await store_dataset_details_async(details)
+    else:
+        affected = await run_in_threadpool(store_dataset_details, details)
+
+    if affected:
+        # Listeners may query the database (snapshot refresh); keep them off the loop
+        await run_in_threadpool(dataset_changed, details.dataset_id, affected[0], affected[1])
+
+    return {"status": "success", "message": "All dataset details saved"}
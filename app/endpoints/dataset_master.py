@@ -1,11 +1,16 @@
 
 
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
+import psycopg2
 from pydantic import BaseModel
 from typing import Optional
-from app.db import get_connection
+from app.db import get_db
+from app.db_async import get_async_db, async_db_enabled
+from app.catalog_events import dataset_changed
+from app.metrics import timed_query
+from app.change_log import record_changes, record_changes_async, dataset_change, DATASET
 from datetime import date
-from app.db import get_connection
 
 router = APIRouter()
 
@@ -25,38 +30,88 @@ class DatasetMasterInput(BaseModel):
     dataset_type: Optional[str]
     category_id: str
 
-@router.post("/dataset-master")
-def create_dataset_master(dataset: DatasetMasterInput):
+MASTER_INSERT = """
+    INSERT INTO dataset_master (
+        title, description, citation, doi, language,
+        data_language, license, publication_date,
+        metadata_modified_date, registration_date, is_active,
+        keywords, dataset_type, category_id
+    )
+    VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
+    RETURNING dataset_id;
+"""
+
+CATEGORY_NAME_QUERY = "SELECT category_name FROM category_master WHERE category_id = %s;"
+
+
+def _master_params(dataset: DatasetMasterInput):
+    return (
+        dataset.title, dataset.description, dataset.citation,
+        dataset.doi, dataset.language, dataset.data_language,
+        dataset.license, dataset.publication_date, dataset.metadata_modified_date,
+        dataset.registration_date, dataset.is_active, dataset.keywords,
+        dataset.dataset_type, dataset.category_id
+    )
+
+
+def insert_dataset_master(dataset: DatasetMasterInput):
+    # (dataset_id, category row or None)
+    try:
+        with get_db() as conn, timed_query("dataset_master_insert"):
+            cur = conn.cursor()
+
+            cur.execute(MASTER_INSERT, _master_params(dataset))
+            dataset_id = cur.fetchone()[0]
+            record_changes(cur, [(dataset_id, DATASET, dataset_change(True, dataset.is_active))])
+
+            cur.execute(CATEGORY_NAME_QUERY, (dataset.category_id,))
+            category = cur.fetchone()
+
+            conn.commit()
+            cur.close()
+    except (psycopg2.IntegrityError, psycopg2.DataError) as e:
+        # e.g. unknown category_id or a value that does not fit its column
+        raise HTTPException(status_code=400, detail=str(e).strip())
+    except psycopg2.Error as e:
+        raise HTTPException(status_code=500, detail=str(e).strip())
+    return dataset_id, category
+
+
+async def insert_dataset_master_async(dataset: DatasetMasterInput):
+    import psycopg
+
     try:
-        conn = get_connection()
-        cur = conn.cursor()
-
-        cur.execute("""
-            INSERT INTO dataset_master (
-                title, description, citation, doi, language,
-                data_language, license, publication_date,
-                metadata_modified_date, registration_date, is_active,
-                keywords, dataset_type, category_id
-            )
-            VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-            RETURNING dataset_id;
-        """, (
-            dataset.title, dataset.description, dataset.citation,
-            dataset.doi, dataset.language, dataset.data_language,
-            dataset.license, dataset.publication_date, dataset.metadata_modified_date,
-            dataset.registration_date, dataset.is_active, dataset.keywords,
-            dataset.dataset_type, dataset.category_id
-        ))
-
-        dataset_id = cur.fetchone()[0]
-        conn.commit()
-        cur.close()
-        conn.close()
-
-        return {"status": "success", "dataset_id": dataset_id}
-
-    except Exception as e:
-        return {"status": "error", "error": str(e)}
+        async with get_async_db() as conn:
+            with timed_query("dataset_master_insert"):
+                cur = conn.cursor()
+
+                await cur.execute(MASTER_INSERT, _master_params(dataset))
+                dataset_id = (await cur.fetchone())[0]
+                await record_changes_async(cur, [(dataset_id, DATASET, dataset_change(True, dataset.is_active))])
 
+                await cur.execute(CATEGORY_NAME_QUERY, (dataset.category_id,))
+                category = await cur.fetchone()
+
+                await conn.commit()
+                await cur.close()
+    except (psycopg.IntegrityError, psycopg.DataError) as e:
+        raise HTTPException(status_code=400, detail=str(e).strip())
+    except psycopg.Error as e:
+        raise HTTPException(status_code=500, detail=str(e).strip())
+    return dataset_id, category
+
+
+@router.post("/dataset-master")
+async def create_dataset_master(dataset: DatasetMasterInput):
+    # Failures are HTTP errors: 400 for data the database rejects, 503 while
+    # the change-log schema is missing (record_changes), 500 otherwise
+    if async_db_enabled():
+        dataset_id, category = await insert_dataset_master_async(dataset)
+    else:
+        dataset_id, category = await run_in_threadpool(insert_dataset_master, dataset)
 
+    if category:
+        # Listeners may query the database (snapshot refresh); keep them off the loop
+        await run_in_threadpool(dataset_changed, dataset_id, category[0], dataset.title)
 
+    return {"status": "success", "dataset_id": dataset_id}
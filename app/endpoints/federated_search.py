@@ -0,0 +1,555 @@
+from fastapi import APIRouter, HTTPException, Body, Depends, Request
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+from typing import Optional
+import httpx
+import asyncio
+import time
+
+from app.http_client import get_http_client
+from app.search_cache import search_cache, normalise_query, STALE
+from app.singleflight import AsyncSingleFlight
+from app.participant_health import participant_health, guarded_call, CircuitOpenError, NeutralOutcome
+from app.metrics import record_upstream, record_participant_body, add_timing
+from app.query_planner import query_planner
+from app.participant_protocol import protocol_negotiator, batch_url, UNSUPPORTED_STATUS
+from app.harvest import harvest_index
+from app.participant_registry import participant_registry, routing_table
+from app.bulkhead import BulkheadFull, admission_control, new_fanout_owner
+from app.participant_stream import ResultsParser, read_results, per_field_targets, batch_targets, project_records
+from app.fast_json import FastJSONResponse, dumps
+from app.result_merge import (
+    merge_results, truncated_sources, request_fingerprint, encode_cursor, decode_cursor, MAX_PAGE_SIZE, MERGE_WINDOW
+)
+
+router = APIRouter()
+
+# Identical participant calls in flight at the same time share one request
+participant_flight = AsyncSingleFlight()
+planner_flight = AsyncSingleFlight()
+
+NDJSON = "application/x-ndjson"
+DEFAULT_PAGE_SIZE = 50
+SSE = "text/event-stream"
+# Field label of batched participant requests in the upstream metrics
+BATCH_FIELD_LABEL = "(batch)"
+
+# Updated request payload model
+class FederatedSearchRequest(BaseModel):
+    category: list[str]
+    dataset: list[str]
+    fields: list[str]
+    search_text: str
+    # Merged view: records deduplicated across fields and participants, ranked
+    # and paged with an opaque cursor. limit is also pushed down to participants.
+    merge: bool = False
+    limit: Optional[int] = None
+    cursor: Optional[str] = None
+    # Seconds of staleness acceptable for answers from the harvested index;
+    # unset (the default) always asks the participants live
+    freshness: Optional[float] = None
+    # Record keys to return from each participant record; unset returns them all
+    record_fields: Optional[list[str]] = None
+
+def upstream_outcome(error: Exception) -> str:
+    if isinstance(error, BatchNotSupported):
+        return "unsupported"
+    if isinstance(error, CircuitOpenError):
+        return "circuit_open"
+    if isinstance(error, BulkheadFull):
+        return "rejected"
+    if isinstance(error, (httpx.TimeoutException, asyncio.TimeoutError)):
+        return "timeout"
+    return "error"
+
+
+async def stream_request(client, participant_name: str, request: httpx.Request, parser: ResultsParser,
+                         accept_status=()):
+    # Reads the response body through the parser; returns (status code, parser)
+    response = await client.send(request, stream=True)
+    try:
+        if response.status_code in accept_status:
+            return response.status_code, parser
+        response.raise_for_status()
+        await read_results(response, parser)
+    finally:
+        # Closing early drops the rest of the body along with the connection
+        await response.aclose()
+    record_participant_body(participant_name, parser.bytes_read, parser.peak_buffer,
+                            "bytes" if parser.bytes_exceeded else
+                            "records" if any(parser.truncated(name) for name in parser.overflow) else None)
+    return response.status_code, parser
+
+
+async def fetch_remote(client, participant_name: str, url: str, field: str, query: str,
+                       limit: Optional[int] = None, record_fields=None):
+    # Returns (item, response bytes read); errors are reported in the item
+    params = {"field": field, "query": query}
+    if limit:
+        params["limit"] = limit
+
+    async def make_request(deadline: float):
+        request = client.build_request("GET", url, params=params, timeout=deadline)
+        # Participants that ignore the limit are cut down while reading
+        _, parser = await stream_request(client, participant_name, request,
+                                         ResultsParser(per_field_targets(field), limit, record_fields))
+        return parser
+
+    start = time.perf_counter()
+    try:
+        async with participant_registry.slot(participant_name):
+            parser = await guarded_call(participant_health.get(participant_name), make_request)
+        item = {
+            "participant_name": participant_name,
+            "field": field,
+            "api_url": url,
+            "results": parser.take(field)
+        }
+        if parser.truncated(field):
+            item["truncated"] = True
+        record_upstream(participant_name, query_planner.metric_field(field), time.perf_counter() - start, "ok")
+        return item, parser.bytes_read
+    except Exception as e:
+        record_upstream(participant_name, query_planner.metric_field(field), time.perf_counter() - start,
+                        upstream_outcome(e))
+        return {
+            "participant_name": participant_name,
+            "field": field,
+            "api_url": url,
+            "results": [],
+            # httpx timeouts often stringify to "", which would read as success
+            "error": str(e) or type(e).__name__
+        }, 0
+
+
+def _cached_item(client, participant_name: str, url: str, field: str, remote_field: str, query: str,
+                 limit: Optional[int] = None, record_fields=None):
+    # Cached item for this call, or None on a miss; stale hits are refreshed in the background
+    key = search_cache.key(participant_name, remote_field, query, limit, record_fields)
+    cached, state = search_cache.lookup(key)
+    if state is None:
+        return None
+    if state == STALE:
+        search_cache.refresh_in_background(
+            key, lambda: participant_flight.do(
+                key, lambda: fetch_remote(client, participant_name, url, remote_field, query, limit, record_fields))
+        )
+    return {
+        "participant_name": participant_name,
+        "field": field,
+        "api_url": url,
+        "results": cached
+    }
+
+
+async def fetch_from_participant(client, participant_name: str, url: str, field: str, query: str,
+                                 upstream_field: Optional[str] = None, limit: Optional[int] = None,
+                                 record_fields=None):
+    # upstream_field: the name actually sent to the participant, when the
+    # planner translated the requested field
+    remote_field = upstream_field or field
+    cached = _cached_item(client, participant_name, url, field, remote_field, query, limit, record_fields)
+    if cached is not None:
+        return cached
+
+    key = search_cache.key(participant_name, remote_field, query, limit, record_fields)
+    item, size = await participant_flight.do(
+        key, lambda: fetch_remote(client, participant_name, url, remote_field, query, limit, record_fields)
+    )
+    # Errors are never cached, the next search retries the participant; nor
+    # are truncated results, which are as large as we allow
+    if not item.get("error") and not item.get("truncated"):
+        search_cache.store(key, item["results"], size)
+    # Copy, the same item is handed to every coalesced caller
+    return {**item, "field": field}
+
+
+class BatchNotSupported(NeutralOutcome):
+    pass
+
+
+async def fetch_remote_batch(client, participant_name: str, url: str, fields: list, query: str,
+                             limit: Optional[int] = None, record_fields=None):
+    # Returns ({field: results}, {truncated field, ...}, response bytes read)
+    # using the batched protocol
+    body = {"query": query, "fields": fields}
+    if limit:
+        body["limit"] = limit
+
+    async def make_request(deadline: float):
+        request = client.build_request("POST", batch_url(url), json=body, timeout=deadline)
+        status, parser = await stream_request(client, participant_name, request,
+                                              ResultsParser(batch_targets(fields), limit, record_fields),
+                                              accept_status=UNSUPPORTED_STATUS)
+        if status in UNSUPPORTED_STATUS:
+            # Not a failure of the participant, and not a latency sample
+            raise BatchNotSupported(f"{participant_name} answered {status}")
+        return parser
+
+    start = time.perf_counter()
+    try:
+        async with participant_registry.slot(participant_name):
+            parser = await guarded_call(participant_health.get(participant_name), make_request)
+    except Exception as e:
+        record_upstream(participant_name, BATCH_FIELD_LABEL, time.perf_counter() - start, upstream_outcome(e))
+        raise
+    record_upstream(participant_name, BATCH_FIELD_LABEL, time.perf_counter() - start, "ok")
+    truncated = {field for field in fields if parser.truncated(field)}
+    # Fields cut off by the byte cap are truncated rather than missing
+    by_field = {field: parser.take(field) for field in truncated | set(parser.results)}
+    return by_field, truncated, parser.bytes_read
+
+
+async def fetch_batch_from_participant(client, participant_name: str, url: str, calls: list, query: str,
+                                       limit: Optional[int] = None, record_fields=None):
+    """One batched request for every (field, upstream_field) in calls that is
+    not cached, split back into one item per field. Falls back to per-field
+    calls when the participant does not implement the batch endpoint."""
+    items = {}
+    missing = []
+    for field, upstream_field in calls:
+        remote_field = upstream_field or field
+        cached = _cached_item(client, participant_name, url, field, remote_field, query, limit, record_fields)
+        if cached is not None:
+            items[field] = cached
+        else:
+            missing.append((field, remote_field))
+
+    if len(missing) > 1:
+        remote_fields = sorted({remote_field for _, remote_field in missing})
+        flight_key = ("batch", participant_name, tuple(remote_fields), normalise_query(query), limit,
+                      tuple(record_fields) if record_fields else None)
+        try:
+            by_field, truncated, size = await participant_flight.do(
+                flight_key,
+                lambda: fetch_remote_batch(client, participant_name, url, remote_fields, query, limit, record_fields)
+            )
+            protocol_negotiator.record(participant_name, True)
+        except BatchNotSupported:
+            protocol_negotiator.record(participant_name, False)
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            for field, _ in missing:
+                items[field] = {
+                    "participant_name": participant_name,
+                    "field": field,
+                    "api_url": url,
+                    "results": [],
+                    "error": error
+                }
+            missing = []
+        else:
+            share = size // max(1, len(by_field))
+            for field, remote_field in missing:
+                item = {
+                    "participant_name": participant_name,
+                    "field": field,
+                    "api_url": url,
+                    "results": by_field.get(remote_field, [])
+                }
+                if remote_field in truncated:
+                    item["truncated"] = True
+                elif remote_field in by_field:
+                    search_cache.store(search_cache.key(participant_name, remote_field, query, limit, record_fields),
+                                       item["results"], share)
+                if remote_field not in by_field:
+                    item["error"] = "field missing from batch response"
+                items[field] = item
+            missing = []
+
+    if missing:
+        fetched = await asyncio.gather(*[
+            fetch_from_participant(client, participant_name, url, field, query, remote_field, limit, record_fields)
+            for field, remote_field in missing
+        ])
+        for (field, _), item in zip(missing, fetched):
+            items[field] = item
+
+    return [items[field] for field, _ in calls if field in items]
+
+
+async def local_items(participant_name: str, url: str, calls: list, results: list):
+    # Items answered from the harvested index, shaped like live ones
+    return [
+        {
+            "participant_name": participant_name,
+            "field": field,
+            "api_url": url,
+            "results": field_results,
+            "elapsed_ms": 0.0
+        }
+        for (field, _), field_results in zip(calls, results)
+    ]
+
+
+async def timed_fetch(client, participant_name: str, url: str, calls: list, query: str,
+                      limit: Optional[int] = None, record_fields=None):
+    # calls: [(field, upstream_field), ...] for one participant; returns a list of items
+    start = time.perf_counter()
+    if len(calls) == 1:
+        field, upstream_field = calls[0]
+        items = [await fetch_from_participant(client, participant_name, url, field, query, upstream_field, limit,
+                                              record_fields)]
+    else:
+        items = await fetch_batch_from_participant(client, participant_name, url, calls, query, limit, record_fields)
+    elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+    for item in items:
+        item["elapsed_ms"] = elapsed_ms
+    return items
+
+
+def negotiate_stream(request: Request) -> Optional[str]:
+    # Streaming is opt-in; anything else gets the grouped JSON response
+    accept = request.headers.get("accept", "")
+    if SSE in accept:
+        return SSE
+    if NDJSON in accept:
+        return NDJSON
+    return None
+
+
+def encode_frame(media_type: str, event: str, data: dict) -> bytes:
+    body = dumps({"type": event, **data})
+    if media_type == SSE:
+        return b"event: " + event.encode("utf-8") + b"\ndata: " + body + b"\n\n"
+    return body + b"\n"
+
+
+class Fanout:
+    """The participant calls of one streamed search, and the admission they
+    hold. close() runs at the end of the stream and again once the response
+    is done, whichever comes first releasing: a client gone before the
+    stream started would otherwise never release it."""
+
+    def __init__(self, coros: list, cost: int):
+        self.coros = coros
+        self.cost = cost
+        self.started = False
+        self.closed = False
+
+    def start(self) -> list:
+        self.started = True
+        return [asyncio.ensure_future(coro) for coro in self.coros]
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if not self.started:
+            for coro in self.coros:
+                coro.close()
+        admission_control.release(self.cost)
+
+
+class FanoutStreamingResponse(StreamingResponse):
+    def __init__(self, fanout: Fanout, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fanout = fanout
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.fanout.close()
+
+
+async def stream_results(media_type: str, fanout: Fanout, summary: dict):
+    started = time.perf_counter()
+    tasks = fanout.start()
+    errors = []
+    timings = {}
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            for item in await next_done:
+                timings.setdefault(item["participant_name"], {})[item["field"]] = item["elapsed_ms"]
+                if item.get("error"):
+                    errors.append({
+                        "participant_name": item["participant_name"],
+                        "field": item["field"],
+                        "error": item["error"]
+                    })
+                yield encode_frame(media_type, "result", {
+                    "participant_name": item["participant_name"],
+                    "api_url": item["api_url"],
+                    "field": item["field"],
+                    "results": item["results"],
+                    "error": item.get("error"),
+                    "truncated": item.get("truncated", False),
+                    "elapsed_ms": item["elapsed_ms"]
+                })
+        yield encode_frame(media_type, "summary", {
+            **summary,
+            "errors": errors,
+            "timings": timings,
+            "total_ms": round((time.perf_counter() - started) * 1000, 1)
+        })
+    finally:
+        # Client went away mid-stream: stop the remaining upstream calls
+        for task in tasks:
+            task.cancel()
+        fanout.close()
+
+
+@router.post("/federated-search")
+async def federated_search(
+    request: Request,
+    payload: FederatedSearchRequest = Body(...),
+    client: httpx.AsyncClient = Depends(get_http_client)
+):
+    # Check category
+    if "biodiversity" not in [c.lower() for c in payload.category]:
+        raise HTTPException(status_code=400, detail="At least one category must be 'biodiversity'.")
+
+    # Filter only known participants; the table is read once so the whole
+    # search sees one consistent version of the registry
+    routing = routing_table()
+    participants = routing.urls
+    valid_datasets = [ds for ds in payload.dataset if ds in participants]
+    invalid_datasets = [ds for ds in payload.dataset if ds not in participants]
+
+    if not valid_datasets:
+        raise HTTPException(status_code=400, detail="No valid datasets provided.")
+
+    # Drop participant x field pairs the dataset mappings say cannot match
+    if query_planner.stale():
+        await planner_flight.do("index", lambda: run_in_threadpool(query_planner.load))
+    calls, pruned = query_planner.plan(valid_datasets, payload.fields)
+
+    # Participants that speak the batched protocol get one request for all
+    # their fields; the others one request per field
+    by_participant = {}
+    for participant, field, upstream_field in calls:
+        by_participant.setdefault(participant, []).append((field, upstream_field))
+    if payload.limit is not None and not 1 <= payload.limit <= MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_PAGE_SIZE}.")
+    page_size = payload.limit or DEFAULT_PAGE_SIZE
+    fingerprint = request_fingerprint(payload)
+    after = decode_cursor(payload.cursor, fingerprint) if payload.merge and payload.cursor else None
+    # Every page of a merged search asks participants for the same fixed
+    # window, so later pages are answered from the search cache and the
+    # merged set does not grow with the page number
+    window = max(MERGE_WINDOW, page_size + 1) if payload.merge else payload.limit
+
+    coros = []
+    upstream_calls = 0
+    from_index = {}
+    for participant, participant_calls in list(by_participant.items()):
+        if payload.freshness is not None:
+            local = [
+                harvest_index.lookup(participant, upstream_field or field, payload.search_text, payload.freshness)
+                for field, upstream_field in participant_calls
+            ]
+            if all(results is not None for results in local):
+                coros.append(local_items(participant, participants[participant], participant_calls,
+                                         [project_records(results[:window or None], payload.record_fields)
+                                          for results in local]))
+                from_index[participant] = round(harvest_index.get(participant).staleness(), 1)
+                continue
+        for field, upstream_field in participant_calls:
+            harvest_index.remember_query(participant, upstream_field or field, payload.search_text)
+
+        if protocol_negotiator.use_batch(participant, routing.protocol(participant)):
+            coros.append(timed_fetch(client, participant, participants[participant], participant_calls,
+                                     payload.search_text, window, payload.record_fields))
+            upstream_calls += 1
+        else:
+            coros.extend(
+                timed_fetch(client, participant, participants[participant], [call], payload.search_text, window,
+                            payload.record_fields)
+                for call in participant_calls
+            )
+            upstream_calls += len(participant_calls)
+
+    # Shed load up front rather than queueing into participant timeouts
+    if not admission_control.try_admit(upstream_calls):
+        for coro in coros:
+            coro.close()
+        raise HTTPException(
+            status_code=503,
+            detail="Too many searches in flight, retry shortly.",
+            headers={"Retry-After": str(admission_control.retry_after)}
+        )
+    # Participant queues serve searches round-robin, keyed by this id
+    new_fanout_owner()
+
+    media_type = negotiate_stream(request)
+    if media_type:
+        summary = {
+            "category": payload.category,
+            "dataset": payload.dataset,
+            "valid_datasets": valid_datasets,
+            "invalid_datasets": invalid_datasets,
+            "fields": payload.fields,
+            "search_text": payload.search_text,
+            "pruned": pruned,
+            "from_index": from_index
+        }
+        fanout = Fanout(coros, upstream_calls)
+        return FanoutStreamingResponse(
+            fanout,
+            stream_results(media_type, fanout, summary),
+            media_type=media_type,
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
+    fanout_start = time.perf_counter()
+    try:
+        responses = [item for items in await asyncio.gather(*coros) for item in items]
+    finally:
+        admission_control.release(upstream_calls)
+    add_timing("fanout", time.perf_counter() - fanout_start)
+
+    if payload.merge:
+        records, has_more, last_rank = merge_results(responses, payload.search_text, after, page_size)
+        truncated = truncated_sources(responses, window)
+        return FastJSONResponse({
+            "category": payload.category,
+            "dataset": payload.dataset,
+            "valid_datasets": valid_datasets,
+            "invalid_datasets": invalid_datasets,
+            "fields": payload.fields,
+            "search_text": payload.search_text,
+            "pruned": pruned,
+            "from_index": from_index,
+            "errors": [
+                {"participant_name": item["participant_name"], "field": item["field"], "error": item["error"]}
+                for item in responses if item.get("error")
+            ],
+            "truncated": truncated,
+            "limit": page_size,
+            "records": records,
+            "next_cursor": encode_cursor(last_rank, fingerprint) if has_more else None,
+            # True with no next_cursor: the merged view ends at the merge
+            # window of the truncated participants; narrow the search for more
+            "has_more": has_more or bool(truncated)
+        })
+
+    # Group results by participant
+    results = {}
+    for item in responses:
+        pname = item["participant_name"]
+        if pname not in results:
+            results[pname] = {
+                "api_url": item["api_url"],
+                "field_results": {}
+            }
+        results[pname]["field_results"][item["field"]] = {
+            "results": item["results"],
+            "error": item.get("error"),
+            "truncated": item.get("truncated", False)
+        }
+
+    # Returned directly so participant results (RawJSON) are spliced in as-is
+    # instead of going through jsonable_encoder
+    return FastJSONResponse({
+        "category": payload.category,
+        "dataset": payload.dataset,
+        "valid_datasets": valid_datasets,
+        "invalid_datasets": invalid_datasets,   # <--- include info for debugging
+        "fields": payload.fields,
+        "search_text": payload.search_text,
+        "pruned": pruned,
+        "from_index": from_index,   # participants answered from harvested data, with staleness in seconds
+        "results": results
+    })
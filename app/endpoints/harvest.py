@@ -0,0 +1,31 @@
+from fastapi import APIRouter, HTTPException, Depends
+from typing import Optional
+import httpx
+
+from app.http_client import get_http_client
+from app.harvest import harvest_index, harvest_participant, harvest_all
+from app.participant_registry import routing_table
+from app.endpoints.participants import require_admin
+
+router = APIRouter()
+
+
+@router.get("/harvest/status")
+def harvest_status():
+    return harvest_index.stats()
+
+
+@router.post("/harvest/run", dependencies=[Depends(require_admin)])
+async def run_harvest(
+    participant: Optional[str] = None,
+    client: httpx.AsyncClient = Depends(get_http_client)
+):
+    # Runs one incremental harvest pass now, for one participant or all of them
+    participants = routing_table().urls
+    if participant is None:
+        await harvest_all(client, participants)
+    elif participant in participants:
+        await harvest_participant(client, participant, participants[participant])
+    else:
+        raise HTTPException(status_code=404, detail=f"Unknown participant: {participant}")
+    return harvest_index.stats()
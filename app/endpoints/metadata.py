@@ -1,160 +1,378 @@
+import os
+from typing import List, Optional
 from fastapi import APIRouter, HTTPException
-from app.db import get_connection
+from pydantic import BaseModel
+from fastapi.concurrency import run_in_threadpool
+from app.db import get_db
+from app.db_async import get_async_db, async_db_enabled
+from app.cache import metadata_cache
+from app.metrics import timed_query
+from app.fast_json import FastJSONResponse
+from app.http_cache import dataset_versions
+from app.catalog_events import on_dataset_changed, on_catalog_changed
+from app.singleflight import SingleFlight, AsyncSingleFlight
 from psycopg2.extras import RealDictCursor
 
 router = APIRouter()
 
+metadata_flight = SingleFlight()
+metadata_async_flight = AsyncSingleFlight()
+
+# Upper bound on the (category, title) pairs plus dataset ids of one batch request
+METADATA_BATCH_MAX = int(os.getenv("METADATA_BATCH_MAX", "200"))
+
+
+# Each child collection is aggregated server-side in its own correlated
+# subquery, so a dataset always comes back as a single row no matter how many
+# contacts, scopes, fields or statistics it has.
+METADATA_QUERY = """
+    SELECT
+        cat.category_name,
+        ds.dataset_id,
+        ds.title AS dataset_title,
+        ds.description,
+        ds.citation,
+        ds.doi,
+        ds.language,
+        ds.data_language,
+        ds.license,
+        ds.publication_date,
+        ds.metadata_modified_date AS last_updated,
+        ds.registration_date,
+        ds.is_active,
+        ds.keywords,
+        ds.dataset_type,
+
+        (SELECT json_agg(json_build_array(
+                    c.name, c.role, c.email, c.organization,
+                    c.address, c.city, c.state, c.country))
+           FROM dataset_contacts c
+          WHERE c.dataset_id = ds.dataset_id) AS contacts,
+
+        (SELECT json_agg(json_build_array(
+                    p.publisher_name, p.country, p.record_count))
+           FROM dataset_publisher p
+          WHERE p.dataset_id = ds.dataset_id) AS publishers,
+
+        (SELECT json_agg(json_build_array(
+                    s.temporal_start_date, s.temporal_end_date, s.geographic_scope,
+                    s.taxonomic_scope, s.taxonomic_authority))
+           FROM dataset_scope s
+          WHERE s.dataset_id = ds.dataset_id) AS scopes,
+
+        (SELECT json_agg(json_build_array(
+                    m.field_name, m.ontology_mapping, m.data_type)
+                    ORDER BY m.field_name)
+           FROM dataset_mapping m
+          WHERE m.dataset_id = ds.dataset_id) AS fields,
+
+        (SELECT json_agg(json_build_array(
+                    st.stat_name, st.stat_value, st.measurement_date))
+           FROM dataset_statistics st
+          WHERE st.dataset_id = ds.dataset_id) AS statistics
+
+    FROM
+        category_master cat
+    JOIN
+        dataset_master ds ON ds.category_id = cat.category_id
+"""
+
+@on_dataset_changed
+def _invalidate_metadata(dataset_id, category_name, title):
+    metadata_cache.invalidate(category_name, title)
+
+
+@on_catalog_changed
+def _clear_metadata():
+    metadata_cache.clear()
+
+
+CONTACT_KEYS = ("name", "role", "email", "organization", "address", "city", "state", "country")
+PUBLISHER_KEYS = ("publisher_name", "country", "record_count")
+SCOPE_KEYS = ("temporal_start_date", "temporal_end_date", "geographic_scope",
+              "taxonomic_scope", "taxonomic_authority")
+FIELD_KEYS = ("field_name", "ontology_mapping", "data_type")
+STAT_KEYS = ("stat_name", "stat_value", "measurement_date")
+
+
+def _child_list(values, keys):
+    # Mirrors the old LEFT JOIN output: duplicates collapse to their first
+    # occurrence, and an empty child table yields a single all-null entry.
+    if not values:
+        values = [[None] * len(keys)]
+    seen = set()
+    items = []
+    for value in values:
+        marker = tuple(value)
+        if marker in seen:
+            continue
+        seen.add(marker)
+        items.append(dict(zip(keys, value)))
+    return items
+
+
+def build_metadata(rows, category_name: str, title: str):
+    # rows: one row per matching dataset, as returned by METADATA_QUERY
+    first = rows[0]
+    children = {"contacts": [], "publishers": [], "scopes": [], "fields": [], "statistics": []}
+    for row in rows:
+        for name in children:
+            children[name].extend(row[name] or [])
+
+    fields = children["fields"]
+    if len(rows) > 1:
+        # Same ordering as the old `ORDER BY m.field_name` across datasets
+        fields.sort(key=lambda f: (f[0] is None, f[0] or ""))
+
+    return {
+        "category_name": category_name,
+        "dataset_title": title,  # return alias instead of original
+        "description": first['description'],
+        "citation": first['citation'],
+        "doi": first['doi'],
+        "language": first['language'],
+        "data_language": first['data_language'],
+        "license": first['license'],
+        "publication_date": first['publication_date'],
+        "last_updated": first['last_updated'],
+        "registration_date": first['registration_date'],
+        "is_active": first['is_active'],
+        "keywords": first['keywords'],
+        "dataset_type": first['dataset_type'],
+        "contacts": _child_list(children["contacts"], CONTACT_KEYS),
+        "publishers": _child_list(children["publishers"], PUBLISHER_KEYS),
+        "scopes": _child_list(children["scopes"], SCOPE_KEYS),
+        "fields": _child_list(fields, FIELD_KEYS),
+        "statistics": _child_list(children["statistics"], STAT_KEYS)
+    }
+
+
+METADATA_WHERE = """
+    WHERE
+        cat.category_name = %s AND ds.title = %s
+    ORDER BY
+        ds.dataset_id;
+"""
+
+METADATA_NOT_FOUND = "Metadata not found for the specified dataset and category"
+
+
+def load_metadata(category_name: str, title: str):
+    with get_db() as conn:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        with timed_query("metadata"):
+            cursor.execute(METADATA_QUERY + METADATA_WHERE, (category_name, title))
+            rows = cursor.fetchall()
+        if not rows:
+            raise HTTPException(status_code=404, detail=METADATA_NOT_FOUND)
+
+        return build_metadata(rows, category_name, title)
+
+
+async def load_metadata_async(category_name: str, title: str):
+    from psycopg.rows import dict_row
+
+    async with get_async_db() as conn:
+        cursor = conn.cursor(row_factory=dict_row)
+        with timed_query("metadata"):
+            await cursor.execute(METADATA_QUERY + METADATA_WHERE, (category_name, title))
+            rows = await cursor.fetchall()
+        if not rows:
+            raise HTTPException(status_code=404, detail=METADATA_NOT_FOUND)
+
+        return build_metadata(rows, category_name, title)
+
+
+def _load_and_cache(category_name: str, title: str):
+    # The version is read before the query, so a write committed meanwhile
+    # makes set() drop this document instead of caching it for the TTL
+    version = metadata_cache.version(category_name, title)
+    dataset_details = load_metadata(category_name, title)
+    metadata_cache.set(category_name, title, dataset_details, version)
+    return dataset_details
+
+
+async def _load_and_cache_async(category_name: str, title: str):
+    version = await metadata_cache.version_async(category_name, title)
+    dataset_details = await load_metadata_async(category_name, title)
+    await metadata_cache.set_async(category_name, title, dataset_details, version)
+    return dataset_details
+
+
+def _get_metadata_sync(category_name: str, title: str):
+    # Concurrent misses for the same dataset share one query
+    return metadata_flight.do(
+        (category_name, title),
+        lambda: _load_and_cache(category_name, title)
+    )
 
 
 @router.get("/metadata")
-def get_metadata(title: str, category_name: str):
+async def get_metadata(title: str, category_name: str):
     # Normalize title
     normalized_title = title
-    
-    conn = get_connection()
-    try:
+
+    # Returned as responses directly, skipping FastAPI's jsonable_encoder
+    # pass; dates are encoded natively by FastJSONResponse
+    cached = await metadata_cache.get_async(category_name, normalized_title)
+    if cached is not None:
+        return FastJSONResponse(cached)
+
+    if async_db_enabled():
+        dataset_details = await metadata_async_flight.do(
+            (category_name, normalized_title),
+            lambda: _load_and_cache_async(category_name, normalized_title)
+        )
+    else:
+        dataset_details = await run_in_threadpool(_get_metadata_sync, category_name, normalized_title)
+
+    return FastJSONResponse(dataset_details)
+
+
+async def metadata_validators(params: dict):
+    """(etag, None) for GET /metadata, known without running the
+    handler when the document is cached; see app/http_cache.py."""
+    category_name, title = params.get("category_name"), params.get("title")
+    if category_name is None or title is None:
+        return None
+    document = await metadata_cache.peek_async(category_name, title)
+    if document is None:
+        return None
+    return dataset_versions.validators((category_name, title), document)
+
+
+# ---------- Batch ----------
+class MetadataKey(BaseModel):
+    category_name: str
+    title: str
+
+
+class MetadataBatchRequest(BaseModel):
+    items: Optional[List[MetadataKey]] = []
+    dataset_ids: Optional[List[str]] = []
+
+
+# All requested pairs in one statement; rows are grouped back per pair
+METADATA_BATCH_WHERE = """
+    WHERE
+        (cat.category_name, ds.title) IN (
+            SELECT * FROM unnest(%s::text[], %s::text[])
+        )
+    ORDER BY
+        ds.dataset_id;
+"""
+
+# get_metadata is keyed by (category_name, title), so a dataset id is first
+# resolved to its pair and answered exactly like a lookup by title
+DATASET_KEYS_QUERY = """
+    SELECT ds.dataset_id::text AS dataset_id, cat.category_name, ds.title
+    FROM dataset_master ds
+    JOIN category_master cat ON cat.category_id = ds.category_id
+    WHERE ds.dataset_id::text = ANY(%s);
+"""
+
+
+def _group_metadata(rows, pairs) -> dict:
+    grouped = {}
+    for row in rows:
+        grouped.setdefault((row["category_name"], row["dataset_title"]), []).append(row)
+    return {
+        pair: build_metadata(grouped[pair], *pair)
+        for pair in pairs if pair in grouped
+    }
+
+
+def load_metadata_batch(pairs: list, dataset_ids: list):
+    """Returns ({dataset_id: pair}, {pair: metadata}, {pair: cache version})
+    from at most two queries; pairs and ids without a match are simply
+    absent. Versions are read before the metadata query, for
+    MetadataCache.set."""
+    with get_db() as conn:
         cursor = conn.cursor(cursor_factory=RealDictCursor)
+        id_pairs = {}
+        if dataset_ids:
+            with timed_query("metadata_batch_keys"):
+                cursor.execute(DATASET_KEYS_QUERY, (dataset_ids,))
+                rows = cursor.fetchall()
+            id_pairs = {row["dataset_id"]: (row["category_name"], row["title"]) for row in rows}
 
-        cursor.execute("""
-            SELECT
-                cat.category_name,
-                ds.title AS dataset_title,
-                ds.description,
-                ds.citation,
-                ds.doi,
-                ds.language,
-                ds.data_language,
-                ds.license,
-                ds.publication_date,
-                ds.metadata_modified_date AS last_updated,
-                ds.registration_date,
-                ds.is_active,
-                ds.keywords,
-                ds.dataset_type,
-
-                c.name AS contact_name,
-                c.role AS contact_role,
-                c.email AS contact_email,
-                c.organization AS contact_organization,
-                c.address AS contact_address,
-                c.city AS contact_city,
-                c.state AS contact_state,
-                c.country AS contact_country,
-
-                p.publisher_name,
-                p.country AS publisher_country,
-                p.record_count,
-
-                s.temporal_start_date,
-                s.temporal_end_date,
-                s.geographic_scope,
-                s.taxonomic_scope,
-                s.taxonomic_authority,
-
-                m.field_name,
-                m.ontology_mapping,
-                m.data_type,
-
-                st.stat_name,
-                st.stat_value,
-                st.measurement_date
-                
-            FROM
-                category_master cat
-            JOIN
-                dataset_master ds ON ds.category_id = cat.category_id
-            LEFT JOIN
-                dataset_contacts c ON c.dataset_id = ds.dataset_id
-            LEFT JOIN
-                dataset_publisher p ON p.dataset_id = ds.dataset_id
-            LEFT JOIN
-                dataset_scope s ON s.dataset_id = ds.dataset_id
-            LEFT JOIN
-                dataset_mapping m ON m.dataset_id = ds.dataset_id
-            LEFT JOIN
-                dataset_statistics st ON st.dataset_id = ds.dataset_id
-
-            WHERE
-                cat.category_name = %s AND ds.title = %s
-
-            ORDER BY
-                cat.category_name, ds.title, m.field_name;
-        """, (category_name, normalized_title))
-
-        rows = cursor.fetchall()
-        if not rows:
-            raise HTTPException(status_code=404, detail="Metadata not found for the specified dataset and category")
+        wanted = list(dict.fromkeys(pairs + list(id_pairs.values())))
+        if not wanted:
+            return id_pairs, {}, {}
+        versions = {pair: metadata_cache.version(*pair) for pair in wanted}
+        with timed_query("metadata_batch"):
+            cursor.execute(METADATA_QUERY + METADATA_BATCH_WHERE,
+                           ([c for c, _ in wanted], [t for _, t in wanted]))
+            rows = cursor.fetchall()
+        return id_pairs, _group_metadata(rows, wanted), versions
+
+
+async def load_metadata_batch_async(pairs: list, dataset_ids: list):
+    from psycopg.rows import dict_row
+
+    async with get_async_db() as conn:
+        cursor = conn.cursor(row_factory=dict_row)
+        id_pairs = {}
+        if dataset_ids:
+            with timed_query("metadata_batch_keys"):
+                await cursor.execute(DATASET_KEYS_QUERY, (dataset_ids,))
+                rows = await cursor.fetchall()
+            id_pairs = {row["dataset_id"]: (row["category_name"], row["title"]) for row in rows}
+
+        wanted = list(dict.fromkeys(pairs + list(id_pairs.values())))
+        if not wanted:
+            return id_pairs, {}, {}
+        versions = {pair: await metadata_cache.version_async(*pair) for pair in wanted}
+        with timed_query("metadata_batch"):
+            await cursor.execute(METADATA_QUERY + METADATA_BATCH_WHERE,
+                                 ([c for c, _ in wanted], [t for _, t in wanted]))
+            rows = await cursor.fetchall()
+        return id_pairs, _group_metadata(rows, wanted), versions
+
+
+@router.post("/metadata/batch")
+async def get_metadata_batch(payload: MetadataBatchRequest):
+    """Metadata for many datasets at once. Results come back in request order
+    (items first, then dataset_ids); each carries the same document as
+    GET /metadata, or "found": false instead of failing the whole batch."""
+    items = payload.items or []
+    dataset_ids = [str(dataset_id) for dataset_id in payload.dataset_ids or []]
+    if len(items) + len(dataset_ids) > METADATA_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {METADATA_BATCH_MAX} datasets per batch.")
+
+    pairs = [(item.category_name, item.title) for item in items]
+    found = {}
+    for pair in dict.fromkeys(pairs):
+        cached = await metadata_cache.get_async(*pair)
+        if cached is not None:
+            found[pair] = cached
+    missing = [pair for pair in dict.fromkeys(pairs) if pair not in found]
+
+    id_pairs = {}
+    if missing or dataset_ids:
+        if async_db_enabled():
+            id_pairs, loaded, versions = await load_metadata_batch_async(missing, dataset_ids)
+        else:
+            id_pairs, loaded, versions = await run_in_threadpool(load_metadata_batch, missing, dataset_ids)
+        for pair, metadata in loaded.items():
+            await metadata_cache.set_async(*pair, metadata, versions[pair])
+        found.update(loaded)
 
-        dataset_details = {
+    results = []
+    for category_name, title in pairs:
+        metadata = found.get((category_name, title))
+        results.append({
             "category_name": category_name,
-            "dataset_title": normalized_title,  # return alias instead of original
-            "description": rows[0]['description'],
-            "citation": rows[0]['citation'],
-            "doi": rows[0]['doi'],
-            "language": rows[0]['language'],
-            "data_language": rows[0]['data_language'],
-            "license": rows[0]['license'],
-            "publication_date": rows[0]['publication_date'],
-            "last_updated": rows[0]['last_updated'],
-            "registration_date": rows[0]['registration_date'],
-            "is_active": rows[0]['is_active'],
-            "keywords": rows[0]['keywords'],
-            "dataset_type": rows[0]['dataset_type'],
-            "contacts": [],
-            "publishers": [],
-            "scopes": [],
-            "fields": [],
-            "statistics": []
-        }
-
-        for row in rows:
-            contact = {
-                "name": row['contact_name'],
-                "role": row['contact_role'],
-                "email": row['contact_email'],
-                "organization": row['contact_organization'],
-                "address": row['contact_address'],
-                "city": row['contact_city'],
-                "state": row['contact_state'],
-                "country": row['contact_country']
-            }
-            if contact and contact not in dataset_details["contacts"]:
-                dataset_details["contacts"].append(contact)
-
-            publisher = {
-                "publisher_name": row['publisher_name'],
-                "country": row['publisher_country'],
-                "record_count": row['record_count']
-            }
-            if publisher and publisher not in dataset_details["publishers"]:
-                dataset_details["publishers"].append(publisher)
-
-            scope = {
-                "temporal_start_date": row['temporal_start_date'],
-                "temporal_end_date": row['temporal_end_date'],
-                "geographic_scope": row['geographic_scope'],
-                "taxonomic_scope": row['taxonomic_scope'],
-                "taxonomic_authority": row['taxonomic_authority']
-            }
-            if scope not in dataset_details["scopes"]:
-                dataset_details["scopes"].append(scope)
-
-            field = {
-                "field_name": row['field_name'],
-                "ontology_mapping": row['ontology_mapping'],
-                "data_type": row['data_type']
-            }
-            if field not in dataset_details["fields"]:
-                dataset_details["fields"].append(field)
-
-            stat = {
-                "stat_name": row['stat_name'],
-                "stat_value": row['stat_value'],
-                "measurement_date": row['measurement_date']
-            }
-            if stat not in dataset_details["statistics"]:
-                dataset_details["statistics"].append(stat)
-
-        return dataset_details
-    finally:
-        conn.close()
+            "title": title,
+            "found": metadata is not None,
+            "metadata": metadata
+        })
+    for dataset_id in dataset_ids:
+        pair = id_pairs.get(dataset_id)
+        metadata = found.get(pair) if pair else None
+        results.append({
+            "dataset_id": dataset_id,
+            "found": metadata is not None,
+            "metadata": metadata
+        })
+    return FastJSONResponse({"results": results})
@@ -0,0 +1,82 @@
+import os
+import hmac
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Header, Depends
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+
+from app.participant_registry import (
+    participant_registry, Participant, PROTOCOLS, AUTO, ACTIVE, DRAINING, DISABLED
+)
+
+router = APIRouter()
+
+# Admin endpoints (registry changes, harvest runs) require a matching
+# X-Admin-Token header, and are refused outright when no token is configured
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=503, detail="Admin endpoints are disabled: ADMIN_TOKEN is not set.")
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Admin token required.")
+
+
+class ParticipantInput(BaseModel):
+    participant_name: str
+    base_url: str
+    protocol: str = AUTO
+    max_concurrency: Optional[int] = None
+    timeout_seconds: Optional[float] = None
+
+
+@router.get("/participants")
+def list_participants():
+    return participant_registry.stats()
+
+
+@router.post("/participants", dependencies=[Depends(require_admin)])
+async def add_participant(payload: ParticipantInput):
+    # Adds a participant, or replaces the settings of an existing one
+    if payload.protocol not in PROTOCOLS:
+        raise HTTPException(status_code=400, detail=f"protocol must be one of {', '.join(PROTOCOLS)}.")
+    if not payload.base_url.startswith(("http://", "https://")):
+        raise HTTPException(status_code=400, detail="base_url must be an http(s) URL.")
+    if payload.max_concurrency is not None and payload.max_concurrency < 1:
+        raise HTTPException(status_code=400, detail="max_concurrency must be at least 1.")
+    if payload.timeout_seconds is not None and payload.timeout_seconds <= 0:
+        raise HTTPException(status_code=400, detail="timeout_seconds must be positive.")
+
+    participant = Participant(
+        payload.participant_name, payload.base_url, payload.protocol,
+        payload.max_concurrency, payload.timeout_seconds, ACTIVE
+    )
+    await run_in_threadpool(participant_registry.upsert, participant)
+    return participant_registry.stats()["participants"].get(payload.participant_name)
+
+
+async def _set_status(participant_name: str, status: str):
+    if not await run_in_threadpool(participant_registry.set_status, participant_name, status):
+        raise HTTPException(status_code=404, detail=f"Unknown participant: {participant_name}")
+    return participant_registry.stats()["participants"].get(participant_name)
+
+
+@router.post("/participants/{participant_name}/enable", dependencies=[Depends(require_admin)])
+async def enable_participant(participant_name: str):
+    return await _set_status(participant_name, ACTIVE)
+
+
+@router.post("/participants/{participant_name}/drain", dependencies=[Depends(require_admin)])
+async def drain_participant(participant_name: str):
+    # Stops new searches from reaching the participant; in_flight in the
+    # response drops to 0 once the searches already running have finished
+    return await _set_status(participant_name, DRAINING)
+
+
+@router.post("/participants/{participant_name}/disable", dependencies=[Depends(require_admin)])
+async def disable_participant(participant_name: str):
+    # Removes the participant from routing altogether and forgets its health
+    # and bulkhead state; searches already running against it still finish
+    return await _set_status(participant_name, DISABLED)
@@ -0,0 +1,88 @@
+import os
+import asyncio
+
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
+from typing import Optional
+
+# Local stand-in for a participant server, for tests and benchmarks:
+#
+#   uvicorn app.fake_participant:app --port 8100
+#
+# then point a participant at http://127.0.0.1:8100/search.
+# FAKE_PARTICIPANT_BATCH=false serves only the per-field protocol, like the
+# current remote participants.
+FAKE_PARTICIPANT_BATCH = os.getenv("FAKE_PARTICIPANT_BATCH", "true").lower() in ("1", "true", "yes")
+FAKE_PARTICIPANT_LATENCY = float(os.getenv("FAKE_PARTICIPANT_LATENCY", "0"))
+FAKE_PARTICIPANT_RECORDS = int(os.getenv("FAKE_PARTICIPANT_RECORDS", "1000"))
+
+app = FastAPI()
+
+GENERA = ["Ocimum", "Azadirachta", "Curcuma", "Withania", "Phyllanthus", "Centella", "Bacopa", "Tinospora"]
+FAMILIES = ["Lamiaceae", "Meliaceae", "Zingiberaceae", "Solanaceae", "Phyllanthaceae", "Apiaceae",
+            "Plantaginaceae", "Menispermaceae"]
+EPITHETS = ["sanctum", "indica", "longa", "somnifera", "amarus", "asiatica", "monnieri", "cordifolia"]
+STATES = ["Kerala", "Karnataka", "Tamil Nadu", "Maharashtra", "Assam", "Odisha"]
+
+
+def make_records(count: int) -> list:
+    records = []
+    for i in range(count):
+        g = i % len(GENERA)
+        e = (i // len(GENERA)) % len(EPITHETS)
+        records.append({
+            "id": i,
+            "scientific_name": f"{GENERA[g]} {EPITHETS[e]}",
+            "family": FAMILIES[g],
+            "genus": GENERA[g],
+            "state": STATES[i % len(STATES)],
+            "accession": f"ACC-{i:06d}",
+        })
+    return records
+
+
+RECORDS = make_records(FAKE_PARTICIPANT_RECORDS)
+
+
+def search_records(field: str, query: str) -> list:
+    needle = query.casefold()
+    return [r for r in RECORDS if needle in str(r.get(field, "")).casefold()]
+
+
+@app.get("/search")
+async def search(field: str, query: str, limit: Optional[int] = None):
+    await asyncio.sleep(FAKE_PARTICIPANT_LATENCY)
+    return {"results": search_records(field, query)[:limit]}
+
+
+class BatchSearchRequest(BaseModel):
+    query: str
+    fields: list[str]
+    limit: Optional[int] = None
+
+
+@app.post("/search/batch")
+async def batch_search(payload: BatchSearchRequest):
+    if not FAKE_PARTICIPANT_BATCH:
+        raise HTTPException(status_code=404, detail="Not Found")
+    await asyncio.sleep(FAKE_PARTICIPANT_LATENCY)
+    return {
+        "query": payload.query,
+        "field_results": {
+            field: {"results": search_records(field, payload.query)[:payload.limit]}
+            for field in payload.fields
+        }
+    }
+
+
+@app.get("/search/export")
+async def export(cursor: Optional[str] = None, limit: int = 500):
+    # Records in id order; the cursor is the last id handed out
+    start = int(cursor) + 1 if cursor else 0
+    page = RECORDS[start:start + limit]
+    next_cursor = str(page[-1]["id"]) if page else cursor
+    return {
+        "records": page,
+        "next_cursor": next_cursor,
+        "has_more": start + limit < len(RECORDS)
+    }
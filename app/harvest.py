@@ -0,0 +1,303 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+
+from fastapi.concurrency import run_in_threadpool
+from psycopg2.extras import RealDictCursor, Json, execute_values
+
+from app.db import get_db
+from app.search_cache import normalise_query
+from app.participant_protocol import UNSUPPORTED_STATUS
+
+logger = logging.getLogger(__name__)
+
+# Seconds between harvest runs; 0 disables background harvesting
+HARVEST_INTERVAL = float(os.getenv("HARVEST_INTERVAL", "0"))
+HARVEST_PAGE_SIZE = int(os.getenv("HARVEST_PAGE_SIZE", "500"))
+HARVEST_MAX_PAGES = int(os.getenv("HARVEST_MAX_PAGES", "1000"))
+# Recent live queries remembered per participant, replayed for participants
+# without an export endpoint
+HARVEST_REPLAY_QUERIES = int(os.getenv("HARVEST_REPLAY_QUERIES", "200"))
+
+# Participant export protocol, paged and resumable:
+#
+#   GET {participant search url}/export?cursor=<cursor>&limit=<n>
+#   -> {"records": [...], "next_cursor": "<resume point>", "has_more": false}
+EXPORT = "export"
+REPLAY = "replay"
+
+
+def export_url(url: str) -> str:
+    return url.rstrip("/") + "/export"
+
+
+def _fold(name) -> str:
+    return str(name).casefold()
+
+
+def harvested_record_key(record) -> str:
+    if isinstance(record, dict) and record.get("id") is not None:
+        return str(record["id"])
+    return hashlib.sha1(json.dumps(record, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class ParticipantIndex:
+    """Harvested data of one participant.
+
+    In export mode every record is held and queries are answered with the
+    same case-insensitive substring match on the requested field that the
+    participants use. In replay mode only the replayed queries themselves
+    can be answered.
+    """
+
+    def __init__(self, mode: str = EXPORT):
+        self.mode = mode
+        self.cursor = None
+        self.completed_at = None   # wall-clock time of the last finished pass
+        self.last_error = None
+        self.records = {}          # record_key -> record
+        self.by_field = {}         # folded field -> {record_key: folded value}
+        self.queries = {}          # (field, normalised query) -> results
+
+    def add(self, key: str, record):
+        old = self.records.get(key)
+        if isinstance(old, dict):
+            for field in old:
+                self.by_field.get(_fold(field), {}).pop(key, None)
+        self.records[key] = record
+        if isinstance(record, dict):
+            for field, value in record.items():
+                if isinstance(value, (str, int, float)):
+                    self.by_field.setdefault(_fold(field), {})[key] = str(value).casefold()
+
+    def staleness(self):
+        return time.time() - self.completed_at if self.completed_at else None
+
+    def search(self, field: str, query: str):
+        # None when the index cannot answer this query
+        needle = normalise_query(query)
+        if self.mode == REPLAY:
+            return self.queries.get((field, needle))
+        if self.completed_at is None:
+            return None
+        values = self.by_field.get(_fold(field))
+        if values is None:
+            # No harvested record has this field: not an empty answer, the
+            # participant may still search it
+            return None
+        return [self.records[key] for key, value in values.items() if needle in value]
+
+    def stats(self) -> dict:
+        staleness = self.staleness()
+        return {
+            "mode": self.mode,
+            "records": len(self.records),
+            "replayed_queries": len(self.queries),
+            "staleness_seconds": round(staleness, 1) if staleness is not None else None,
+            "last_error": self.last_error,
+        }
+
+
+class HarvestIndex:
+    def __init__(self):
+        self.participants = {}
+        self._recent_queries = {}  # participant -> OrderedDict[(field, query)] for replay
+        self.local_answers = 0
+
+    def get(self, participant_name: str) -> ParticipantIndex:
+        index = self.participants.get(participant_name)
+        if index is None:
+            index = self.participants[participant_name] = ParticipantIndex()
+        return index
+
+    def lookup(self, participant_name: str, field: str, query: str, max_staleness: float):
+        index = self.participants.get(participant_name)
+        if index is None:
+            return None
+        staleness = index.staleness()
+        if staleness is None or staleness > max_staleness:
+            return None
+        results = index.search(field, query)
+        if results is not None:
+            self.local_answers += 1
+        return results
+
+    def remember_query(self, participant_name: str, field: str, query: str):
+        recent = self._recent_queries.setdefault(participant_name, OrderedDict())
+        recent[(field, query)] = None
+        recent.move_to_end((field, query))
+        while len(recent) > HARVEST_REPLAY_QUERIES:
+            recent.popitem(last=False)
+
+    def recent_queries(self, participant_name: str) -> list:
+        return list(self._recent_queries.get(participant_name, {}))
+
+    def stats(self) -> dict:
+        return {
+            "interval_seconds": HARVEST_INTERVAL,
+            "local_answers": self.local_answers,
+            "participants": {name: index.stats() for name, index in self.participants.items()},
+        }
+
+
+harvest_index = HarvestIndex()
+
+
+# ---------- persistence (sync, run in the thread pool) ----------
+
+def _load_index() -> dict:
+    participants = {}
+    with get_db() as conn:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute("SELECT participant_name, mode, cursor, completed_at, last_error FROM harvest_state;")
+        for row in cursor.fetchall():
+            index = participants[row["participant_name"]] = ParticipantIndex(row["mode"])
+            index.cursor = row["cursor"]
+            index.completed_at = row["completed_at"].timestamp() if row["completed_at"] else None
+            index.last_error = row["last_error"]
+        cursor.execute("SELECT participant_name, record_key, record FROM harvested_records;")
+        for row in cursor:
+            participants.setdefault(row["participant_name"], ParticipantIndex()).add(row["record_key"], row["record"])
+        cursor.execute("SELECT participant_name, field, query, results FROM harvested_queries;")
+        for row in cursor:
+            index = participants.setdefault(row["participant_name"], ParticipantIndex(REPLAY))
+            index.queries[(row["field"], row["query"])] = row["results"]
+    return participants
+
+
+def _save_state(participant_name: str, index: ParticipantIndex, cur):
+    cur.execute("""
+        INSERT INTO harvest_state (participant_name, mode, cursor, completed_at, last_attempt_at, record_count, last_error)
+        VALUES (%s, %s, %s, to_timestamp(%s), now(), %s, %s)
+        ON CONFLICT (participant_name) DO UPDATE SET
+            mode = EXCLUDED.mode,
+            cursor = EXCLUDED.cursor,
+            completed_at = EXCLUDED.completed_at,
+            last_attempt_at = EXCLUDED.last_attempt_at,
+            record_count = EXCLUDED.record_count,
+            last_error = EXCLUDED.last_error;
+    """, (participant_name, index.mode, index.cursor, index.completed_at,
+          len(index.records) or len(index.queries), index.last_error))
+
+
+def _persist_state(participant_name: str, index: ParticipantIndex):
+    with get_db() as conn:
+        cur = conn.cursor()
+        _save_state(participant_name, index, cur)
+        conn.commit()
+
+
+def _persist_page(participant_name: str, rows: list, index: ParticipantIndex):
+    # Records and the resume cursor are committed together, so an interrupted
+    # harvest restarts exactly after the last stored page
+    with get_db() as conn:
+        cur = conn.cursor()
+        if rows:
+            execute_values(cur, """
+                INSERT INTO harvested_records (participant_name, record_key, record)
+                VALUES %s
+                ON CONFLICT (participant_name, record_key) DO UPDATE SET
+                    record = EXCLUDED.record,
+                    harvested_at = now();
+            """, [(participant_name, key, Json(record)) for key, record in rows])
+        _save_state(participant_name, index, cur)
+        conn.commit()
+
+
+def _persist_queries(participant_name: str, rows: list, index: ParticipantIndex):
+    with get_db() as conn:
+        cur = conn.cursor()
+        if rows:
+            execute_values(cur, """
+                INSERT INTO harvested_queries (participant_name, field, query, results)
+                VALUES %s
+                ON CONFLICT (participant_name, field, query) DO UPDATE SET
+                    results = EXCLUDED.results,
+                    harvested_at = now();
+            """, [(participant_name, field, query, Json(results)) for field, query, results in rows])
+        _save_state(participant_name, index, cur)
+        conn.commit()
+
+
+# ---------- harvesting ----------
+
+async def _harvest_export(client, participant_name: str, url: str, index: ParticipantIndex) -> bool:
+    # False when the participant has no export endpoint
+    for _ in range(HARVEST_MAX_PAGES):
+        params = {"limit": HARVEST_PAGE_SIZE}
+        if index.cursor is not None:
+            params["cursor"] = index.cursor
+        response = await client.get(export_url(url), params=params)
+        if response.status_code in UNSUPPORTED_STATUS:
+            return False
+        response.raise_for_status()
+        page = response.json()
+
+        rows = [(harvested_record_key(record), record) for record in page.get("records", [])]
+        for key, record in rows:
+            index.add(key, record)
+        index.cursor = page.get("next_cursor", index.cursor)
+        done = not page.get("has_more")
+        if done:
+            index.completed_at = time.time()
+        index.last_error = None
+        await run_in_threadpool(_persist_page, participant_name, rows, index)
+        if done:
+            break
+    return True
+
+
+async def _harvest_replay(client, participant_name: str, url: str, index: ParticipantIndex):
+    rows = []
+    for field, query in harvest_index.recent_queries(participant_name):
+        response = await client.get(url, params={"field": field, "query": query})
+        response.raise_for_status()
+        results = response.json().get("results", [])
+        index.queries[(field, normalise_query(query))] = results
+        rows.append((field, normalise_query(query), results))
+    index.completed_at = time.time()
+    index.last_error = None
+    await run_in_threadpool(_persist_queries, participant_name, rows, index)
+
+
+async def harvest_participant(client, participant_name: str, url: str):
+    index = harvest_index.get(participant_name)
+    try:
+        if index.mode == EXPORT:
+            if not await _harvest_export(client, participant_name, url, index):
+                logger.info("%s has no export endpoint, harvesting by query replay", participant_name)
+                index.mode = REPLAY
+        if index.mode == REPLAY:
+            await _harvest_replay(client, participant_name, url, index)
+    except Exception as e:
+        index.last_error = str(e) or type(e).__name__
+        logger.warning("Harvest of %s failed: %s", participant_name, index.last_error)
+        try:
+            await run_in_threadpool(_persist_state, participant_name, index)
+        except Exception:
+            logger.exception("Could not record harvest state for %s", participant_name)
+
+
+async def harvest_all(client, participants: dict):
+    await asyncio.gather(*[
+        harvest_participant(client, name, url) for name, url in participants.items()
+    ])
+
+
+async def load_index():
+    try:
+        harvest_index.participants = await run_in_threadpool(_load_index)
+    except Exception:
+        logger.exception("Could not load the harvested index")
+
+
+async def run_harvester(client, get_participants):
+    # Background task started from the app lifespan
+    await load_index()
+    while HARVEST_INTERVAL > 0:
+        await harvest_all(client, get_participants())
+        await asyncio.sleep(HARVEST_INTERVAL)
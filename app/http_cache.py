@@ -0,0 +1,295 @@
+import os
+import hashlib
+import inspect
+import threading
+from urllib.parse import parse_qsl
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+
+from app.fast_json import dumps
+from app.catalog_events import on_dataset_changed, on_catalog_changed
+
+# HTTP caching for the read routes: conditional GET (ETag / Last-Modified,
+# answered with 304 before the handler runs where the validators are known up
+# front), shared-cache friendly Cache-Control / Vary, and per-route CORS
+# preflight lifetimes.
+HTTP_CACHE_ENABLED = os.getenv("HTTP_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+# Freshness given to browsers and proxies for catalog reads; after that they
+# revalidate, which is a cheap 304 while nothing changed
+HTTP_CACHE_MAX_AGE = int(os.getenv("HTTP_CACHE_MAX_AGE", "60"))
+HTTP_CACHE_STALE_WHILE_REVALIDATE = int(os.getenv("HTTP_CACHE_STALE_WHILE_REVALIDATE", "300"))
+# Default Access-Control-Max-Age; browsers cap it (Chromium at 2 hours)
+CORS_PREFLIGHT_MAX_AGE = int(os.getenv("CORS_PREFLIGHT_MAX_AGE", "7200"))
+# For the search routes every page preflights; Firefox honours up to a day
+CORS_SEARCH_PREFLIGHT_MAX_AGE = int(os.getenv("CORS_SEARCH_PREFLIGHT_MAX_AGE", "86400"))
+
+CATALOG_CACHE_CONTROL = (
+    f"public, max-age={HTTP_CACHE_MAX_AGE}, stale-while-revalidate={HTTP_CACHE_STALE_WHILE_REVALIDATE}"
+)
+
+
+class CachePolicy:
+    """How one route is cached.
+
+    validators(params) returns (etag, last_modified epoch seconds or None)
+    for the query parameters, or None when they are not known without
+    running the handler; it may be a coroutine function. Only give a
+    last_modified that moves on every change of the response: clients that
+    send If-Modified-Since alone get a 304 on it. With etag_from_body the
+    ETag is a hash of the response body instead, so a match still saves the
+    transfer but not the work.
+    """
+
+    __slots__ = ("cache_control", "vary", "validators", "etag_from_body", "preflight_max_age")
+
+    def __init__(self, cache_control=None, vary="Origin", validators=None, etag_from_body=False,
+                 preflight_max_age=None):
+        self.cache_control = cache_control
+        self.vary = vary
+        self.validators = validators
+        self.etag_from_body = etag_from_body
+        self.preflight_max_age = preflight_max_age
+
+
+_policies = {}  # path -> CachePolicy
+
+
+def cache_policy(path: str, policy: CachePolicy):
+    _policies[path] = policy
+
+
+# ---------- dataset versions ----------
+class DatasetVersions:
+    """Per-dataset change counters, bumped by catalog events, and the
+    validators of cached metadata documents.
+
+    The ETag is a fingerprint of the document, computed once per version of
+    it, so every worker sends the same one. There is no Last-Modified:
+    metadata_modified_date does not move on every write (details,
+    deactivations, imports of older records), so If-Modified-Since would
+    answer 304 for changed documents.
+    """
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._versions = {}         # (category_name, title) -> version
+        self._epoch = 0             # bumped by bulk changes
+        self._memo = OrderedDict()  # key -> (version, epoch, document, etag)
+
+    def bump(self, key):
+        with self._lock:
+            self._versions[key] = self._versions.get(key, 0) + 1
+
+    def bump_all(self):
+        with self._lock:
+            self._epoch += 1
+            self._versions.clear()
+            self._memo.clear()
+
+    def validators(self, key, document):
+        with self._lock:
+            version = self._versions.get(key, 0)
+            memo = self._memo.get(key)
+            if memo is not None and memo[0] == version and memo[1] == self._epoch and memo[2] is document:
+                self._memo.move_to_end(key)
+                return memo[3], None
+        etag = '"' + hashlib.sha256(dumps(document)).hexdigest()[:32] + '"'
+        with self._lock:
+            self._memo[key] = (version, self._epoch, document, etag)
+            self._memo.move_to_end(key)
+            while len(self._memo) > self.max_entries:
+                self._memo.popitem(last=False)
+        return etag, None
+
+
+dataset_versions = DatasetVersions()
+
+
+@on_dataset_changed
+def _bump_dataset_version(dataset_id, category_name, title):
+    dataset_versions.bump((category_name, title))
+
+
+@on_catalog_changed
+def _bump_catalog_version():
+    dataset_versions.bump_all()
+
+
+# ---------- conditional requests ----------
+async def _validators(policy: CachePolicy, params: dict):
+    if policy.validators is None:
+        return None
+    validators = policy.validators(params)
+    if inspect.isawaitable(validators):
+        validators = await validators
+    return validators
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    # Weak comparison, as RFC 9110 prescribes for If-None-Match
+    if if_none_match.strip() == "*":
+        return True
+    wanted = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == wanted:
+            return True
+    return False
+
+
+def _not_modified_since(if_modified_since: str, last_modified: float) -> bool:
+    try:
+        since = parsedate_to_datetime(if_modified_since).timestamp()
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return False
+    return int(last_modified) <= since
+
+
+def _not_modified(headers: dict, etag, last_modified) -> bool:
+    # If-None-Match wins over If-Modified-Since when both are sent
+    if_none_match = headers.get(b"if-none-match")
+    if if_none_match is not None:
+        return etag is not None and _etag_matches(if_none_match.decode("latin-1"), etag)
+    if_modified_since = headers.get(b"if-modified-since")
+    if if_modified_since is not None and last_modified is not None:
+        return _not_modified_since(if_modified_since.decode("latin-1"), last_modified)
+    return False
+
+
+def _cache_headers(policy: CachePolicy, etag=None, last_modified=None) -> list:
+    headers = []
+    if etag is not None:
+        headers.append((b"etag", etag.encode("latin-1")))
+    if last_modified is not None:
+        headers.append((b"last-modified", formatdate(last_modified, usegmt=True).encode("latin-1")))
+    if policy.cache_control:
+        headers.append((b"cache-control", policy.cache_control.encode("latin-1")))
+    return headers
+
+
+def _merge_headers(headers: list, extra: list) -> list:
+    # Headers the handler set itself are kept
+    present = {name.lower() for name, _ in headers}
+    return headers + [(name, value) for name, value in extra if name not in present]
+
+
+class ConditionalGetMiddleware:
+    """Pure ASGI middleware for GET requests to routes with a CachePolicy:
+    validators, Cache-Control and 304s. Installed inside CORSMiddleware, so
+    304s carry the CORS headers too."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        policy = _policies.get(scope.get("path")) if scope["type"] == "http" else None
+        if policy is None or scope["method"] != "GET" or not HTTP_CACHE_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        params = dict(parse_qsl(scope.get("query_string", b"").decode("latin-1")))
+        validators = await _validators(policy, params)
+        if validators is not None and _not_modified(headers, *validators):
+            await send({"type": "http.response.start", "status": 304,
+                        "headers": _cache_headers(policy, *validators)})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        if policy.etag_from_body:
+            await self._hash_body(scope, receive, send, policy, headers)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and message["status"] in (200, 304):
+                # The handler may have just filled what the validators read
+                known = validators or await _validators(policy, params)
+                extra = _cache_headers(policy, *(known or (None, None)))
+                message = {**message, "headers": _merge_headers(list(message.get("headers", [])), extra)}
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    async def _hash_body(self, scope, receive, send, policy, headers):
+        # Buffers the (small) body to derive its ETag
+        start = None
+        chunks = []
+
+        async def send_wrapper(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                if message["status"] == 200:
+                    start = message
+                else:
+                    await send(message)
+                return
+            if start is None:
+                await send(message)  # not a 200: passed through as is
+                return
+            chunks.append(message.get("body", b""))
+            if message.get("more_body"):
+                return
+            body = b"".join(chunks)
+            etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+            response_headers = [(name, value) for name, value in start.get("headers", [])
+                                if name.lower() != b"content-length"]
+            if _not_modified(headers, etag, None):
+                await send({"type": "http.response.start", "status": 304,
+                            "headers": _merge_headers(response_headers, _cache_headers(policy, etag))})
+                await send({"type": "http.response.body", "body": b""})
+                return
+            response_headers.append((b"content-length", str(len(body)).encode("latin-1")))
+            await send({**start, "headers": _merge_headers(response_headers, _cache_headers(policy, etag))})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def _vary(headers: list, vary: str) -> list:
+    # One Vary header holding the route's tokens and any CORS added, no repeats
+    tokens = {}
+    for name, value in headers:
+        if name.lower() == b"vary":
+            for token in value.decode("latin-1").split(","):
+                tokens.setdefault(token.strip().lower(), token.strip())
+    for token in vary.split(","):
+        tokens.setdefault(token.strip().lower(), token.strip())
+    rest = [(name, value) for name, value in headers if name.lower() != b"vary"]
+    return rest + [(b"vary", ", ".join(t for t in tokens.values() if t).encode("latin-1"))]
+
+
+class CacheHeadersMiddleware:
+    """Installed outside CORSMiddleware: sets the route's Vary on its GET
+    responses, merged with what CORS adds, and the per-route
+    Access-Control-Max-Age on the preflights CORS answers."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        policy = _policies.get(scope.get("path")) if scope["type"] == "http" else None
+        if policy is None or not HTTP_CACHE_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        if scope["method"] == "OPTIONS" and policy.preflight_max_age is not None:
+            max_age = str(policy.preflight_max_age).encode("latin-1")
+
+            def rewrite(headers):
+                return [(name, value) for name, value in headers
+                        if name.lower() != b"access-control-max-age"] + [(b"access-control-max-age", max_age)]
+        elif scope["method"] == "GET" and policy.vary:
+            def rewrite(headers):
+                return _vary(headers, policy.vary)
+        else:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": rewrite(list(message.get("headers", [])))}
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
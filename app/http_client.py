@@ -0,0 +1,109 @@
+import os
+import logging
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Outbound connection settings for participant servers, applied per participant origin
+PARTICIPANT_TIMEOUT = float(os.getenv("PARTICIPANT_TIMEOUT", "10"))
+PARTICIPANT_MAX_CONNECTIONS = int(os.getenv("PARTICIPANT_MAX_CONNECTIONS", "20"))
+PARTICIPANT_MAX_KEEPALIVE = int(os.getenv("PARTICIPANT_MAX_KEEPALIVE", "10"))
+PARTICIPANT_KEEPALIVE_EXPIRY = float(os.getenv("PARTICIPANT_KEEPALIVE_EXPIRY", "30"))
+PARTICIPANT_HTTP2 = os.getenv("PARTICIPANT_HTTP2", "false").lower() in ("1", "true", "yes")
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401  (optional dependency, `pip install httpx[http2]`)
+        return True
+    except ImportError:
+        return False
+
+
+class PerOriginTransport(httpx.AsyncBaseTransport):
+    """Routes each request to a connection pool dedicated to its origin, so
+    every participant gets its own connection limits and keep-alive pool
+    while the app shares a single AsyncClient."""
+
+    def __init__(self, limits: httpx.Limits, http2: bool = False):
+        self.limits = limits
+        self.http2 = http2
+        self._transports = {}
+
+    @staticmethod
+    def origin(url: httpx.URL) -> str:
+        port = f":{url.port}" if url.port else ""
+        return f"{url.scheme}://{url.host}{port}"
+
+    def _transport_for(self, url: httpx.URL) -> httpx.AsyncHTTPTransport:
+        key = self.origin(url)
+        transport = self._transports.get(key)
+        if transport is None:
+            transport = httpx.AsyncHTTPTransport(limits=self.limits, http2=self.http2)
+            self._transports[key] = transport
+        return transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._transport_for(request.url).handle_async_request(request)
+
+    async def aclose(self):
+        for transport in self._transports.values():
+            await transport.aclose()
+        self._transports.clear()
+
+    def stats(self) -> dict:
+        stats = {}
+        for origin, transport in self._transports.items():
+            pool = transport._pool
+            connections = list(pool.connections)
+            idle = sum(1 for c in connections if c.is_idle())
+            queued = sum(1 for r in getattr(pool, "_requests", []) if getattr(r, "connection", None) is None)
+            stats[origin] = {
+                "connections": len(connections),
+                "active": len(connections) - idle,
+                "idle": idle,
+                "queued": queued,
+            }
+        return stats
+
+
+_client = None
+_transport = None
+
+
+def create_http_client() -> httpx.AsyncClient:
+    global _client, _transport
+    http2 = PARTICIPANT_HTTP2
+    if http2 and not _http2_available():
+        logger.warning("PARTICIPANT_HTTP2 is set but the h2 package is not installed; using HTTP/1.1")
+        http2 = False
+    limits = httpx.Limits(
+        max_connections=PARTICIPANT_MAX_CONNECTIONS,
+        max_keepalive_connections=PARTICIPANT_MAX_KEEPALIVE,
+        keepalive_expiry=PARTICIPANT_KEEPALIVE_EXPIRY,
+    )
+    _transport = PerOriginTransport(limits, http2=http2)
+    _client = httpx.AsyncClient(transport=_transport, timeout=PARTICIPANT_TIMEOUT)
+    return _client
+
+
+async def close_http_client():
+    global _client, _transport
+    if _client is not None:
+        await _client.aclose()
+    _client = None
+    _transport = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    # FastAPI dependency; the client itself is created in the app lifespan
+    if _client is None:
+        return create_http_client()
+    return _client
+
+
+def http_pool_stats() -> dict:
+    if _transport is None:
+        return {}
+    return _transport.stats()
@@ -1,154 +1,183 @@
-from fastapi import FastAPI, HTTPException, Body
-from pydantic import BaseModel
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 import httpx
 import asyncio
+import logging
+from contextlib import asynccontextmanager
 
 # Include other internal modules
-from app.db import get_connection
+from app.db import init_pool, close_pool, pool_stats
+from app.db_async import init_async_pool, close_async_pool, async_pool_stats
+from app.schema import ensure_schema, run_schema_initializer
+from app.harvest import run_harvester, harvest_index
+from app.cache import metadata_cache
+from app.search_cache import search_cache
+from app.participant_health import participant_health
+from app.query_planner import query_planner
+from app.participant_protocol import protocol_negotiator
+from app.catalog_snapshot import catalog_snapshot
+from app.catalog_search import catalog_search_index
+from app.http_client import create_http_client, close_http_client, http_pool_stats, PerOriginTransport
+from app.metrics import MetricsMiddleware, register_gauges, render_metrics
+from app.fast_json import FastJSONResponse
+from app.http_cache import (
+    ConditionalGetMiddleware, CacheHeadersMiddleware, CachePolicy, cache_policy,
+    CATALOG_CACHE_CONTROL, CORS_PREFLIGHT_MAX_AGE, CORS_SEARCH_PREFLIGHT_MAX_AGE
+)
 from app.endpoints import metadata
 from app.endpoints import categories_router
 
 from fastapi.middleware.cors import CORSMiddleware
 from app.endpoints import dataset_master
 from app.endpoints import dataset_details
-
-app = FastAPI()
-
+from app.endpoints import catalog_import
+from app.endpoints import catalog_changes
+from app.endpoints import catalog_search
+from app.endpoints import federated_search
+from app.endpoints import harvest
+from app.endpoints import participants
+from app.participant_registry import participant_registry, routing_table, run_registry_refresher
+from app.bulkhead import admission_control
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One connection pool per worker, shared by all DB-backed routes. With the
+    # database down the app still starts; get_db() opens the pool on first use.
+    try:
+        init_pool()
+    except Exception:
+        logger.exception("Could not open the database pool")
+    # Async pool for the catalog routes when DB_ASYNC is on (see app/db_async.py)
+    await init_async_pool()
+    # A failing statement stops startup; with the database down the schema
+    # is applied in the background once it is back
+    schema = None if ensure_schema() else asyncio.create_task(run_schema_initializer())
+    # One keep-alive HTTP client per worker for participant fan-out
+    client = create_http_client()
+    # Routing table from the participant registry, reloaded in the background
+    registry = asyncio.create_task(run_registry_refresher())
+    harvester = asyncio.create_task(run_harvester(client, lambda: routing_table().urls))
+    yield
+    harvester.cancel()
+    registry.cancel()
+    if schema is not None:
+        schema.cancel()
+    await close_http_client()
+    await close_async_pool()
+    close_pool()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+
+# Inside CORS, so 304s get the CORS headers as well
+app.add_middleware(ConditionalGetMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    max_age=CORS_PREFLIGHT_MAX_AGE,
 )
+# Outside CORS: Vary merged with CORS's own, and per-route preflight max-age
+app.add_middleware(CacheHeadersMiddleware)
+# Outermost, so its timings include CORS handling
+app.add_middleware(MetricsMiddleware)
 
 # Include internal routes
 app.include_router(metadata.router)
 app.include_router(categories_router)
 app.include_router(dataset_master.router)
 app.include_router(dataset_details.router)
+app.include_router(catalog_import.router)
+app.include_router(catalog_changes.router)
+app.include_router(catalog_search.router)
+app.include_router(federated_search.router)
+app.include_router(harvest.router)
+app.include_router(participants.router)
 
-# Participant API endpoints
-PARTICIPANTS = {
-    "Kew Plant Database": "http://134.209.145.106:8000/search",
-    "Citizens’ Portal of Medicinal Plants": "http://139.59.84.243:8050/search"
-}
 
-# Updated request payload model
-class FederatedSearchRequest(BaseModel):
-    category: list[str]
-    dataset: list[str]
-    fields: list[str]
-    search_text: str
+@app.get("/ping")
+def ping():
+    return {"ping": "pong"}
 
-async def fetch_from_participant(client, participant_name: str, url: str, field: str, query: str):
-    try:
-        response = await client.get(url, params={"field": field, "query": query})
-        response.raise_for_status()
-        return {
-            "participant_name": participant_name,
-            "field": field,
-            "api_url": url,
-            "results": response.json().get("results", [])
-        }
-    except Exception as e:
-        return {
-            "participant_name": participant_name,
-            "field": field,
-            "api_url": url,
-            "results": [],
-            "error": str(e)
-        }
 
-# @app.post("/federated-search")
-# async def federated_search(payload: FederatedSearchRequest = Body(...)):
-#     # Check category
-#     if "biodiversity" not in [c.lower() for c in payload.category]:
-#         raise HTTPException(status_code=400, detail="At least one category must be 'biodiversity'.")
-
-#     # Validate datasets
-#     invalid = [ds for ds in payload.dataset if ds not in PARTICIPANTS]
-#     if invalid:
-#         raise HTTPException(status_code=400, detail=f"Unknown datasets: {', '.join(invalid)}")
-
-#     async with httpx.AsyncClient(timeout=10.0) as client:
-#         # Create one task per dataset-field combination
-#         tasks = [
-#             fetch_from_participant(client, participant, PARTICIPANTS[participant], field, payload.search_text)
-#             for participant in payload.dataset
-#             for field in payload.fields
-#         ]
-#         responses = await asyncio.gather(*tasks)
-
-#     # Group results by participant
-#     results = {}
-#     for item in responses:
-#         pname = item["participant_name"]
-#         if pname not in results:
-#             results[pname] = {
-#                 "api_url": item["api_url"],
-#                 "field_results": {}
-#             }
-#         results[pname]["field_results"][item["field"]] = {
-#             "results": item["results"],
-#             "error": item.get("error")
-#         }
-
-#     return {
-#         "category": payload.category,
-#         "dataset": payload.dataset,
-#         "fields": payload.fields,
-#         "search_text": payload.search_text,
-#         "results": results
-#     }
-
-
-@app.post("/federated-search")
-async def federated_search(payload: FederatedSearchRequest = Body(...)):
-    # Check category
-    if "biodiversity" not in [c.lower() for c in payload.category]:
-        raise HTTPException(status_code=400, detail="At least one category must be 'biodiversity'.")
-
-    # Filter only known participants
-    valid_datasets = [ds for ds in payload.dataset if ds in PARTICIPANTS]
-    invalid_datasets = [ds for ds in payload.dataset if ds not in PARTICIPANTS]
-
-    if not valid_datasets:
-        raise HTTPException(status_code=400, detail="No valid datasets provided.")
-
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        tasks = [
-            fetch_from_participant(client, participant, PARTICIPANTS[participant], field, payload.search_text)
-            for participant in valid_datasets
-            for field in payload.fields
-        ]
-        responses = await asyncio.gather(*tasks)
-
-    # Group results by participant
-    results = {}
-    for item in responses:
-        pname = item["participant_name"]
-        if pname not in results:
-            results[pname] = {
-                "api_url": item["api_url"],
-                "field_results": {}
-            }
-        results[pname]["field_results"][item["field"]] = {
-            "results": item["results"],
-            "error": item.get("error")
+@app.get("/stats")
+def stats():
+    return {
+        "db_pool": pool_stats(),
+        "db_async_pool": async_pool_stats(),
+        "metadata_cache": metadata_cache.stats(),
+        "catalog_snapshot": catalog_snapshot.stats(),
+        "catalog_search": catalog_search_index.stats(),
+        "search_cache": search_cache.stats(),
+        "participant_health": participant_health.stats(),
+        "query_planner": query_planner.stats(),
+        "participant_protocols": protocol_negotiator.stats(),
+        "harvest": harvest_index.stats(),
+        "participant_registry": participant_registry.stats(),
+        "admission": {
+            "fanout": admission_control.stats(),
+            "participants": participant_registry.bulkhead_stats()
+        },
+        "coalescing": {
+            "metadata": metadata.metadata_flight.stats(),
+            "metadata_async": metadata.metadata_async_flight.stats(),
+            "participants": federated_search.participant_flight.stats()
+        },
+        "participant_connections": {
+            participant: http_pool_stats().get(PerOriginTransport.origin(httpx.URL(url)), {})
+            for participant, url in routing_table().urls.items()
         }
+    }
 
+
+def _participant_pool(stat: str) -> dict:
+    pools = http_pool_stats()
     return {
-        "category": payload.category,
-        "dataset": payload.dataset,
-        "valid_datasets": valid_datasets,
-        "invalid_datasets": invalid_datasets,   # <--- include info for debugging
-        "fields": payload.fields,
-        "search_text": payload.search_text,
-        "results": results
+        participant: pools.get(PerOriginTransport.origin(httpx.URL(url)), {}).get(stat, 0)
+        for participant, url in routing_table().urls.items()
     }
 
 
-@app.get("/ping")
-def ping():
-    return {"ping": "pong"}
+# HTTP caching per route (app/http_cache.py). The catalog reads revalidate
+# with a 304 before the handler runs whenever their validators are in memory;
+# /categories has no in-memory copy, so its ETag is a hash of the body.
+cache_policy("/categories", CachePolicy(CATALOG_CACHE_CONTROL, etag_from_body=True))
+cache_policy("/categories-with-datasets",
+             CachePolicy(CATALOG_CACHE_CONTROL, validators=lambda params: catalog_snapshot.validators()))
+cache_policy("/metadata", CachePolicy(CATALOG_CACHE_CONTROL, validators=metadata.metadata_validators))
+cache_policy("/federated-search", CachePolicy(preflight_max_age=CORS_SEARCH_PREFLIGHT_MAX_AGE))
+cache_policy("/metadata/batch", CachePolicy(preflight_max_age=CORS_SEARCH_PREFLIGHT_MAX_AGE))
+
+
+register_gauges("db_pool", "Sync database pool state.", "stat", pool_stats)
+register_gauges("db_async_pool", "Async database pool state.", "stat", async_pool_stats)
+register_gauges("participant_pool_active_connections", "Busy connections per participant.", "participant",
+                lambda: _participant_pool("active"))
+register_gauges("participant_pool_idle_connections", "Idle keep-alive connections per participant.", "participant",
+                lambda: _participant_pool("idle"))
+register_gauges("fanout_admission", "Upstream requests in flight, and searches admitted or shed with 503.", "stat",
+                admission_control.stats)
+
+
+def _bulkhead(stat: str) -> dict:
+    return {participant: stats[stat] for participant, stats in participant_registry.bulkhead_stats().items()}
+
+
+register_gauges("participant_queue_depth", "Participant calls waiting for a concurrency slot.", "participant",
+                lambda: _bulkhead("queued"))
+register_gauges("participant_in_flight", "Participant calls holding a concurrency slot.", "participant",
+                lambda: _bulkhead("running"))
+register_gauges("participant_rejections", "Participant calls rejected on a full queue, since start.", "participant",
+                lambda: _bulkhead("rejected"))
+register_gauges("participant_queue_timeouts", "Participant calls that gave up waiting for a slot, since start.",
+                "participant", lambda: _bulkhead("queue_timeouts"))
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
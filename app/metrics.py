@@ -0,0 +1,229 @@
+import os
+import time
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Instrumentation surface: Prometheus text-format metrics served at /metrics,
+# plus a per-request breakdown of where time went, returned in the
+# Server-Timing header. Kept dependency-free; every update is a dict lookup
+# and a few additions under a lock.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=None) -> str:
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join('%s="%s"' % (name, _escape(value)) for name, value in pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list:
+        lines = ["# HELP %s %s" % (self.name, self.help), "# TYPE %s counter" % self.name]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append("%s%s %s" % (self.name, _labels(self.labelnames, labels), value))
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}  # labels -> [per-bucket counts..., +Inf count, sum]
+
+    def observe(self, value: float, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> list:
+        lines = ["# HELP %s %s" % (self.name, self.help), "# TYPE %s histogram" % self.name]
+        with self._lock:
+            snapshot = sorted((labels, list(series)) for labels, series in self._series.items())
+        for labels, series in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                lines.append("%s_bucket%s %d" % (
+                    self.name, _labels(self.labelnames, labels, ("le", bound)), cumulative))
+            lines.append("%s_sum%s %s" % (self.name, _labels(self.labelnames, labels), round(series[-1], 6)))
+            lines.append("%s_count%s %d" % (self.name, _labels(self.labelnames, labels), cumulative))
+        return lines
+
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Request latency by route.", ("method", "route", "status"))
+RESPONSE_BYTES = Histogram(
+    "http_response_size_bytes", "Response body size by route.", ("method", "route"), SIZE_BUCKETS)
+UPSTREAM_SECONDS = Histogram(
+    "participant_request_duration_seconds", "Participant request latency.", ("participant", "field"))
+UPSTREAM_REQUESTS = Counter(
+    "participant_requests_total", "Participant requests by outcome (ok, error, timeout, circuit_open, rejected, unsupported).",
+    ("participant", "field", "outcome"))
+UPSTREAM_BODY_BYTES = Histogram(
+    "participant_response_read_bytes", "Participant response bytes read.", ("participant",), SIZE_BUCKETS)
+UPSTREAM_BUFFER_BYTES = Histogram(
+    "participant_parse_buffer_bytes", "Peak unparsed bytes held while reading a participant response.",
+    ("participant",), SIZE_BUCKETS)
+UPSTREAM_TRUNCATED = Counter(
+    "participant_truncated_responses_total", "Participant responses cut short by the record or byte cap.",
+    ("participant", "cap"))
+DB_QUERY_SECONDS = Histogram(
+    "db_query_duration_seconds", "Database time per named query.", ("query",))
+DB_QUERY_ERRORS = Counter(
+    "db_query_errors_total", "Database queries that raised, per named query.", ("query",))
+
+METRICS = [REQUEST_SECONDS, RESPONSE_BYTES, UPSTREAM_SECONDS, UPSTREAM_REQUESTS, UPSTREAM_BODY_BYTES,
+           UPSTREAM_BUFFER_BYTES, UPSTREAM_TRUNCATED, DB_QUERY_SECONDS, DB_QUERY_ERRORS]
+
+# Gauges read at scrape time: name -> callable returning {label value: number}
+_gauge_sources = {}
+
+
+def register_gauges(name: str, help: str, label: str, read):
+    _gauge_sources[name] = (help, label, read)
+
+
+def _render_gauges() -> list:
+    lines = []
+    for name, (help, label, read) in _gauge_sources.items():
+        try:
+            values = read()
+        except Exception:
+            continue
+        lines.append("# HELP %s %s" % (name, help))
+        lines.append("# TYPE %s gauge" % name)
+        for key, value in sorted(values.items()):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            lines.append("%s%s %s" % (name, _labels((label,), (key,)), value))
+    return lines
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    lines.extend(_render_gauges())
+    return "\n".join(lines) + "\n"
+
+
+# ---------- per-request timings (Server-Timing) ----------
+# Phase name -> seconds for the current request. The dict is shared with
+# thread-pool work, which runs in a copy of the request's context.
+_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def add_timing(phase: str, seconds: float):
+    timings = _timings.get()
+    if timings is not None:
+        timings[phase] = timings.get(phase, 0.0) + seconds
+
+
+@contextmanager
+def timed_query(name: str):
+    """Times a database round trip: `with timed_query("metadata"): ...`."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        if METRICS_ENABLED:
+            DB_QUERY_ERRORS.inc(name)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        if METRICS_ENABLED:
+            DB_QUERY_SECONDS.observe(elapsed, name)
+        add_timing("db", elapsed)
+
+
+def record_upstream(participant: str, field: str, seconds: float, outcome: str):
+    # Labels must come from bounded sets: callers map client-supplied field
+    # names through QueryPlanner.metric_field
+    if METRICS_ENABLED:
+        UPSTREAM_SECONDS.observe(seconds, participant, field)
+        UPSTREAM_REQUESTS.inc(participant, field, outcome)
+
+
+def record_participant_body(participant: str, bytes_read: int, peak_buffer: int, cap=None):
+    # cap: "records" or "bytes" when the response was cut short
+    if METRICS_ENABLED:
+        UPSTREAM_BODY_BYTES.observe(bytes_read, participant)
+        UPSTREAM_BUFFER_BYTES.observe(peak_buffer, participant)
+        if cap:
+            UPSTREAM_TRUNCATED.inc(participant, cap)
+
+
+def _server_timing(timings: dict, total: float) -> bytes:
+    parts = ["%s;dur=%.2f" % (phase, seconds * 1000) for phase, seconds in timings.items()]
+    parts.append("total;dur=%.2f" % (total * 1000))
+    return ", ".join(parts).encode("latin-1")
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: times every HTTP request, counts response bytes
+    and adds the Server-Timing header (db, fanout, serialize, total)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        timings = {}
+        token = _timings.set(timings)
+        state = {"status": 500, "bytes": 0}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", _server_timing(timings, time.perf_counter() - start)))
+                message = {**message, "headers": headers}
+            elif message["type"] == "http.response.body":
+                state["bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _timings.reset(token)
+            # The templated path, so /metadata?title=... is one series
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            method = scope.get("method", "")
+            REQUEST_SECONDS.observe(time.perf_counter() - start, method, path, str(state["status"]))
+            RESPONSE_BYTES.observe(state["bytes"], method, path)
@@ -0,0 +1,212 @@
+import os
+import time
+import asyncio
+from bisect import bisect_left
+from collections import deque
+
+from app.http_client import PARTICIPANT_TIMEOUT
+
+# Adaptive deadline: p99 of recent successful calls x factor, clamped to [min, max]
+HEALTH_WINDOW = int(os.getenv("PARTICIPANT_HEALTH_WINDOW", "200"))
+HEALTH_MIN_SAMPLES = int(os.getenv("PARTICIPANT_HEALTH_MIN_SAMPLES", "20"))
+DEADLINE_FACTOR = float(os.getenv("PARTICIPANT_DEADLINE_FACTOR", "3"))
+DEADLINE_MIN = float(os.getenv("PARTICIPANT_DEADLINE_MIN", "0.5"))
+DEADLINE_MAX = float(os.getenv("PARTICIPANT_DEADLINE_MAX", str(PARTICIPANT_TIMEOUT)))
+# Circuit breaker: open after N consecutive failures or when the windowed error
+# rate exceeds the threshold; after OPEN_SECONDS a single probe is let through.
+CIRCUIT_FAILURES = int(os.getenv("PARTICIPANT_CIRCUIT_FAILURES", "5"))
+CIRCUIT_ERROR_RATE = float(os.getenv("PARTICIPANT_CIRCUIT_ERROR_RATE", "0.5"))
+CIRCUIT_OPEN_SECONDS = float(os.getenv("PARTICIPANT_CIRCUIT_OPEN_SECONDS", "30"))
+# Hedging: send a second request once the first has run past the p95
+HEDGE_REQUESTS = os.getenv("PARTICIPANT_HEDGE_REQUESTS", "false").lower() in ("1", "true", "yes")
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class NeutralOutcome(Exception):
+    """Raised by a request for an answer that says nothing about the
+    participant's health (e.g. an unsupported protocol); guarded_call records
+    it as neither a success nor a failure."""
+
+
+class ParticipantHealth:
+    def __init__(self):
+        self.latencies = deque(maxlen=HEALTH_WINDOW)   # seconds, successful calls only
+        self.outcomes = deque(maxlen=HEALTH_WINDOW)    # True for success
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.consecutive_failures = 0
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.successes = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.hedges = 0
+        # Timeout budget from the participant registry
+        self.max_deadline = DEADLINE_MAX
+
+    def quantile(self, q: float):
+        if len(self.latencies) < HEALTH_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def deadline(self) -> float:
+        p99 = self.quantile(0.99)
+        if p99 is None:
+            return self.max_deadline
+        return min(self.max_deadline, max(DEADLINE_MIN, p99 * DEADLINE_FACTOR))
+
+    def hedge_delay(self):
+        return self.quantile(0.95) if HEDGE_REQUESTS else None
+
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def allow_request(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.monotonic() - self.opened_at >= CIRCUIT_OPEN_SECONDS:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and not self.probe_in_flight:
+            self.probe_in_flight = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self, latency: float):
+        self.successes += 1
+        self.latencies.append(latency)
+        self.outcomes.append(True)
+        self.buckets[bisect_left(LATENCY_BUCKETS, latency)] += 1
+        self.consecutive_failures = 0
+        self.probe_in_flight = False
+        if self.state != CLOSED:
+            # The failures that opened the circuit say nothing about the
+            # recovered participant; without this the next single failure
+            # would trip the error rate again
+            self.outcomes.clear()
+            self.outcomes.append(True)
+        self.state = CLOSED
+
+    def record_failure(self, timeout: bool = False):
+        self.failures += 1
+        self.timeouts += int(timeout)
+        self.outcomes.append(False)
+        self.consecutive_failures += 1
+        self.probe_in_flight = False
+        if (
+            self.state == HALF_OPEN
+            or self.consecutive_failures >= CIRCUIT_FAILURES
+            or (len(self.outcomes) >= HEALTH_MIN_SAMPLES and self.error_rate() > CIRCUIT_ERROR_RATE)
+        ):
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    def release_probe(self):
+        # The probe was cancelled before it could tell us anything
+        self.probe_in_flight = False
+
+    def stats(self) -> dict:
+        p50, p95, p99 = self.quantile(0.5), self.quantile(0.95), self.quantile(0.99)
+        return {
+            "state": self.state,
+            "deadline_seconds": round(self.deadline(), 3),
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "p99_ms": round(p99 * 1000, 1) if p99 is not None else None,
+            "error_rate": round(self.error_rate(), 3),
+            "latency_histogram": {
+                **{f"le_{bound}": count for bound, count in zip(LATENCY_BUCKETS, self.buckets)},
+                "le_inf": self.buckets[-1],
+            },
+            "successes": self.successes,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+            "hedges": self.hedges,
+        }
+
+
+class HealthTracker:
+    def __init__(self):
+        self._participants = {}
+
+    def get(self, participant_name: str) -> ParticipantHealth:
+        health = self._participants.get(participant_name)
+        if health is None:
+            health = self._participants[participant_name] = ParticipantHealth()
+        return health
+
+    def retain(self, participant_names):
+        # Drops the state of every participant not named; calls still running
+        # keep the object they were given
+        for name in list(self._participants):
+            if name not in participant_names:
+                del self._participants[name]
+
+    def stats(self) -> dict:
+        return {name: health.stats() for name, health in self._participants.items()}
+
+
+participant_health = HealthTracker()
+
+
+async def guarded_call(health: ParticipantHealth, make_request):
+    """Run make_request(deadline) under the participant's circuit breaker and
+    adaptive deadline, hedging a second attempt after the p95 if enabled.
+    httpx applies the deadline to each read, so it also bounds the whole
+    call, hedge included, in wall-clock time."""
+    if not health.allow_request():
+        raise CircuitOpenError("circuit open: participant marked unavailable, skipped")
+
+    deadline = health.deadline()
+    start = time.perf_counter()
+    try:
+        async with asyncio.timeout(deadline):
+            response = await _hedged(health, lambda: make_request(deadline))
+    except (asyncio.CancelledError, NeutralOutcome):
+        health.release_probe()
+        raise
+    except Exception as e:
+        health.record_failure(timeout=isinstance(e, asyncio.TimeoutError) or "Timeout" in type(e).__name__)
+        raise
+    health.record_success(time.perf_counter() - start)
+    return response
+
+
+async def _hedged(health: ParticipantHealth, make_request):
+    delay = health.hedge_delay()
+    if delay is None:
+        return await make_request()
+
+    first = asyncio.ensure_future(make_request())
+    done, _ = await asyncio.wait({first}, timeout=delay)
+    if done:
+        return first.result()
+
+    health.hedges += 1
+    pending = {first, asyncio.ensure_future(make_request())}
+    error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,59 @@
+import os
+import time
+
+# Batched participant protocol:
+#
+#   POST {participant search url}/batch  {"query": "...", "fields": ["a", "b"]}
+#   -> {"field_results": {"a": {"results": [...]}, "b": {"results": [...]}}}
+#
+# "auto" tries it once per participant and remembers the answer; "off" always
+# uses the per-field GET protocol.
+PARTICIPANT_BATCH_PROTOCOL = os.getenv("PARTICIPANT_BATCH_PROTOCOL", "auto")
+# How long a "not supported" answer is trusted before batching is tried again
+BATCH_RENEGOTIATE_SECONDS = float(os.getenv("PARTICIPANT_BATCH_RENEGOTIATE_SECONDS", "3600"))
+
+BATCH = "batch"
+PER_FIELD = "per_field"
+
+# Status codes that mean the participant does not implement the batch endpoint.
+# Any other error (400, 401, 403, 429, 5xx...) is an ordinary failure of the
+# call: it counts against the participant's health and does not switch it
+# to the per-field protocol
+UNSUPPORTED_STATUS = (404, 405, 501)
+
+
+def batch_url(url: str) -> str:
+    return url.rstrip("/") + "/batch"
+
+
+class ProtocolNegotiator:
+    def __init__(self, mode: str, renegotiate_after: float):
+        self.mode = mode
+        self.renegotiate_after = renegotiate_after
+        self._decisions = {}  # participant -> (protocol, decided_at)
+
+    def use_batch(self, participant_name: str, preference: str = "auto") -> bool:
+        # preference: the protocol set for the participant in the registry
+        if self.mode == "off" or preference == PER_FIELD:
+            return False
+        if preference == BATCH:
+            return True
+        decision = self._decisions.get(participant_name)
+        if decision is None:
+            return True
+        protocol, decided_at = decision
+        if protocol == PER_FIELD and time.monotonic() - decided_at > self.renegotiate_after:
+            return True
+        return protocol == BATCH
+
+    def record(self, participant_name: str, supported: bool):
+        self._decisions[participant_name] = (BATCH if supported else PER_FIELD, time.monotonic())
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "participants": {name: protocol for name, (protocol, _) in self._decisions.items()},
+        }
+
+
+protocol_negotiator = ProtocolNegotiator(PARTICIPANT_BATCH_PROTOCOL, BATCH_RENEGOTIATE_SECONDS)
@@ -0,0 +1,246 @@
+import os
+import time
+import asyncio
+import logging
+from types import MappingProxyType
+
+from fastapi.concurrency import run_in_threadpool
+from psycopg2.extras import RealDictCursor
+
+from app.db import get_db
+from app.bulkhead import Bulkhead, PARTICIPANT_MAX_QUEUE, PARTICIPANT_QUEUE_TIMEOUT
+from app.http_client import PARTICIPANT_TIMEOUT
+from app.participant_health import participant_health
+from app.participant_protocol import BATCH, PER_FIELD
+
+logger = logging.getLogger(__name__)
+
+# Seconds between reloads of the registry, so a change made through another
+# worker reaches this one; changes made here are applied immediately
+PARTICIPANT_REGISTRY_REFRESH = float(os.getenv("PARTICIPANT_REGISTRY_REFRESH", "30"))
+# Default in-flight request cap per participant
+PARTICIPANT_MAX_CONCURRENCY = int(os.getenv("PARTICIPANT_MAX_CONCURRENCY", "20"))
+
+# Seed for an empty registry table, and the routing table used when the
+# database cannot be reached
+DEFAULT_PARTICIPANTS = {
+    "Kew Plant Database": "http://134.209.145.106:8000/search",
+    "Citizens’ Portal of Medicinal Plants": "http://139.59.84.243:8050/search"
+}
+
+AUTO = "auto"
+PROTOCOLS = (AUTO, BATCH, PER_FIELD)
+
+ACTIVE = "active"
+DRAINING = "draining"   # no new searches, in-flight ones finish
+DISABLED = "disabled"   # out of the routing table, health and bulkhead state dropped
+STATUSES = (ACTIVE, DRAINING, DISABLED)
+
+REGISTRY_QUERY = """
+    SELECT participant_name, base_url, protocol, max_concurrency, timeout_seconds, status
+    FROM participant_registry
+    ORDER BY participant_name;
+"""
+
+UPSERT_PARTICIPANT = """
+    INSERT INTO participant_registry (
+        participant_name, base_url, protocol, max_concurrency, timeout_seconds, status
+    )
+    VALUES (%s, %s, %s, %s, %s, %s)
+    ON CONFLICT (participant_name) DO UPDATE SET
+        base_url = EXCLUDED.base_url,
+        protocol = EXCLUDED.protocol,
+        max_concurrency = EXCLUDED.max_concurrency,
+        timeout_seconds = EXCLUDED.timeout_seconds,
+        status = EXCLUDED.status,
+        updated_at = now();
+"""
+
+SET_STATUS = """
+    UPDATE participant_registry SET status = %s, updated_at = now()
+    WHERE participant_name = %s;
+"""
+
+
+class Participant:
+    __slots__ = ("name", "url", "protocol", "max_concurrency", "timeout", "status")
+
+    def __init__(self, name, url, protocol=AUTO, max_concurrency=None, timeout=None, status=ACTIVE):
+        self.name = name
+        self.url = url
+        self.protocol = protocol or AUTO
+        self.max_concurrency = max_concurrency or PARTICIPANT_MAX_CONCURRENCY
+        self.timeout = timeout or PARTICIPANT_TIMEOUT
+        self.status = status or ACTIVE
+
+    def to_dict(self) -> dict:
+        return {
+            "participant_name": self.name,
+            "base_url": self.url,
+            "protocol": self.protocol,
+            "max_concurrency": self.max_concurrency,
+            "timeout_seconds": self.timeout,
+            "status": self.status,
+        }
+
+
+class RoutingTable:
+    """Immutable view of the registry used by the search path. A change builds
+    a new table and swaps the reference, so a search keeps one consistent
+    table from start to end without any locking."""
+
+    def __init__(self, participants, source: str):
+        participants = list(participants)
+        self.participants = MappingProxyType({p.name: p for p in participants if p.status != DISABLED})
+        # Kept only so the registry can list them and they can be enabled again
+        self.disabled = MappingProxyType({p.name: p for p in participants if p.status == DISABLED})
+        # Only active participants receive new searches
+        self.urls = MappingProxyType({p.name: p.url for p in participants if p.status == ACTIVE})
+        self.source = source
+        self.loaded_at = time.time()
+
+    def get(self, name: str):
+        return self.participants.get(name)
+
+    def protocol(self, name: str) -> str:
+        participant = self.participants.get(name)
+        return participant.protocol if participant else AUTO
+
+
+def _default_table(source: str) -> RoutingTable:
+    return RoutingTable([Participant(name, url) for name, url in DEFAULT_PARTICIPANTS.items()], source)
+
+
+class ParticipantRegistry:
+    def __init__(self):
+        self.table = _default_table("defaults")
+        self._bulkheads = {}   # participant -> Bulkhead
+        self.reloads = 0
+        self.last_error = None
+
+    # ---------- database (sync, run in the thread pool) ----------
+    def _fetch(self) -> list:
+        with get_db() as conn:
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            cursor.execute(REGISTRY_QUERY)
+            rows = cursor.fetchall()
+            if not rows:
+                # First start: seed the table with the built-in participants
+                cur = conn.cursor()
+                for name, url in DEFAULT_PARTICIPANTS.items():
+                    cur.execute(UPSERT_PARTICIPANT, (name, url, AUTO, None, None, ACTIVE))
+                conn.commit()
+                cursor.execute(REGISTRY_QUERY)
+                rows = cursor.fetchall()
+            return rows
+
+    def _save(self, participant: Participant):
+        with get_db() as conn:
+            cur = conn.cursor()
+            cur.execute(UPSERT_PARTICIPANT, (
+                participant.name, participant.url, participant.protocol,
+                participant.max_concurrency, participant.timeout, participant.status
+            ))
+            conn.commit()
+
+    def _set_status(self, name: str, status: str) -> bool:
+        with get_db() as conn:
+            cur = conn.cursor()
+            cur.execute(SET_STATUS, (status, name))
+            updated = cur.rowcount
+            conn.commit()
+        return updated > 0
+
+    # ---------- table ----------
+    def _swap(self, table: RoutingTable):
+        for participant in table.participants.values():
+            participant_health.get(participant.name).max_deadline = participant.timeout
+        # Disabled (or removed) participants start from scratch when they come back
+        participant_health.retain(table.participants)
+        for name in list(self._bulkheads):
+            if name not in table.participants:
+                del self._bulkheads[name]
+        self.table = table
+        self.reloads += 1
+
+    def load(self):
+        try:
+            rows = self._fetch()
+        except Exception as e:
+            # Keep routing with whatever table we have
+            self.last_error = str(e).strip() or type(e).__name__
+            logger.warning("Could not load the participant registry: %s", self.last_error)
+            return
+        self.last_error = None
+        self._swap(RoutingTable([
+            Participant(row["participant_name"], row["base_url"], row["protocol"],
+                        row["max_concurrency"], row["timeout_seconds"], row["status"])
+            for row in rows
+        ], "database"))
+
+    def upsert(self, participant: Participant):
+        self._save(participant)
+        self.load()
+
+    def set_status(self, name: str, status: str) -> bool:
+        if not self._set_status(name, status):
+            return False
+        self.load()
+        return True
+
+    # ---------- per-participant bulkheads ----------
+    def bulkhead(self, name: str) -> Bulkhead:
+        participant = self.table.get(name)
+        limit = participant.max_concurrency if participant else PARTICIPANT_MAX_CONCURRENCY
+        bulkhead = self._bulkheads.get(name)
+        if bulkhead is None:
+            bulkhead = self._bulkheads[name] = Bulkhead(limit, PARTICIPANT_MAX_QUEUE, PARTICIPANT_QUEUE_TIMEOUT)
+        elif bulkhead.limit != limit:
+            # Takes effect as slots free up; raising it admits waiters now
+            bulkhead.limit = limit
+            while bulkhead.queued and bulkhead.running < bulkhead.limit:
+                bulkhead.running += 1
+                bulkhead.release()
+        return bulkhead
+
+    def slot(self, name: str):
+        """`async with participant_registry.slot(name):` around a participant
+        call. Raises BulkheadFull when its queue is full or the wait times out."""
+        return self.bulkhead(name).slot()
+
+    def in_flight(self, name: str) -> int:
+        bulkhead = self._bulkheads.get(name)
+        return bulkhead.running if bulkhead else 0
+
+    def bulkhead_stats(self) -> dict:
+        return {name: bulkhead.stats() for name, bulkhead in self._bulkheads.items()}
+
+    def stats(self) -> dict:
+        table = self.table
+        participants = {
+            name: {**participant.to_dict(), "in_flight": self.in_flight(name),
+                   "queued": self._bulkheads[name].queued if name in self._bulkheads else 0}
+            for name, participant in table.participants.items()
+        }
+        participants.update((name, participant.to_dict()) for name, participant in table.disabled.items())
+        return {
+            "source": table.source,
+            "loaded_at": table.loaded_at,
+            "reloads": self.reloads,
+            "last_error": self.last_error,
+            "participants": participants,
+        }
+
+
+participant_registry = ParticipantRegistry()
+
+
+def routing_table() -> RoutingTable:
+    return participant_registry.table
+
+
+async def run_registry_refresher():
+    # Background task started from the app lifespan
+    while True:
+        await run_in_threadpool(participant_registry.load)
+        await asyncio.sleep(PARTICIPANT_REGISTRY_REFRESH)
@@ -0,0 +1,258 @@
+import os
+import re
+import json
+import codecs
+
+from app.fast_json import RawJSON
+
+# Caps on what one participant response may cost us. Past PARTICIPANT_MAX_BYTES
+# the body is no longer read; past PARTICIPANT_MAX_RECORDS a result list is cut.
+# Either marks the results as truncated.
+PARTICIPANT_MAX_BYTES = int(os.getenv("PARTICIPANT_MAX_BYTES", str(8 * 1024 * 1024)))
+PARTICIPANT_MAX_RECORDS = int(os.getenv("PARTICIPANT_MAX_RECORDS", "5000"))
+# Keep unprojected records as the participant's own JSON text, spliced into
+# responses without re-encoding
+PARTICIPANT_PASSTHROUGH = os.getenv("PARTICIPANT_PASSTHROUGH", "true").lower() in ("1", "true", "yes")
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_KEY = re.compile(r'"((?:[^"\\]|\\.)*)"[ \t\n\r]*:')
+_SEPARATOR = re.compile(r"[ \t\n\r]*,[ \t\n\r]*")
+_raw_decode = json.JSONDecoder().raw_decode
+
+# Parser states
+VALUE = "value"   # a value is expected at the current path
+KEY = "key"       # inside an object: a key, a comma or the closing brace
+ITEM = "item"     # inside a results array: a record, a comma or the closing bracket
+END = "end"       # the top-level value is complete
+
+OBJECT = "object"
+ARRAY = "array"
+
+
+def per_field_targets(field: str) -> dict:
+    # {"results": [...]}
+    return {("results",): field}
+
+
+def batch_targets(fields) -> dict:
+    # {"field_results": {"a": {"results": [...]}, "b": [...]}}
+    targets = {}
+    for field in fields:
+        targets[("field_results", field, "results")] = field
+        targets[("field_results", field)] = field
+    return targets
+
+
+def project_record(record, record_fields):
+    if not record_fields or not isinstance(record, dict):
+        return record
+    return {key: record[key] for key in record_fields if key in record}
+
+
+def project_records(records: list, record_fields) -> list:
+    if not record_fields:
+        return records
+    return [project_record(record, record_fields) for record in records]
+
+
+class ResultsParser:
+    """Incremental reader for the results arrays of a participant response.
+
+    Bytes are fed in as they arrive. Only the objects on the way to a results
+    array are walked; each record is decoded on its own, projected to
+    `record_fields` and kept until the record cap, so memory follows what is
+    kept rather than the size of the body. Without a projection, records are
+    kept as their JSON text and handed out as RawJSON (passthrough). Anything
+    else in the response is decoded and dropped. `done` turns true once nothing more is wanted from
+    the body: every results array is complete or over its cap, or the byte
+    cap was hit.
+    """
+
+    def __init__(self, targets: dict, limit=None, record_fields=None,
+                 max_records: int = PARTICIPANT_MAX_RECORDS, max_bytes: int = PARTICIPANT_MAX_BYTES):
+        self.targets = targets    # path of a results array -> name it is returned under
+        self._navigable = {path[:i] for path in targets for i in range(len(path))}
+        self.limit = limit
+        self.max_records = max_records
+        self.keep = min(limit, max_records) if limit else max_records
+        self.max_bytes = max_bytes
+        self.record_fields = tuple(record_fields) if record_fields else None
+        self.passthrough = PARTICIPANT_PASSTHROUGH and self.record_fields is None
+        self.results = {}         # name -> records (their JSON text when passing through)
+        self.complete = set()     # names whose array was read to the end
+        self.overflow = set()     # names with more records than were kept
+        self.bytes_read = 0
+        self.bytes_exceeded = False
+        self.peak_buffer = 0
+        self.done = False
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._stack = []          # (OBJECT, path) or (ARRAY, name)
+        self._path = ()
+        self._state = VALUE
+
+    def feed(self, chunk: bytes):
+        if self.done:
+            return
+        allowed = self.max_bytes - self.bytes_read
+        if len(chunk) > allowed:
+            chunk = chunk[:max(allowed, 0)]
+            self.bytes_exceeded = True
+        self.bytes_read += len(chunk)
+        self._buffer += self._text.decode(chunk)
+        self.peak_buffer = max(self.peak_buffer, len(self._buffer))
+        self._parse(final=False)
+        if self.bytes_exceeded:
+            self.done = True
+
+    def finish(self):
+        # End of body; raises ValueError if the response was not complete JSON
+        if self.done:
+            return
+        self._buffer += self._text.decode(b"", True)
+        self._parse(final=True)
+        if self._state != END:
+            raise ValueError("participant response ended mid-document")
+        self.done = True
+
+    def take(self, name):
+        # The results for name: a list, or RawJSON when passing through
+        records = self.results.get(name, [])
+        return RawJSON.from_fragments(records) if self.passthrough else records
+
+    def truncated(self, name) -> bool:
+        if name in self.overflow:
+            # Cut to the caller's own limit is not truncation
+            return self.limit is None or self.limit > self.max_records
+        return self.bytes_exceeded and name not in self.complete
+
+    def _decode(self, buffer: str, pos: int, final: bool):
+        # (value, end), or None when the value continues in a later chunk
+        try:
+            value, end = _raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if final:
+                raise ValueError("invalid JSON in participant response")
+            return None
+        if end == len(buffer) and not final:
+            return None  # a number at the very end may go on
+        return value, end
+
+    def _parent_state(self) -> str:
+        if not self._stack:
+            return END
+        return KEY if self._stack[-1][0] == OBJECT else ITEM
+
+    def _parse(self, final: bool):
+        buffer = self._buffer
+        pos = 0
+        state = self._state
+        stack = self._stack
+        while state != END:
+            pos = _WHITESPACE.match(buffer, pos).end()
+            if pos >= len(buffer):
+                break
+            char = buffer[pos]
+
+            if state == VALUE:
+                path = self._path
+                if char == "[" and path in self.targets:
+                    name = self.targets[path]
+                    self.results.setdefault(name, [])
+                    stack.append((ARRAY, name))
+                    pos += 1
+                    state = ITEM
+                elif char == "{" and path in self._navigable:
+                    stack.append((OBJECT, path))
+                    pos += 1
+                    state = KEY
+                else:
+                    decoded = self._decode(buffer, pos, final)
+                    if decoded is None:
+                        break
+                    pos = decoded[1]
+                    state = self._parent_state()
+
+            elif state == KEY:
+                if char == ",":
+                    pos += 1
+                elif char == "}":
+                    stack.pop()
+                    pos += 1
+                    state = self._parent_state()
+                else:
+                    match = _KEY.match(buffer, pos)
+                    if match is None:
+                        if final:
+                            raise ValueError("invalid JSON in participant response")
+                        break
+                    key = match.group(1)
+                    if "\\" in key:
+                        key = json.loads('"%s"' % key)
+                    self._path = stack[-1][1] + (key,)
+                    pos = match.end()
+                    state = VALUE
+
+            else:  # ITEM
+                name = stack[-1][1]
+                if char == ",":
+                    pos += 1
+                elif char == "]":
+                    stack.pop()
+                    self.complete.add(name)
+                    pos += 1
+                    state = self._parent_state()
+                else:
+                    # Consecutive records of one array are read in a tight loop
+                    records = self.results[name]
+                    project = self.record_fields is not None
+                    passthrough = self.passthrough
+                    size = len(buffer)
+                    more = False
+                    while True:
+                        try:
+                            record, end = _raw_decode(buffer, pos)
+                        except json.JSONDecodeError:
+                            if final:
+                                raise ValueError("invalid JSON in participant response")
+                            more = True
+                            break
+                        if end == size and not final:
+                            more = True  # a number at the very end may go on
+                            break
+                        if len(records) >= self.keep:
+                            pos = end
+                            self.overflow.add(name)
+                            break
+                        if passthrough:
+                            records.append(buffer[pos:end])
+                        else:
+                            records.append(project_record(record, self.record_fields) if project else record)
+                        pos = end
+                        match = _SEPARATOR.match(buffer, pos)
+                        if match is None:
+                            break
+                        pos = match.end()
+                        if pos >= size or buffer[pos] == "]":
+                            break
+                    if more:
+                        break
+                    if name in self.overflow and self.complete | self.overflow >= set(self.targets.values()):
+                        self.done = True
+                        break
+
+        self._state = state
+        self._buffer = buffer[pos:]
+        if state == END:
+            self.done = True
+
+
+async def read_results(response, parser: ResultsParser) -> ResultsParser:
+    """Feeds a streamed httpx response into the parser, and stops reading as
+    soon as the parser has all it wants."""
+    async for chunk in response.aiter_bytes():
+        parser.feed(chunk)
+        if parser.done:
+            return parser
+    parser.finish()
+    return parser
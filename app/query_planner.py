@@ -0,0 +1,140 @@
+import os
+import time
+import logging
+import threading
+
+from psycopg2.extras import RealDictCursor
+
+from app.db import get_db
+from app.metrics import timed_query
+from app.catalog_events import on_dataset_changed, on_catalog_changed
+
+logger = logging.getLogger(__name__)
+
+# Index refresh: on dataset writes, and in any case after MAX_AGE seconds
+PLANNER_INDEX_MAX_AGE = float(os.getenv("PLANNER_INDEX_MAX_AGE", "300"))
+# Send the participant's own column name (dataset_mapping.field_name) instead of
+# the open field name the client asked for. Off by default: participants map
+# open field names themselves (see app/map_fields_ui.py).
+PLANNER_TRANSLATE_FIELDS = os.getenv("PLANNER_TRANSLATE_FIELDS", "false").lower() in ("1", "true", "yes")
+
+MAPPINGS_QUERY = """
+    SELECT
+        ds.title,
+        dm.field_name,
+        dm.ontology_mapping,
+        dm.ontology_mapping_to_display
+    FROM
+        dataset_master ds
+    JOIN
+        dataset_mapping dm ON dm.dataset_id = ds.dataset_id
+    WHERE
+        ds.is_active = true AND dm.field_name IS NOT NULL;
+"""
+
+
+def _fold(name) -> str:
+    return " ".join(str(name).split()).casefold()
+
+
+class QueryPlanner:
+    """In-memory index of dataset title -> supported field names -> the
+    participant's column name, used to drop participant x field pairs that
+    cannot match before fanning out."""
+
+    def __init__(self, max_age: float, translate: bool):
+        self.max_age = max_age
+        self.translate = translate
+        self._lock = threading.Lock()
+        self._index = {}
+        self._fields = frozenset()  # every registered alias, folded
+        self._loaded_at = None
+        self.loads = 0
+        self.planned = 0
+        self.pruned = 0
+
+    def stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.max_age
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    def load(self):
+        try:
+            with get_db() as conn, timed_query("planner_mappings"):
+                cursor = conn.cursor(cursor_factory=RealDictCursor)
+                cursor.execute(MAPPINGS_QUERY)
+                rows = cursor.fetchall()
+        except Exception:
+            # Plan without pruning until the next attempt rather than failing searches
+            logger.exception("Could not load dataset mappings for the query planner")
+            with self._lock:
+                self._loaded_at = time.monotonic() - self.max_age + 30
+            return
+
+        index = {}
+        for row in rows:
+            fields = index.setdefault(_fold(row["title"]), {})
+            for alias in (row["field_name"], row["ontology_mapping"], row["ontology_mapping_to_display"]):
+                if alias:
+                    fields.setdefault(_fold(alias), row["field_name"])
+        with self._lock:
+            self._index = index
+            self._fields = frozenset(alias for fields in index.values() for alias in fields)
+            self._loaded_at = time.monotonic()
+            self.loads += 1
+
+    def plan(self, participants: list, fields: list):
+        """Returns (calls, pruned): calls are (participant, field, upstream_field)
+        triples, pruned lists the pairs that were dropped."""
+        with self._lock:
+            index = self._index
+        calls, pruned = [], []
+        for participant in participants:
+            supported = index.get(_fold(participant))
+            for field in fields:
+                if supported is None:
+                    # No mappings registered for this dataset: nothing to prune on
+                    calls.append((participant, field, field))
+                    continue
+                column = supported.get(_fold(field))
+                if column is None:
+                    pruned.append({
+                        "participant_name": participant,
+                        "field": field,
+                        "reason": "field is not mapped for this dataset"
+                    })
+                    continue
+                calls.append((participant, field, column if self.translate else field))
+        self.planned += len(calls)
+        self.pruned += len(pruned)
+        return calls, pruned
+
+    def metric_field(self, field: str) -> str:
+        # Metric label for a requested field: fields come from the client, so
+        # only names registered in some dataset's mappings get their own series
+        folded = _fold(field)
+        return folded if folded in self._fields else "other"
+
+    def stats(self) -> dict:
+        return {
+            "datasets": len(self._index),
+            "age_seconds": round(time.monotonic() - self._loaded_at, 3) if self._loaded_at else None,
+            "translate_fields": self.translate,
+            "loads": self.loads,
+            "planned_calls": self.planned,
+            "pruned_calls": self.pruned,
+        }
+
+
+query_planner = QueryPlanner(PLANNER_INDEX_MAX_AGE, PLANNER_TRANSLATE_FIELDS)
+
+
+@on_dataset_changed
+def _invalidate_planner(dataset_id, category_name, title):
+    query_planner.invalidate()
+
+
+@on_catalog_changed
+def _invalidate_planner_index():
+    query_planner.invalidate()
@@ -0,0 +1,103 @@
+import os
+import json
+import heapq
+import base64
+import hashlib
+
+from fastapi import HTTPException
+
+# Record keys tried, in order, to identify the taxon a participant record describes
+NAME_KEYS = ("scientific_name", "scientificname", "species", "taxon_name", "taxon", "name")
+
+MAX_PAGE_SIZE = 500
+# Records asked of each participant per field for the merged view; it pages
+# over the merged set of these, so deep pages cost no more than the first.
+# Participants that fill it are reported as truncated (truncated_sources)
+MERGE_WINDOW = int(os.getenv("MERGE_WINDOW", "1000"))
+
+
+def record_key(record) -> str:
+    if isinstance(record, dict):
+        lowered = {str(k).casefold(): v for k, v in record.items()}
+        for name in NAME_KEYS:
+            value = lowered.get(name)
+            if isinstance(value, str) and value.strip():
+                return " ".join(value.split()).casefold()
+    return json.dumps(record, sort_keys=True, default=str)
+
+
+def merge_results(items: list, query: str, after, limit: int):
+    """Deduplicates the records of every participant/field item by record_key,
+    keeping where each one came from, and returns one ranked page:
+    (records, has_more, rank of the last record). `after` is the rank carried
+    by the cursor, None for the first page."""
+    merged = {}
+    for item in items:
+        for record in item.get("results") or []:
+            key = record_key(record)
+            entry = merged.get(key)
+            if entry is None:
+                entry = merged[key] = {"key": key, "record": record, "sources": []}
+            source = {"participant_name": item["participant_name"], "field": item["field"]}
+            if source not in entry["sources"]:
+                entry["sources"].append(source)
+
+    needle = " ".join(query.split()).casefold()
+
+    def rank(entry):
+        # Exact, then prefix name matches first. Only what a record is goes
+        # in, never which participants answered for it: that changes between
+        # pages as participants recover, and a record whose rank improved
+        # past the cursor would never be served.
+        key = entry["key"]
+        return [key != needle, not key.startswith(needle), key]
+
+    # Keyset paging: the cursor carries the rank of the last record served,
+    # so a page never repeats a record even if participants return more
+    # records for a later page than they did for an earlier one.
+    candidates = merged.values() if after is None else (e for e in merged.values() if rank(e) > after)
+    page = heapq.nsmallest(limit + 1, candidates, key=rank)
+    has_more = len(page) > limit
+    page = page[:limit]
+    return page, has_more, rank(page[-1]) if page else after
+
+
+def truncated_sources(items: list, window: int) -> list:
+    """The participant/field items the merged view may be missing records of:
+    cut by the record or byte cap, or a full window returned, past which the
+    participant was never asked. Paging ends at the merge window, so a client
+    is told rather than shown a short last page as the end of the results."""
+    return [
+        {"participant_name": item["participant_name"], "field": item["field"]}
+        for item in items
+        if item.get("truncated") or (not item.get("error") and len(item.get("results") or []) >= window)
+    ]
+
+
+def request_fingerprint(payload) -> str:
+    # Ties a cursor to the search it was issued for
+    basis = json.dumps(
+        [sorted(payload.dataset), sorted(payload.fields), " ".join(payload.search_text.split()).casefold(), payload.limit,
+         sorted(payload.record_fields or [])],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(basis.encode("utf-8")).hexdigest()[:16]
+
+
+def encode_cursor(after: list, fingerprint: str) -> str:
+    raw = json.dumps({"r": after, "f": fingerprint}, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, fingerprint: str):
+    # Returns the rank of the last record served
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        after = list(data["r"])
+        matches = data["f"] == fingerprint
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+    if not matches:
+        raise HTTPException(status_code=400, detail="Cursor does not belong to this search.")
+    return after
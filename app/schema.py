@@ -0,0 +1,119 @@
+import os
+import asyncio
+import logging
+
+import psycopg2
+from psycopg2 import pool
+from fastapi.concurrency import run_in_threadpool
+
+from app.db import get_db
+
+logger = logging.getLogger(__name__)
+
+# Seconds between attempts while the database is unreachable at startup
+SCHEMA_RETRY_SECONDS = float(os.getenv("SCHEMA_RETRY_SECONDS", "10"))
+
+# Tables owned by this service (the catalog tables themselves are managed
+# outside the app). Every statement must be idempotent; they run on startup.
+SCHEMA_STATEMENTS = [
+    # Harvested participant data, see app/harvest.py
+    """
+    CREATE TABLE IF NOT EXISTS harvest_state (
+        participant_name TEXT PRIMARY KEY,
+        mode TEXT NOT NULL DEFAULT 'export',
+        cursor TEXT,
+        completed_at TIMESTAMPTZ,
+        last_attempt_at TIMESTAMPTZ,
+        record_count INTEGER NOT NULL DEFAULT 0,
+        last_error TEXT
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS harvested_records (
+        participant_name TEXT NOT NULL,
+        record_key TEXT NOT NULL,
+        record JSONB NOT NULL,
+        harvested_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        PRIMARY KEY (participant_name, record_key)
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS harvested_queries (
+        participant_name TEXT NOT NULL,
+        field TEXT NOT NULL,
+        query TEXT NOT NULL,
+        results JSONB NOT NULL,
+        harvested_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        PRIMARY KEY (participant_name, field, query)
+    );
+    """,
+    # Catalog change feed, see app/change_log.py. (txid, change_id) is the
+    # feed cursor, txid the writing transaction.
+    """
+    CREATE TABLE IF NOT EXISTS catalog_changes (
+        change_id BIGSERIAL PRIMARY KEY,
+        dataset_id TEXT NOT NULL,
+        entity TEXT NOT NULL,
+        change TEXT NOT NULL,
+        changed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    );
+    """,
+    """
+    ALTER TABLE catalog_changes
+        ADD COLUMN IF NOT EXISTS txid BIGINT NOT NULL DEFAULT txid_current();
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS catalog_changes_txid_idx
+        ON catalog_changes (txid, change_id);
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS catalog_changes_dataset_idx
+        ON catalog_changes (dataset_id, change_id);
+    """,
+    # Participant registry, see app/participant_registry.py. NULL limits fall
+    # back to the PARTICIPANT_* settings.
+    """
+    CREATE TABLE IF NOT EXISTS participant_registry (
+        participant_name TEXT PRIMARY KEY,
+        base_url TEXT NOT NULL,
+        protocol TEXT NOT NULL DEFAULT 'auto',
+        max_concurrency INTEGER,
+        timeout_seconds DOUBLE PRECISION,
+        status TEXT NOT NULL DEFAULT 'active',
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    );
+    """,
+]
+
+
+_applied = False
+
+
+def schema_applied() -> bool:
+    return _applied
+
+
+def ensure_schema() -> bool:
+    """Applies SCHEMA_STATEMENTS. Returns False when the database cannot be
+    reached; any other failure is raised, as the catalog writes record into
+    catalog_changes and cannot work without it."""
+    global _applied
+    try:
+        with get_db() as conn:
+            cur = conn.cursor()
+            for statement in SCHEMA_STATEMENTS:
+                cur.execute(statement)
+            conn.commit()
+            cur.close()
+    except (psycopg2.OperationalError, pool.PoolError) as e:
+        logger.warning("Database unreachable, service schema not applied yet: %s", e)
+        return False
+    _applied = True
+    return True
+
+
+async def run_schema_initializer():
+    # Background task started from the app lifespan when the database was
+    # down at startup; catalog writes answer 503 until it succeeds
+    while not await run_in_threadpool(ensure_schema):
+        await asyncio.sleep(SCHEMA_RETRY_SECONDS)
@@ -0,0 +1,122 @@
+import os
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Federated search result cache settings
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "2000"))
+SEARCH_CACHE_MAX_BYTES = int(os.getenv("SEARCH_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Entries younger than the TTL are served as-is; up to STALE_TTL they are
+# served while a background refresh runs; older entries are refetched inline.
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "60"))
+SEARCH_CACHE_STALE_TTL = float(os.getenv("SEARCH_CACHE_STALE_TTL", "600"))
+
+FRESH = "fresh"
+STALE = "stale"
+
+
+def normalise_query(query: str) -> str:
+    return " ".join(query.split()).casefold()
+
+
+class SearchResultCache:
+    """Per participant+field+query cache of successful participant results,
+    bounded by entry count and by the size of the cached response bodies."""
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float, stale_ttl: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stale_ttl = max(stale_ttl, ttl)
+        self._entries = OrderedDict()  # key -> (results, size, stored_at)
+        self._bytes = 0
+        self._refreshing = {}          # key -> background refresh task
+        self._counters = {}
+
+    @staticmethod
+    def key(participant_name: str, field: str, query: str, limit=None, record_fields=None) -> tuple:
+        # limit: result cap pushed down to the participant, part of the key;
+        # record_fields: the projection the records were read with
+        return (participant_name, field, normalise_query(query), limit,
+                tuple(record_fields) if record_fields else None)
+
+    def _count(self, participant_name: str, counter: str):
+        counters = self._counters.setdefault(
+            participant_name, {"hits": 0, "misses": 0, "stale": 0, "refreshes": 0, "evictions": 0}
+        )
+        counters[counter] += 1
+
+    def lookup(self, key):
+        # (results, FRESH | STALE | None); expired entries are dropped
+        entry = self._entries.get(key)
+        if entry is None:
+            self._count(key[0], "misses")
+            return None, None
+        results, size, stored_at = entry
+        age = time.monotonic() - stored_at
+        if age > self.stale_ttl:
+            self._remove(key)
+            self._count(key[0], "misses")
+            return None, None
+        self._entries.move_to_end(key)
+        if age > self.ttl:
+            self._count(key[0], "stale")
+            return results, STALE
+        self._count(key[0], "hits")
+        return results, FRESH
+
+    def store(self, key, results: list, size: int):
+        if size > self.max_bytes:
+            return
+        self._remove(key)
+        self._entries[key] = (results, size, time.monotonic())
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            evicted, _ = next(iter(self._entries.items()))
+            self._remove(evicted)
+            self._count(evicted[0], "evictions")
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def refresh_in_background(self, key, fetch):
+        # fetch() -> (item, size); at most one refresh per key at a time
+        if key in self._refreshing:
+            return
+        self._count(key[0], "refreshes")
+
+        async def refresh():
+            try:
+                item, size = await fetch()
+                if not item.get("error") and not item.get("truncated"):
+                    self.store(key, item["results"], size)
+            except Exception:
+                logger.exception("Background refresh failed for %s", key)
+            finally:
+                self._refreshing.pop(key, None)
+
+        self._refreshing[key] = asyncio.create_task(refresh())
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "refreshing": len(self._refreshing),
+            "participants": {name: dict(c) for name, c in self._counters.items()},
+        }
+
+
+search_cache = SearchResultCache(
+    SEARCH_CACHE_MAX_ENTRIES, SEARCH_CACHE_MAX_BYTES, SEARCH_CACHE_TTL, SEARCH_CACHE_STALE_TTL
+)
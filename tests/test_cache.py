@@ -0,0 +1,103 @@
+import fnmatch
+
+import pytest
+
+from app.cache import LocalBackend, MetadataCache, RedisBackend
+
+
+class FakeRedis:
+    """The redis-py calls RedisBackend makes, in memory. Expiry is ignored;
+    the set-if-version script is done in Python."""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value.encode() if isinstance(value, str) else value
+
+    def mget(self, *keys):
+        return [self.data.get(key) for key in keys]
+
+    def incr(self, key):
+        self.data[key] = str(int(self.data.get(key, b"0")) + 1).encode()
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def expire(self, key, seconds):
+        pass
+
+    def scan_iter(self, pattern):
+        return [key for key in list(self.data) if fnmatch.fnmatchcase(key, pattern)]
+
+    def pipeline(self):
+        redis, queued = self, []
+
+        class Pipeline:
+            def __getattr__(self, name):
+                return lambda *args: queued.append((name, args))
+
+            def execute(self):
+                return [getattr(redis, name)(*args) for name, args in queued]
+
+        return Pipeline()
+
+    def register_script(self, script):
+        def set_if_version(keys, args):
+            value_key, version_key, generation_key = keys
+            version, raw, ttl = args
+            current = "%s:%s" % (self.data.get(generation_key, b"0").decode(),
+                                 self.data.get(version_key, b"0").decode())
+            if current != version:
+                return 0
+            self.set(value_key, raw, ex=ttl)
+            return 1
+
+        return set_if_version
+
+
+@pytest.fixture(params=["local", "redis"])
+def cache(request):
+    if request.param == "local":
+        backend = LocalBackend(max_size=16)
+    else:
+        backend = RedisBackend("redis://fake", prefix="metadata:", client=FakeRedis())
+    return MetadataCache(backend, ttl=60)
+
+
+def test_set_with_current_version_is_stored(cache):
+    version = cache.version("biodiversity", "Flora of India")
+    cache.set("biodiversity", "Flora of India", {"fields": []}, version)
+    assert cache.get("biodiversity", "Flora of India") == {"fields": []}
+    assert cache.stats()["stale_writes_dropped"] == 0
+
+
+def test_set_that_raced_an_invalidation_is_dropped(cache):
+    # A load reads the version, a write invalidates, the load then finishes
+    version = cache.version("biodiversity", "Flora of India")
+    cache.invalidate("biodiversity", "Flora of India")
+    cache.set("biodiversity", "Flora of India", {"fields": ["before the write"]}, version)
+    assert cache.get("biodiversity", "Flora of India") is None
+    assert cache.stats()["stale_writes_dropped"] == 1
+
+    # The next load starts after the write and is kept
+    version = cache.version("biodiversity", "Flora of India")
+    cache.set("biodiversity", "Flora of India", {"fields": ["after the write"]}, version)
+    assert cache.get("biodiversity", "Flora of India") == {"fields": ["after the write"]}
+
+
+def test_set_that_raced_a_clear_is_dropped(cache):
+    version = cache.version("biodiversity", "Flora of India")
+    cache.clear()
+    cache.set("biodiversity", "Flora of India", {"fields": []}, version)
+    assert cache.get("biodiversity", "Flora of India") is None
+
+
+def test_invalidating_one_key_leaves_the_others(cache):
+    version = cache.version("biodiversity", "Flora of India")
+    cache.invalidate("biodiversity", "Fauna of India")
+    cache.set("biodiversity", "Flora of India", {"fields": []}, version)
+    assert cache.get("biodiversity", "Flora of India") == {"fields": []}
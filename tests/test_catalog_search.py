@@ -0,0 +1,78 @@
+from app.catalog_search import CatalogSearchIndex
+
+
+def _row(dataset_id, title, description=""):
+    return {"dataset_id": dataset_id, "category_name": "biodiversity", "dataset_title": title,
+            "description": description, "keywords": None, "field_names": None}
+
+
+def _index(rows):
+    index = CatalogSearchIndex(max_age=300)
+    index._fetch = lambda dataset_id=None: [
+        r for r in rows if dataset_id is None or str(r["dataset_id"]) == str(dataset_id)
+    ]
+    index.rebuild()
+    return index
+
+
+def test_refresh_with_str_id_replaces_the_int_keyed_document():
+    rows = [_row(42, "Flora of India")]
+    index = _index(rows)
+
+    rows[0] = _row(42, "Flora of Karnataka")
+    index.refresh_dataset("42")
+
+    assert index.search("flora") == (1, [index.search("karnataka")[1][0]])
+    assert index.search("india") == (0, [])
+
+
+def _brute_force(index, query, categories, offset, limit):
+    # The straightforward scorer: every dataset, every token, then sort
+    import math
+    from app.catalog_search import tokenize
+
+    tokens = list(dict.fromkeys(tokenize(query)))
+    total_docs = max(len(index._docs), 1)
+    per_token = []
+    for token in tokens:
+        candidates = index._candidates(token)
+        if not candidates:
+            return 0, []
+        per_token.append([(t, q * math.log(1 + total_docs / len(index._postings[t]))) for t, q in candidates])
+    per_token.sort(key=lambda scorers: sum(len(index._postings[t]) for t, _ in scorers))
+    wanted = {c.casefold() for c in categories} if categories else None
+    scored = []
+    for d, doc in index._docs.items():
+        if wanted is not None and (doc["category_name"] or "").casefold() not in wanted:
+            continue
+        total = 0.0
+        for scorers in per_token:
+            s = max(index._postings[t].get(d, 0) * f for t, f in scorers)
+            if not s:
+                break
+            total += s
+        else:
+            scored.append(((-total, index._rank_keys[d]), d))
+    scored.sort()
+    return len(scored), [(index._docs[d]["dataset_id"], round(-neg, 4)) for (neg, _), d in scored[offset:offset + limit]]
+
+
+def test_ranking_matches_brute_force():
+    import random
+
+    rng = random.Random(3)
+    words = ["family", "families", "genus", "state", "scientific", "plant", "plants", "name", "rare", "flora"]
+    rows = [
+        {"dataset_id": i, "category_name": rng.choice(["Biodiversity", "Forestry", None]),
+         "dataset_title": " ".join(rng.sample(words, 2)), "description": " ".join(rng.sample(words, 3)),
+         "keywords": rng.choice(["", "genus family", "plant"]), "field_names": rng.choice(["", "scientific_name"])}
+        for i in range(400)
+    ]
+    index = _index(rows)
+    index.refresh_dataset("5")  # incremental updates keep the ranked postings in order
+    for query in ["family", "fam", "famly", "genus state", "plant name family", "sci", "rare flora", "", "nothing"]:
+        for categories in (None, ["forestry"], ["biodiversity", "forestry"]):
+            for offset, limit in ((0, 20), (13, 7), (390, 20)):
+                total, results = index.search(query, categories, offset, limit)
+                assert (total, [(r["dataset_id"], r["score"]) for r in results]) == \
+                    _brute_force(index, query, categories, offset, limit), (query, categories, offset)
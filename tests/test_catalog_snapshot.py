@@ -0,0 +1,50 @@
+import json
+
+from app.catalog_snapshot import CatalogSnapshot
+
+
+def _row(dataset_id, title="Flora of India", fields=("family",)):
+    return {
+        "category_name": "biodiversity",
+        "dataset_id": dataset_id,
+        "dataset_title": title,
+        "last_updated": None,
+        "fields": [{"field_name": name} for name in fields],
+    }
+
+
+def _snapshot(rows):
+    snapshot = CatalogSnapshot(max_age=300)
+    snapshot._fetch = lambda dataset_id=None: (
+        ["biodiversity"], [r for r in rows if dataset_id is None or str(r["dataset_id"]) == str(dataset_id)]
+    )
+    snapshot.rebuild()
+    return snapshot
+
+
+def _datasets(snapshot):
+    body, _ = snapshot.current()
+    return [dataset for category in json.loads(body) for dataset in category["datasets"]]
+
+
+def test_refresh_with_str_id_replaces_the_int_keyed_entry():
+    rows = [_row(42)]
+    snapshot = _snapshot(rows)
+
+    rows[0] = _row(42, fields=("family", "genus"))
+    snapshot.refresh_dataset("42")
+
+    datasets = _datasets(snapshot)
+    assert len(datasets) == 1
+    assert [f["field_name"] for f in datasets[0]["fields"]] == ["family", "genus"]
+    assert list(snapshot._rows) == ["42"]
+
+
+def test_refresh_of_deactivated_dataset_removes_it():
+    rows = [_row(42), _row(7, title="Kew")]
+    snapshot = _snapshot(rows)
+
+    del rows[0]
+    snapshot.refresh_dataset(42)
+
+    assert [d["dataset_title"] for d in _datasets(snapshot)] == ["Kew"]
@@ -0,0 +1,61 @@
+from contextlib import contextmanager
+
+import psycopg2
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import change_log
+from app.endpoints import dataset_master
+
+DATASET = {
+    "title": "Flora of India", "description": None, "citation": None, "doi": None,
+    "language": "en", "data_language": "en", "license": "CC-BY", "publication_date": None,
+    "metadata_modified_date": None, "registration_date": None, "is_active": True,
+    "keywords": None, "dataset_type": None, "category_id": "1",
+}
+
+
+class _Cursor:
+    def __init__(self, error=None):
+        self.error = error
+
+    def execute(self, query, params=None):
+        if self.error is not None:
+            raise self.error
+
+    def fetchone(self):
+        return (1,)
+
+    def close(self):
+        pass
+
+
+def _client(monkeypatch, error=None, schema=True):
+    @contextmanager
+    def get_db():
+        yield type("Conn", (), {"cursor": lambda self: _Cursor(error), "commit": lambda self: None})()
+
+    monkeypatch.setattr(dataset_master, "get_db", get_db)
+    monkeypatch.setattr(dataset_master, "async_db_enabled", lambda: False)
+    monkeypatch.setattr(change_log, "schema_applied", lambda: schema)
+    app = FastAPI()
+    app.include_router(dataset_master.router)
+    return TestClient(app, raise_server_exceptions=False)
+
+
+def test_missing_change_log_schema_is_a_503(monkeypatch):
+    response = _client(monkeypatch, schema=False).post("/dataset-master", json=DATASET)
+    assert response.status_code == 503
+
+
+def test_rejected_data_is_a_400(monkeypatch):
+    error = psycopg2.IntegrityError("insert violates foreign key constraint")
+    response = _client(monkeypatch, error=error).post("/dataset-master", json=DATASET)
+    assert response.status_code == 400
+    assert "foreign key" in response.json()["detail"]
+
+
+def test_database_failure_is_a_500(monkeypatch):
+    error = psycopg2.OperationalError("server closed the connection unexpectedly")
+    response = _client(monkeypatch, error=error).post("/dataset-master", json=DATASET)
+    assert response.status_code == 500
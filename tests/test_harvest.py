@@ -0,0 +1,124 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app import harvest, fake_participant
+from app.harvest import HarvestIndex, ParticipantIndex, EXPORT, REPLAY
+
+URL = "http://participant/search"
+
+
+class Store:
+    """What the harvest_state / harvested_* tables would hold."""
+
+    def __init__(self):
+        self.records = {}
+        self.queries = {}
+        self.state = {}
+
+    def save_state(self, participant_name, index):
+        self.state[participant_name] = {"mode": index.mode, "cursor": index.cursor,
+                                        "completed_at": index.completed_at}
+
+    def load(self, participant_name) -> ParticipantIndex:
+        # As _load_index does after a restart
+        state = self.state[participant_name]
+        index = ParticipantIndex(state["mode"])
+        index.cursor, index.completed_at = state["cursor"], state["completed_at"]
+        for key, record in self.records.items():
+            index.add(key, record)
+        return index
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = Store()
+
+    def persist_page(participant_name, rows, index):
+        store.records.update(rows)
+        store.save_state(participant_name, index)
+
+    def persist_queries(participant_name, rows, index):
+        store.queries.update({(field, query): results for field, query, results in rows})
+        store.save_state(participant_name, index)
+
+    monkeypatch.setattr(harvest, "_persist_page", persist_page)
+    monkeypatch.setattr(harvest, "_persist_queries", persist_queries)
+    monkeypatch.setattr(harvest, "_persist_state", store.save_state)
+    monkeypatch.setattr(harvest, "harvest_index", HarvestIndex())
+    monkeypatch.setattr(harvest, "HARVEST_PAGE_SIZE", 300)
+    return store
+
+
+def _participant(fail_after_pages=None, export=True):
+    # The fake participant over ASGI; records the export cursors asked for
+    cursors = []
+    app = httpx.ASGITransport(app=fake_participant.app)
+
+    async def handle(request):
+        if request.url.path.endswith("/export"):
+            if not export:
+                return httpx.Response(404)
+            if fail_after_pages is not None and len(cursors) >= fail_after_pages:
+                raise httpx.ConnectError("connection reset", request=request)
+            cursors.append(request.url.params.get("cursor"))
+        return await app.handle_async_request(request)
+
+    return httpx.MockTransport(handle), cursors
+
+
+def _harvest(transport):
+    async def run():
+        async with httpx.AsyncClient(transport=transport) as client:
+            await harvest.harvest_participant(client, "fake", URL)
+    asyncio.run(run())
+
+
+def test_export_harvest_holds_every_record(store):
+    transport, cursors = _participant()
+    _harvest(transport)
+
+    index = harvest.harvest_index.get("fake")
+    assert index.mode == EXPORT and index.completed_at is not None
+    assert len(index.records) == len(store.records) == len(fake_participant.RECORDS)
+    assert cursors == [None, "299", "599", "899"]
+    for field, query in [("family", "Lamiaceae"), ("scientific_name", "ocimum"), ("state", "kerala")]:
+        expected = fake_participant.search_records(field, query)
+        assert harvest.harvest_index.lookup("fake", field, query, 60) == expected
+
+
+def test_interrupted_export_resumes_after_the_last_stored_page(store):
+    transport, cursors = _participant(fail_after_pages=2)
+    _harvest(transport)
+
+    index = harvest.harvest_index.get("fake")
+    assert index.last_error and index.completed_at is None
+    assert len(store.records) == 600
+    assert harvest.harvest_index.lookup("fake", "family", "Lamiaceae", 60) is None  # not complete
+
+    # Restart: the index comes back from the store and the harvest carries on
+    harvest.harvest_index.participants = {"fake": store.load("fake")}
+    transport, cursors = _participant()
+    _harvest(transport)
+
+    index = harvest.harvest_index.get("fake")
+    assert cursors == ["599", "899"]
+    assert index.completed_at is not None and index.last_error is None
+    assert len(index.records) == len(store.records) == len(fake_participant.RECORDS)
+    assert (harvest.harvest_index.lookup("fake", "family", "Lamiaceae", 60)
+            == fake_participant.search_records("family", "Lamiaceae"))
+
+
+def test_participant_without_export_is_harvested_by_replay(store):
+    harvest.harvest_index.remember_query("fake", "family", "Lamiaceae")
+    harvest.harvest_index.remember_query("fake", "genus", "Curcuma")
+    transport, _ = _participant(export=False)
+    _harvest(transport)
+
+    index = harvest.harvest_index.get("fake")
+    assert index.mode == REPLAY and index.completed_at is not None
+    assert len(store.queries) == 2
+    assert (harvest.harvest_index.lookup("fake", "family", "lamiaceae ", 60)
+            == fake_participant.search_records("family", "Lamiaceae"))
+    assert harvest.harvest_index.lookup("fake", "family", "Meliaceae", 60) is None
@@ -0,0 +1,47 @@
+import asyncio
+from datetime import date
+
+import httpx
+
+from app.cache import metadata_cache
+from app.endpoints import metadata
+from app.http_cache import CachePolicy, ConditionalGetMiddleware, cache_policy
+
+DOCUMENT = {"category_name": "biodiversity", "dataset_title": "Flora of India",
+            "last_updated": date(2020, 1, 1), "fields": []}
+
+
+async def _handler(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200,
+                "headers": [(b"content-type", b"application/json")]})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+def _get(headers):
+    async def run():
+        transport = httpx.ASGITransport(app=ConditionalGetMiddleware(_handler))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/metadata", headers=headers,
+                                    params={"category_name": "biodiversity", "title": "Flora of India"})
+    return asyncio.run(run())
+
+
+def setup_function():
+    cache_policy("/metadata", CachePolicy(validators=metadata.metadata_validators))
+    metadata_cache.clear()
+    metadata_cache.set("biodiversity", "Flora of India", DOCUMENT)
+
+
+def test_if_modified_since_alone_does_not_answer_304():
+    # metadata_modified_date can stay put across a write, so a date is no proof
+    response = _get({"If-Modified-Since": "Fri, 01 Jan 2100 00:00:00 GMT"})
+    assert response.status_code == 200
+    assert "last-modified" not in response.headers
+    assert response.headers["etag"]
+
+
+def test_matching_etag_answers_304():
+    etag = _get({}).headers["etag"]
+    assert _get({"If-None-Match": etag}).status_code == 304
+    metadata_cache.set("biodiversity", "Flora of India", {**DOCUMENT, "fields": [{"field_name": "family"}]})
+    assert _get({"If-None-Match": etag}).status_code == 200
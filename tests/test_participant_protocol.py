@@ -0,0 +1,50 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.endpoints import federated_search
+from app.participant_protocol import ProtocolNegotiator
+
+URL = "http://participant/search"
+CALLS = [("family", None), ("genus", None)]
+
+
+def _search(batch_status):
+    # Items for CALLS when POST /search/batch answers batch_status; the
+    # per-field GETs succeed
+    async def handle(request):
+        if request.url.path.endswith("/batch"):
+            return httpx.Response(batch_status, json={"detail": "no"})
+        return httpx.Response(200, json={"results": [{"field": request.url.params["field"]}]})
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handle)) as client:
+            return await federated_search.fetch_batch_from_participant(
+                client, f"protocol-{batch_status}", URL, CALLS, f"query {batch_status}")
+    return asyncio.run(run())
+
+
+@pytest.fixture(autouse=True)
+def negotiator(monkeypatch):
+    negotiator = ProtocolNegotiator("auto", renegotiate_after=3600)
+    monkeypatch.setattr(federated_search, "protocol_negotiator", negotiator)
+    return negotiator
+
+
+@pytest.mark.parametrize("status", [404, 405, 501])
+def test_missing_batch_endpoint_falls_back_to_per_field(status, negotiator):
+    items = _search(status)
+    # Results pass through as RawJSON when PARTICIPANT_PASSTHROUGH is on
+    results = [getattr(item["results"], "records", lambda: item["results"])() for item in items]
+    assert results == [[{"field": "family"}], [{"field": "genus"}]]
+    assert not any(item.get("error") for item in items)
+    assert not negotiator.use_batch(f"protocol-{status}")
+
+
+@pytest.mark.parametrize("status", [400, 401, 403, 422, 429, 500])
+def test_other_errors_fail_the_call(status, negotiator):
+    items = _search(status)
+    assert all(item.get("error") and item["results"] == [] for item in items)
+    # Still a batch participant: the failure says nothing about the protocol
+    assert negotiator.use_batch(f"protocol-{status}")
@@ -0,0 +1,37 @@
+from app.result_merge import merge_results, truncated_sources
+
+
+def _item(participant, names, **extra):
+    return {"participant_name": participant, "field": "scientific_name",
+            "results": [{"scientific_name": name} for name in names], **extra}
+
+
+def _pages(items, limit):
+    after, served = None, []
+    while True:
+        page, has_more, after = merge_results(items, "", after, limit)
+        served.extend(entry["key"] for entry in page)
+        if not has_more:
+            return served
+
+
+def test_full_window_is_reported_as_truncated():
+    window = 4
+    items = [
+        _item("a", ["acer", "betula", "cedrus", "dalbergia"]),  # a full window: may hold more
+        _item("b", ["acer", "ficus"]),
+        _item("c", [], error="timeout"),
+        _item("d", ["ginkgo"], truncated=True),                 # cut by the record cap
+    ]
+    # Paging walks the merged window to its end...
+    assert _pages(items, 2) == ["acer", "betula", "cedrus", "dalbergia", "ficus", "ginkgo"]
+    # ...which is not the end of the results
+    assert truncated_sources(items, window) == [
+        {"participant_name": "a", "field": "scientific_name"},
+        {"participant_name": "d", "field": "scientific_name"},
+    ]
+
+
+def test_short_answers_are_complete():
+    items = [_item("a", ["acer", "betula"]), _item("b", [])]
+    assert truncated_sources(items, 4) == []
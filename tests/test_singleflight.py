@@ -0,0 +1,143 @@
+import time
+import asyncio
+import threading
+
+import pytest
+
+from app.singleflight import AsyncSingleFlight, SingleFlight
+
+BURST = 50
+
+
+# ---------- AsyncSingleFlight ----------
+def _async_burst(fn, cancel_leader=False):
+    # (upstream calls, outcomes of the callers) for BURST concurrent calls
+    async def run():
+        flight = AsyncSingleFlight()
+        calls = []
+        release = asyncio.Event()
+
+        async def upstream():
+            calls.append(1)
+            await release.wait()
+            return fn()
+
+        callers = [asyncio.ensure_future(flight.do("key", upstream)) for _ in range(BURST)]
+        await asyncio.sleep(0)  # every caller joins the flight
+        if cancel_leader:
+            callers[0].cancel()
+        release.set()
+        outcomes = await asyncio.gather(*callers, return_exceptions=True)
+        assert flight.stats() == {"in_flight": 0, "executed": 1, "coalesced": BURST - 1}
+        return len(calls), outcomes
+
+    return asyncio.run(run())
+
+
+def test_async_burst_makes_one_call():
+    calls, outcomes = _async_burst(lambda: "metadata")
+    assert calls == 1
+    assert outcomes == ["metadata"] * BURST
+
+
+def test_async_leader_error_reaches_every_caller():
+    def fail():
+        raise RuntimeError("upstream down")
+
+    calls, outcomes = _async_burst(fail)
+    assert calls == 1
+    assert all(isinstance(outcome, RuntimeError) for outcome in outcomes)
+
+
+def test_async_cancelled_leader_does_not_cancel_the_others():
+    calls, outcomes = _async_burst(lambda: "metadata", cancel_leader=True)
+    assert calls == 1
+    assert isinstance(outcomes[0], asyncio.CancelledError)
+    assert outcomes[1:] == ["metadata"] * (BURST - 1)
+
+
+def test_async_key_is_forgotten_after_an_error():
+    async def run():
+        flight = AsyncSingleFlight()
+
+        async def fail():
+            raise RuntimeError("upstream down")
+
+        async def succeed():
+            return "metadata"
+
+        with pytest.raises(RuntimeError):
+            await flight.do("key", fail)
+        return await flight.do("key", succeed)
+
+    assert asyncio.run(run()) == "metadata"
+
+
+# ---------- SingleFlight ----------
+def _thread_burst(fn):
+    # (upstream calls, outcomes of the callers) for BURST concurrent threads
+    flight = SingleFlight()
+    calls = []
+    outcomes = [None] * BURST
+
+    def upstream():
+        calls.append(1)
+        # Hold the flight open until every other thread has joined it
+        deadline = time.monotonic() + 5
+        while flight.stats()["coalesced"] < BURST - 1 and time.monotonic() < deadline:
+            time.sleep(0.001)
+        return fn()
+
+    def caller(i):
+        try:
+            outcomes[i] = flight.do("key", upstream)
+        except BaseException as e:
+            outcomes[i] = e
+
+    threads = [threading.Thread(target=caller, args=(i,)) for i in range(BURST)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert flight.stats() == {"in_flight": 0, "executed": 1, "coalesced": BURST - 1}
+    return len(calls), outcomes
+
+
+def test_thread_burst_makes_one_call():
+    calls, outcomes = _thread_burst(lambda: "metadata")
+    assert calls == 1
+    assert outcomes == ["metadata"] * BURST
+
+
+def test_thread_leader_error_reaches_every_caller():
+    def fail():
+        raise RuntimeError("upstream down")
+
+    calls, outcomes = _thread_burst(fail)
+    assert calls == 1
+    assert all(isinstance(outcome, RuntimeError) for outcome in outcomes)
+
+
+def test_thread_leader_interrupted_still_releases_the_others():
+    # Threads cannot be cancelled; the nearest thing is a BaseException
+    # escaping the leader, which must not leave followers waiting forever
+    class Interrupted(BaseException):
+        pass
+
+    def interrupt():
+        raise Interrupted()
+
+    calls, outcomes = _thread_burst(interrupt)
+    assert calls == 1
+    assert all(isinstance(outcome, Interrupted) for outcome in outcomes)
+
+
+def test_thread_key_is_forgotten_after_an_error():
+    flight = SingleFlight()
+
+    def fail():
+        raise RuntimeError("upstream down")
+
+    with pytest.raises(RuntimeError):
+        flight.do("key", fail)
+    assert flight.do("key", lambda: "metadata") == "metadata"